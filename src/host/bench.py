@@ -0,0 +1,443 @@
+"""
+Host-side benchmarks for the pigrostat device code.
+
+Runs the unmodified scripts and drivers from src/pigrostat against the
+simulated board in `machine`, on a virtual clock, and reports per frame (one
+sample, delimited by the status LED flash) or per operation:
+
+- cpu_us: host CPU time (only meaningful relative to other runs on the same box)
+- period_ms / busy_ms: virtual time between LED flashes, and how long the LED stays lit
+- jitter_ms: spread (max - min) of period_ms
+- i2c_txn / i2c_bytes / bus_ms: bus transactions, bytes and modelled bus time
+- alloc_b: peak transient heap allocation (tracemalloc, separate pass)
+- gc: explicit gc.collect() calls; serial: characters printed to the console
+- boot_ms: virtual time from reset to the first reading (loop benchmarks)
+
+Usage:
+
+    python src/host/bench.py                     # everything
+    python src/host/bench.py loop-lcd1602 -n 200
+    python src/host/bench.py --json
+"""
+
+import argparse, json, os, shutil, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import machine
+from machine import Board, DEVICE_DIR, Environment, Pcf8574LcdDevice, Sht30Device, Ssd1306Device, Tca9548aDevice
+import ujson
+
+BENCHMARKS = {}
+
+
+def benchmark(name, description):
+    def register(func):
+        BENCHMARKS[name] = (func, description)
+        return func
+    return register
+
+
+class Sample:
+    """
+    Point-in-time readings taken at a frame/operation boundary
+    """
+    __slots__ = ('cpu', 'virtual_us', 'bus', 'gc', 'serial', 'alloc')
+
+    def __init__(self, board, alloc=0):
+        self.cpu = time.perf_counter()
+        self.virtual_us = board.clock.now_us
+        self.bus = board.bus_stats()
+        self.gc = board.gc_collects
+        self.serial = board.serial.chars
+        self.alloc = alloc
+
+
+def _alloc_mark():
+    # transient peak since the previous mark, then start a new window
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    return peak - current
+
+
+def _summarise(samples, busy_us=None):
+    """
+    Turn consecutive samples into per-interval metrics
+    """
+    cpu, period, txn, nbytes, bus_us, gcs, serial, alloc = [], [], [], [], [], [], [], []
+    for before, after in zip(samples, samples[1:]):
+        bus = after.bus.diff(before.bus)
+        cpu.append((after.cpu - before.cpu) * 1e6)
+        period.append((after.virtual_us - before.virtual_us) / 1000)
+        txn.append(bus.transactions)
+        nbytes.append(bus.bytes)
+        bus_us.append(bus.bus_us)
+        gcs.append(after.gc - before.gc)
+        serial.append(after.serial - before.serial)
+        alloc.append(after.alloc)
+    if not cpu:
+        return {}
+    result = {
+        'count': len(cpu),
+        'cpu_us': _dist(cpu),
+        'period_ms': _mean(period),
+        'jitter_ms': max(period) - min(period),
+        'i2c_txn': _mean(txn),
+        'i2c_bytes': _mean(nbytes),
+        'bus_ms': _mean(bus_us) / 1000,
+        'gc': _mean(gcs),
+        'serial': _mean(serial),
+    }
+    if busy_us:
+        result['busy_ms'] = _mean(busy_us) / 1000
+    return result
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0
+
+
+def _dist(values):
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        'mean': _mean(ordered),
+        'p50': ordered[n // 2],
+        'p95': ordered[min(n - 1, (n * 95) // 100)],
+        'max': ordered[-1],
+    }
+
+
+# --- main loop benchmarks ---
+
+def _board_for(config, flash_dir):
+    board = Board(flash_dir=flash_dir)
+    sensors = config.get('sensors') or ([config['sensor']] if config.get('sensor') else [])
+    muxes = {}
+    for index, sensor in enumerate(sensors):
+        # each chamber of a rack gets its own (differently seeded) climate
+        sht = Sht30Device(sensor['addr'], Environment(seed=index + 1) if index else None)
+        bus = board.bus(sensor['sda'], sensor['scl'])
+        if 'mux' in sensor:
+            key = (sensor['sda'], sensor['scl'], sensor['mux']['addr'])
+            if key not in muxes:
+                muxes[key] = bus.attach(Tca9548aDevice(sensor['mux']['addr']))
+            muxes[key].attach(sensor['mux']['channel'], sht)
+        else:
+            bus.attach(sht)
+        if sensor.get('alert'):
+            sht.connect_alert(board.pin(sensor['alert']['pin']))
+    display = config.get('display')
+    if display:
+        bus = board.bus(display['sda'], display['scl'])
+        if display['type'] == 'lcd1602':
+            bus.attach(Pcf8574LcdDevice(display['addr'], 2, 16))
+        elif display['type'] == 'ssd1306':
+            bus.attach(Ssd1306Device(display['addr'], display['width'], display['height']))
+    return board
+
+
+class FrameRecorder:
+    """
+    Marks a frame boundary each time the script turns the status LED on, and
+    the end of the "thinking" window each time it turns it off
+    """
+    def __init__(self, board, frames, trace_alloc):
+        self.board = board
+        self.frames = frames
+        self.trace_alloc = trace_alloc
+        self.samples = []
+        self.busy_us = []
+        board.pin('LED').listeners.append(self.on_led)
+
+    def on_led(self, state, value):
+        board = self.board
+        if len(self.samples) >= self.frames + 2:
+            return  # halting; ignore the exit-condition blinks
+        if value:
+            self.samples.append(Sample(board, _alloc_mark() if self.trace_alloc else 0))
+            # the first mark is boot (LED lit during setup); keep one extra to close the last frame
+            if len(self.samples) >= self.frames + 2:
+                board.halt()
+        elif len(self.samples) >= 2:
+            self.busy_us.append(board.clock.now_us - self.samples[-1].virtual_us)
+
+
+def run_loop(config_text, frames, script='main.py', warm=False):
+    """
+    Run `script` under the given config.json text for `frames` iterations,
+    once for timing and once with allocation tracing; with warm=True, each pass
+    follows a first boot on the same flash (as after a watchdog reset)
+    """
+    config = ujson.loads(config_text)
+    passes = []
+    for trace_alloc in (False, True):
+        flash_dir = tempfile.mkdtemp(prefix='pigrostat-flash-')
+        try:
+            with open(os.path.join(flash_dir, 'config.json'), 'w', encoding='utf-8') as f:
+                f.write(config_text)
+            if warm:
+                board = _board_for(config, flash_dir)
+                FrameRecorder(board, 0, False)
+                with board:
+                    board.run_script(script)
+            board = _board_for(config, flash_dir)
+            recorder = FrameRecorder(board, frames, trace_alloc)
+            if trace_alloc:
+                tracemalloc.start()
+            try:
+                with board:
+                    board.run_script(script)
+            finally:
+                if trace_alloc:
+                    tracemalloc.stop()
+            passes.append((board, recorder))
+        finally:
+            shutil.rmtree(flash_dir, ignore_errors=True)
+
+    (board, timing), (_, traced) = passes
+    frame_samples = timing.samples[1:]
+    result = _summarise(frame_samples, timing.busy_us[:frames])
+    allocs = [s.alloc for s in traced.samples[2:]]
+    result['alloc_b'] = _mean(allocs)
+    result['alloc_b_max'] = max(allocs) if allocs else 0
+    result['boot_ms'] = frame_samples[0].virtual_us / 1000 if frame_samples else None
+    return result
+
+
+def _shipped_config():
+    with open(os.path.join(DEVICE_DIR, 'config.json'), encoding='utf-8') as f:
+        return f.read()
+
+
+def _config_variant(display, **overrides):
+    config = ujson.loads(_shipped_config())
+    config.update(overrides)
+    config.pop('_display', None)
+    if display is None:
+        config.pop('display', None)
+    else:
+        config['display'] = display
+    return json.dumps(config, ensure_ascii=False, indent=2)
+
+
+@benchmark('loop-lcd1602', 'main.py with the shipped config.json (LCD1602 + SHT30 sharing one SoftI2C bus)')
+def bench_loop_lcd1602(frames):
+    return run_loop(_shipped_config(), frames)
+
+
+@benchmark('loop-ssd1306', 'main.py with the alternate 128x32 SSD1306 display')
+def bench_loop_ssd1306(frames):
+    return run_loop(_config_variant(ujson.loads(_shipped_config())['_display']), frames)
+
+
+@benchmark('loop-lcd1602-4hz', 'shipped config sampling at 4 Hz (0.25 s delay, 4 mps)')
+def bench_loop_lcd1602_4hz(frames):
+    config = ujson.loads(_shipped_config())
+    sensor = dict(config['sensor'], mps=4)
+    return run_loop(_config_variant(config['display'], delay=0.25, sensor=sensor), frames)
+
+
+@benchmark('loop-lcd1602-dual', 'shipped config with sampling and relays on core 1 (_thread)')
+def bench_loop_lcd1602_dual(frames):
+    config = ujson.loads(_shipped_config())
+    return run_loop(_config_variant(config['display'], cores=2), frames)
+
+
+@benchmark('loop-alert', 'shipped config woken by the SHT30 ALERT pin, polling every 10 s otherwise')
+def bench_loop_alert(frames):
+    config = ujson.loads(_shipped_config())
+    sensor = dict(config['sensor'], alert={'pin': 22, 'poll': 10})
+    return run_loop(_config_variant(config['display'], sensor=sensor), frames)
+
+
+def _rack_config(single_shot=False):
+    # eight sensors: one beside the display, and seven on a second bus behind
+    # two TCA9548As, each with its own humidity relay
+    config = ujson.loads(_shipped_config())
+    sensors = []
+    for index in range(8):
+        sensor = json.loads(json.dumps(config['sensor']))
+        sensor['name'] = 'ABCDEFGH'[index]
+        sensor['values'][1]['relay'] = 6 + index
+        if index:
+            sensor.update(sda=2, scl=3, mux={'addr': 0x70 if index < 5 else 0x71, 'channel': (index - 1) % 4})
+        if single_shot:
+            sensor.pop('mps', None)
+        sensors.append(sensor)
+    config.pop('sensor')
+    config.pop('_display', None)
+    config['sensors'] = sensors
+    return json.dumps(config, ensure_ascii=False, indent=2)
+
+
+@benchmark('loop-rack', 'eight SHT30s (periodic) on two buses, seven of them behind two TCA9548A muxes')
+def bench_loop_rack(frames):
+    return run_loop(_rack_config(), frames)
+
+
+@benchmark('loop-rack-single', 'as loop-rack, with single-shot conversions (overlapped across sensors)')
+def bench_loop_rack_single(frames):
+    return run_loop(_rack_config(True), frames)
+
+
+@benchmark('boot-warm', 'shipped config, booting with flash state left by a previous boot')
+def bench_boot_warm(frames):
+    return run_loop(_shipped_config(), frames, warm=True)
+
+
+@benchmark('loop-headless', 'main.py with no display configured')
+def bench_loop_headless(frames):
+    return run_loop(_config_variant(None), frames)
+
+
+# --- driver micro-benchmarks ---
+
+def run_ops(setup, op, count):
+    """
+    Time `count` calls of op(state) after state = setup(board), once for
+    timing and once with allocation tracing
+    """
+    results = []
+    for trace_alloc in (False, True):
+        board = Board()
+        with board:
+            state = setup(board)
+            if trace_alloc:
+                tracemalloc.start()
+            try:
+                samples = [Sample(board, _alloc_mark() if trace_alloc else 0)]
+                for i in range(count):
+                    op(state, i)
+                    samples.append(Sample(board, _alloc_mark() if trace_alloc else 0))
+            finally:
+                if trace_alloc:
+                    tracemalloc.stop()
+        results.append(samples)
+    timing, traced = results
+    result = _summarise(timing)
+    allocs = [s.alloc for s in traced[1:]]
+    result['alloc_b'] = _mean(allocs)
+    result['alloc_b_max'] = max(allocs) if allocs else 0
+    return result
+
+
+def _sht30(board):
+    import sht30
+    board.bus(0, 1).attach(Sht30Device(0x44))
+    return sht30.SHT30(i2c=machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)), i2c_address=0x44)
+
+
+@benchmark('sht30-measure', 'SHT30.measure() on SoftI2C')
+def bench_sht30_measure(count):
+    return run_ops(_sht30, lambda sht, i: sht.measure(), count)
+
+
+def _sht30_periodic(board):
+    sht = _sht30(board)
+    sht.start_periodic(1)
+    return sht
+
+
+def _fetch_at_1hz(sht, i):
+    sht.measure()
+    time.sleep(1)
+
+
+@benchmark('sht30-fetch', 'SHT30.measure() in 1 mps periodic mode, read once a second')
+def bench_sht30_fetch(count):
+    return run_ops(_sht30_periodic, _fetch_at_1hz, count)
+
+
+def _lcd(board):
+    from pico_i2c_lcd import I2cLcd
+    board.bus(0, 1).attach(Pcf8574LcdDevice(0x27, 2, 16))
+    return I2cLcd(machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)), 0x27, 2, 16)
+
+
+def _lcd_line(lcd, i):
+    lcd.move_to(0, i & 1)
+    lcd.putstr(f'H: {70 + (i % 50) / 10:.1f} %    on ')
+
+
+@benchmark('lcd-line', 'I2cLcd: position and write one 16 character line')
+def bench_lcd_line(count):
+    return run_ops(_lcd, _lcd_line, count)
+
+
+def _ssd(board):
+    from ssd1306 import SSD1306_I2C
+    board.bus(0, 1).attach(Ssd1306Device(0x3C, 128, 32))
+    return SSD1306_I2C(128, 32, machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)), 0x3C)
+
+
+def _ssd_frame(ssd, i):
+    ssd.fill(0)
+    ssd.text(f'T: {24 + (i % 10) / 10:.1f} C', 0, 0)
+    ssd.text(f'H: {70 + (i % 50) / 10:.1f} % on', 0, 12)
+    ssd.show()
+
+
+@benchmark('ssd1306-frame', 'SSD1306_I2C: redraw two lines of readings and show()')
+def bench_ssd1306_frame(count):
+    return run_ops(_ssd, _ssd_frame, count)
+
+
+# --- reporting ---
+
+COLUMNS = (
+    ('cpu_us', 'cpu us (mean/p95)', lambda r: f"{r['cpu_us']['mean']:.0f}/{r['cpu_us']['p95']:.0f}"),
+    ('period_ms', 'period ms', lambda r: f"{r['period_ms']:.1f}"),
+    ('jitter_ms', 'jitter ms', lambda r: f"{r['jitter_ms']:.2f}"),
+    ('busy_ms', 'busy ms', lambda r: f"{r['busy_ms']:.1f}" if 'busy_ms' in r else '-'),
+    ('i2c_txn', 'i2c txn', lambda r: f"{r['i2c_txn']:.1f}"),
+    ('i2c_bytes', 'i2c bytes', lambda r: f"{r['i2c_bytes']:.0f}"),
+    ('bus_ms', 'bus ms', lambda r: f"{r['bus_ms']:.2f}"),
+    ('alloc_b', 'alloc B', lambda r: f"{r['alloc_b']:.0f}"),
+    ('gc', 'gc', lambda r: f"{r['gc']:.1f}"),
+    ('serial', 'serial', lambda r: f"{r['serial']:.0f}"),
+    ('boot_ms', 'boot ms', lambda r: f"{r['boot_ms']:.0f}" if r.get('boot_ms') is not None else '-'),
+)
+
+
+def print_table(results, out):
+    headers = ['benchmark', 'n'] + [title for _, title, _ in COLUMNS]
+    rows = [[name, str(r['count'])] + [fmt(r) for _, _, fmt in COLUMNS] for name, r in results.items()]
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(len(headers))]
+    for row in [headers] + rows:
+        out.write('  '.join(cell.ljust(widths[i]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(row)) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='pigrostat host benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all)')
+    parser.add_argument('-n', '--count', type=int, default=60, help='frames/operations per benchmark')
+    parser.add_argument('--json', action='store_true', help='emit JSON instead of a table')
+    parser.add_argument('--list', action='store_true', help='list benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (_, description) in BENCHMARKS.items():
+            print(f'{name:16} {description}')
+        return 0
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(unknown)}')
+
+    results = {}
+    for name in names:
+        func, _ = BENCHMARKS[name]
+        results[name] = func(args.count)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print_table(results, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""
+Time-warp climate simulator for tuning the hygrostat's control settings.
+
+Runs the unmodified main.py on the simulated board, as bench.py does. This
+time the SHT30 reads a modelled room rather than a fixed curve, and the room
+hears the relay pins. The room tracks absolute humidity and temperature:
+- air exchange pulls both towards an ambient that cycles daily
+- the humidifier starts (or stops) --dead seconds after its relay switches,
+  and its output ramps over --ramp seconds
+- evaporating mist cools the room a little
+- the sensor follows the air with a --sensor-lag
+RH is worked out from the two, so a warmer afternoon dries the room as a real
+one would. Everything runs on the virtual clock. At a 1 s loop delay a
+simulated day takes about half a minute of host time (a week, a few minutes),
+spent almost entirely in main.py's own event loop; runs go in parallel.
+
+Per run, from the room's own (not the sensor's) RH:
+
+- cycles, cycles/h, on %: humidifier relay switch-ons, and its duty
+- min on / min off: the shortest on and off spells, in minutes (short cycling)
+- below % / above %: time below the band (by default the channel's on and off
+  thresholds) and above it
+- overshoot: how far RH went past the top of the band, worst and mean per cycle
+- undershoot: the same, below the bottom of the band
+
+Any setting may be a comma list; every combination is run, --jobs at a time.
+
+Usage:
+
+    python src/host/climate.py --days 1
+    python src/host/climate.py --days 7 --on 68,70 --off 72,75 --dead 5,30
+    python src/host/climate.py --set sensor.values.1.filter.median=1,3,5 --json
+"""
+
+import argparse, itertools, json, math, multiprocessing, os, random, shutil, sys, tempfile, time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from machine import Board, DEVICE_DIR, Sht30Device
+import ujson
+
+# humidity is the sensor's second value (channels are T then RH)
+RH_VALUE = 1
+
+# config sections with no say in control; left out, they'd only cost host time
+UNUSED = ('display', '_display', '_sensors', 'memory', 'log', 'metrics', 'history', 'telemetry', 'cores')
+
+# integration step
+STEP_S = 1.0
+
+DAY_S = 86_400
+
+# room model settings: (default, help)
+ROOM = {
+    'volume': (10.0, 'room volume, m3'),
+    'output': (300.0, 'humidifier output at full power, g/h'),
+    'dead': (5.0, 'seconds from the relay switching to the humidifier starting or stopping'),
+    'ramp': (20.0, "time constant of the humidifier's output, s"),
+    'exchange': (2.0, 'air changes per hour with the ambient'),
+    'ambient_t': (21.0, 'mean ambient temperature, C'),
+    'ambient_rh': (50.0, 'mean ambient RH, %'),
+    't_swing': (3.0, 'daily swing of the ambient temperature either side of its mean, C'),
+    'rh_swing': (10.0, 'daily swing of the ambient RH either side of its mean, %'),
+    'thermal': (3600.0, "time constant of the room's temperature, s"),
+    'cooling': (0.2, 'room cooling per g/m3 of mist evaporated, C'),
+    'sensor_lag': (10.0, "time constant of the sensor's reading behind the room, s"),
+    'noise': (0.05, 'sensor noise (standard deviation), C and %'),
+}
+
+
+def _toward(dt, tau):
+    # the fraction of the way a first-order lag of time constant tau moves in dt
+    return min(1.0, dt / tau) if tau > 0 else 1.0
+
+
+def saturation(t):
+    # water vapour density at saturation, g/m3 (Magnus formula)
+    return 611.2 * math.exp(17.62 * t / (243.12 + t)) / (461.5 * (t + 273.15)) * 1000
+
+
+class Room:
+    """
+    The modelled room, as an Environment for Sht30Device: sample() moves the
+    model on to the moment of the conversion and returns what the sensor sees
+    """
+    def __init__(self, board, pins, band, settings, seed=1):
+        self.board = board
+        self.s = settings
+        self.band = band # (low, high) RH
+        self.random = random.Random(seed)
+        self.now = 0.0 # model time, s
+        self.t = self.__ambient(0)[0]
+        self.ah = saturation(self.t) * self.__ambient(0)[1] / 100 # absolute humidity, g/m3
+        self.seen = [self.t, self.rh()] # the air at the sensor
+        self.output = 0.0 # humidifier, 0..1 of full
+        self.powered = False # after the dead time
+        self.commands = deque() # (due, on) relay changes not yet felt
+        self.pins = [board.pin(pin) for pin in pins]
+        self.relay = False
+        self.measure_from = 0.0 # metrics start here (after warming up)
+        # metrics
+        self.cycles = 0
+        self.on_s = self.below_s = self.above_s = self.total_s = 0.0
+        self.switched = None # when the relay last changed, once measuring
+        self.min_on = self.min_off = math.inf
+        self.peaks = [] # per cycle: furthest above the band, and below it
+        self.peak = [0.0, 0.0]
+        self.rh_sum = 0.0
+        self.rh_min, self.rh_max = math.inf, -math.inf
+        for pin in self.pins:
+            pin.listeners.append(self.__switched)
+
+    def __ambient(self, now):
+        # coolest and most humid before dawn, warmest mid afternoon
+        phase = 2 * math.pi * ((now % DAY_S) / DAY_S - 0.625)
+        s = self.s
+        return s['ambient_t'] + s['t_swing'] * math.cos(phase), s['ambient_rh'] - s['rh_swing'] * math.cos(phase)
+
+    def rh(self):
+        return min(100.0, 100 * self.ah / saturation(self.t))
+
+    def __switched(self, state, value):
+        # a relay pin changed; the humidifier runs with all of its pins on
+        on = all(pin.value for pin in self.pins)
+        if on == self.relay:
+            return
+        self.relay = on
+        now = self.board.clock.now_us / 1_000_000
+        self.advance(now)
+        self.commands.append((now + self.s['dead'], on))
+        if now >= self.measure_from:
+            if self.switched is not None:
+                spell = now - self.switched
+                if on:
+                    self.min_off = min(self.min_off, spell)
+                else:
+                    self.min_on = min(self.min_on, spell)
+            self.switched = now
+            if on:
+                self.cycles += 1
+                self.peaks.append(self.peak)
+                self.peak = [0.0, 0.0]
+
+    def advance(self, until):
+        s = self.s
+        low, high = self.band
+        exchange = s['exchange'] / 3600
+        output = s['output'] / 3600 / s['volume'] # g/m3 per second at full power
+        while self.now < until:
+            dt = min(STEP_S, until - self.now)
+            while self.commands and self.commands[0][0] <= self.now:
+                self.powered = self.commands.popleft()[1]
+            ambient_t, ambient_rh = self.__ambient(self.now)
+            self.output += ((1.0 if self.powered else 0.0) - self.output) * _toward(dt, s['ramp'])
+            mist = self.output * output * dt
+            self.ah += (saturation(ambient_t) * ambient_rh / 100 - self.ah) * exchange * dt + mist
+            self.t += (ambient_t - self.t) * _toward(dt, s['thermal']) - mist * s['cooling']
+            self.ah = min(self.ah, saturation(self.t)) # any more condenses
+            rh = self.rh()
+            lag = _toward(dt, s['sensor_lag'])
+            self.seen[0] += (self.t - self.seen[0]) * lag
+            self.seen[1] += (rh - self.seen[1]) * lag
+            self.now += dt
+            if self.now > self.measure_from:
+                self.total_s += dt
+                self.rh_sum += rh * dt
+                self.rh_min = min(self.rh_min, rh)
+                self.rh_max = max(self.rh_max, rh)
+                if self.relay:
+                    self.on_s += dt
+                if rh < low:
+                    self.below_s += dt
+                    self.peak[1] = max(self.peak[1], low - rh)
+                elif rh > high:
+                    self.above_s += dt
+                    self.peak[0] = max(self.peak[0], rh - high)
+
+    def sample(self, now_us):
+        self.advance(now_us / 1_000_000)
+        noise = self.s['noise']
+        return (self.seen[0] + self.random.gauss(0, noise), self.seen[1] + self.random.gauss(0, noise))
+
+    def results(self):
+        peaks = self.peaks + [self.peak]
+        total = self.total_s or 1
+        hours = total / 3600
+        return {
+            'cycles': self.cycles,
+            'cycles_h': self.cycles / hours if hours else 0,
+            'on_pct': 100 * self.on_s / total,
+            'min_on_min': self.min_on / 60 if self.min_on < math.inf else None,
+            'min_off_min': self.min_off / 60 if self.min_off < math.inf else None,
+            'below_pct': 100 * self.below_s / total,
+            'above_pct': 100 * self.above_s / total,
+            'overshoot_max': max(peak[0] for peak in peaks),
+            'overshoot_mean': sum(peak[0] for peak in peaks) / len(peaks),
+            'undershoot_max': max(peak[1] for peak in peaks),
+            'undershoot_mean': sum(peak[1] for peak in peaks) / len(peaks),
+            'rh_mean': self.rh_sum / total,
+            'rh_min': self.rh_min,
+            'rh_max': self.rh_max,
+        }
+
+
+def device_config(config, sets):
+    """
+    The config.json for a run: one sensor, no sections that don't bear on
+    control, and the run's settings (dotted paths) applied
+    """
+    config = json.loads(json.dumps(config))
+    if 'sensors' in config:
+        config['sensor'] = config.pop('sensors')[0] # one chamber per run
+    for key in UNUSED:
+        config.pop(key, None)
+    for path, value in sets.items():
+        keys = [int(key) if key.isdigit() else key for key in path.split('.')]
+        node = config
+        for key in keys[:-1]:
+            node = node[key]
+        node[keys[-1]] = value
+    return config
+
+
+def simulate(run):
+    """
+    One run: run is (config, settings for the room, band, days, warm-up hours);
+    returns the room's results, plus host seconds
+    """
+    config, settings, band, days, warmup = run
+    humidity = config['sensor']['values'][RH_VALUE]
+    pins = humidity.get('relay')
+    if pins is None:
+        raise ValueError('the humidity value has no relay')
+    if isinstance(pins, int):
+        pins = [pins]
+    if band is None:
+        band = (humidity['on'], humidity['off'])
+
+    flash_dir = tempfile.mkdtemp(prefix='pigrostat-climate-')
+    try:
+        with open(os.path.join(flash_dir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        board = Board(flash_dir=flash_dir)
+        room = Room(board, pins, band, settings)
+        room.measure_from = warmup * 3600
+        sensor = config['sensor']
+        sht = Sht30Device(sensor['addr'], room)
+        board.bus(sensor['sda'], sensor['scl']).attach(sht)
+        if sensor.get('alert'):
+            sht.connect_alert(board.pin(sensor['alert']['pin']))
+        end = (warmup * 3600 + days * DAY_S)
+        board.clock.call_at(end * 1_000_000, board.halt)
+        started = time.perf_counter()
+        with board:
+            board.run_script('main.py')
+        room.advance(end)
+        results = room.results()
+        results['host_s'] = time.perf_counter() - started
+        return results
+    finally:
+        shutil.rmtree(flash_dir, ignore_errors=True)
+
+
+def _values(text, kind=float):
+    return [kind(value) for value in str(text).split(',')]
+
+
+def _setting(text):
+    # a config value from the command line: JSON if it parses, otherwise a string
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+COLUMNS = [
+    ('cycles', 'cycles', '{:.0f}'),
+    ('cycles_h', 'cycles/h', '{:.1f}'),
+    ('on_pct', 'on %', '{:.1f}'),
+    ('min_on_min', 'min on', '{:.1f}'),
+    ('min_off_min', 'min off', '{:.1f}'),
+    ('below_pct', 'below %', '{:.1f}'),
+    ('above_pct', 'above %', '{:.1f}'),
+    ('overshoot_max', 'over max', '{:.2f}'),
+    ('overshoot_mean', 'over mean', '{:.2f}'),
+    ('undershoot_max', 'under max', '{:.2f}'),
+    ('rh_mean', 'RH mean', '{:.2f}'),
+    ('host_s', 'host s', '{:.1f}'),
+]
+
+
+def print_table(rows, varying, labels, out):
+    headers = [labels.get(name, name) for name in varying] + [title for _, title, _ in COLUMNS]
+    cells = [[str(row['settings'][name]) for name in varying] +
+             ['-' if row[key] is None else fmt.format(row[key]) for key, _, fmt in COLUMNS] for row in rows]
+    widths = [max(len(row[i]) for row in cells + [headers]) for i in range(len(headers))]
+    for row in [headers] + cells:
+        out.write('  '.join(cell.rjust(widths[i]) for i, cell in enumerate(row)) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='simulate the hygrostat against a modelled room')
+    parser.add_argument('--config', default=os.path.join(DEVICE_DIR, 'config.json'), help='device config.json')
+    parser.add_argument('--days', type=float, default=1.0, help='simulated days per run')
+    parser.add_argument('--warmup', type=float, default=1.0, help='simulated hours before measuring')
+    parser.add_argument('--band', help='LOW,HIGH: the RH band to score against (default: the on/off thresholds)')
+    parser.add_argument('--on', help="humidity on threshold(s), %%")
+    parser.add_argument('--off', help="humidity off threshold(s), %%")
+    parser.add_argument('--delay', help='loop delay(s), s')
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUES',
+                        help='any config setting, e.g. sensor.values.1.filter.median=1,3 (repeatable)')
+    for name, (default, text) in ROOM.items():
+        parser.add_argument('--' + name.replace('_', '-'), default=str(default),
+                            help=f"{text.replace('%', '%%')} (default {default})")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='runs at a time')
+    parser.add_argument('--json', action='store_true', help='emit JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    with open(args.config, encoding='utf-8') as f:
+        config = ujson.loads(f.read())
+    band = tuple(_values(args.band)) if args.band else None
+
+    # every setting as a list of values; the runs are every combination
+    grid = {}
+    for name in ROOM:
+        grid[name] = _values(getattr(args, name))
+    sets = {} # config path: values
+    labels = {} # config path: column title
+    for name, path in (('on', f'sensor.values.{RH_VALUE}.on'), ('off', f'sensor.values.{RH_VALUE}.off'),
+                       ('delay', 'delay')):
+        option = getattr(args, name)
+        if option is not None:
+            sets[path] = _values(option)
+            labels[path] = name
+    for item in args.set:
+        path, _, values = item.partition('=')
+        if not values:
+            parser.error(f'--set {item}: expected PATH=VALUES')
+        sets[path] = [_setting(value) for value in values.split(',')]
+    grid.update(sets)
+    names = list(grid)
+    varying = [name for name in names if len(grid[name]) > 1]
+
+    runs = []
+    combos = []
+    for combo in itertools.product(*(grid[name] for name in names)):
+        settings = dict(zip(names, combo))
+        room = {name: settings[name] for name in ROOM}
+        try:
+            run_config = device_config(config, {path: settings[path] for path in sets})
+        except (KeyError, IndexError, TypeError) as ex:
+            parser.error(f'bad --set path ({ex})')
+        runs.append((run_config, room, band, args.days, args.warmup))
+        combos.append(settings)
+
+    # a fresh process per run: each one patches the time module and runs main.py from scratch
+    with multiprocessing.Pool(max(1, min(args.jobs, len(runs))), maxtasksperchild=1) as pool:
+        results = pool.map(simulate, runs, chunksize=1)
+    rows = []
+    for settings, result in zip(combos, results):
+        result['settings'] = settings
+        rows.append(result)
+
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+    else:
+        print_table(rows, varying, labels, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,634 @@
+"""
+Collects telemetry from a fleet of pigrostat devices on the host.
+
+An asyncio UDP endpoint only queues each datagram as it arrives; what has
+queued up is decoded together every DRAIN_S, so under load the cost per
+datagram is a list append plus one bulk unpack of its records. The
+format is defined by src/pigrostat/telemetry.py.
+
+Each device (and sensor unit, for a rack) keeps its recent samples in
+columnar ring buffers (one array per field), plus rollups at 1 s, 1 min and
+1 h: count, min/max/mean of T and RH, and how many samples had a relay on.
+Samples that arrive late, from a device's flash backlog, land in the rollup
+bucket they belong to while it's still held. Records that arrive twice (a
+backlog datagram resent after a reset) are dropped by sequence number, before
+they are stored anywhere. Every --flush seconds the records taken since the
+last flush are appended to one archive file per device, as received (not
+re-encoded), from a worker thread.
+
+Text datagrams (a device's metrics report, see main.py) are kept as the
+latest status line of the device last heard from that address.
+
+query() answers latest/range/rollup/status/stats questions, from Python or, with
+--query-port, as one JSON object per line over TCP:
+
+    {"op": "latest", "device": 305419896}
+    {"op": "range", "device": 305419896, "from": 1700000000, "to": 1700000600}
+    {"op": "rollup", "device": 305419896, "resolution": 60, "from": 1700000000}
+    {"op": "devices"}
+
+Usage:
+
+    python src/host/collector.py --port 62212 --data collected --query-port 62213
+    python src/host/collector.py --dump collected/1234abcd.pgc
+"""
+
+import argparse, asyncio, json, os, socket, struct, sys, time
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pigrostat'))
+
+from sht30 import hum_centi, temp_centi
+from telemetry import (CENTI_RECORD_FORMAT, CENTI_VERSIONS, FLAG_OK, RECORD_FORMAT, RECORD_SIZE, TICKS_PERIOD,
+                       UNIT_SHIFT, header)
+
+PORT = 62212
+RCVBUF = 4 << 20
+
+# how long a datagram may wait to be decoded with the ones after it
+DRAIN_S = 0.01
+
+# raw samples held per device and unit (an hour at 1 Hz)
+SAMPLES = 3600
+
+# rollup resolutions in seconds, and buckets held of each
+ROLLUPS = ((1, 600), (60, 1440), (3600, 720))
+
+# archive chunk: arrival time, clock, ticks_ms (of the datagram header; for
+# version 2, of its last record), the count of RECORD_SIZE records that follow,
+# exactly as received, and the datagram's version (0 in archives written before
+# it was kept, whose records are all in hundredths)
+ARCHIVE_CHUNK = '<dIIHBx'
+ARCHIVE_CHUNK_SIZE = struct.calcsize(ARCHIVE_CHUNK)
+ARCHIVE_SUFFIX = '.pgc'
+
+# runs of sequence numbers remembered per device, for dropping resent records
+SEEN_RUNS = 1024
+
+_record = struct.Struct(RECORD_FORMAT)
+_centi_record = struct.Struct(CENTI_RECORD_FORMAT)
+
+# the sensor's raw words in hundredths, looked up rather than worked out per record
+T_CENTI = [temp_centi(raw) for raw in range(65536)]
+RH_CENTI = [hum_centi(raw) for raw in range(65536)]
+
+
+def unpack_records(view, version):
+    """
+    A view's records as tuples in CENTI_RECORD_FORMAT order (T and RH in
+    hundredths), whichever version they came in
+    """
+    if version in CENTI_VERSIONS or version == 0:
+        return list(_centi_record.iter_unpack(view))
+    return [(sequence, ticks, T_CENTI[raw_t], RH_CENTI[raw_rh], relays, flags, cpu)
+            for sequence, ticks, raw_t, raw_rh, relays, flags, cpu in _record.iter_unpack(view)]
+_chunk = struct.Struct(ARCHIVE_CHUNK)
+_HALF_PERIOD = TICKS_PERIOD // 2
+
+
+def record_times(records, clock, ticks_ms, arrival):
+    """
+    Unix times for a datagram's records: from the clock/ticks pair in its
+    header, or (clock 0: an unsynced device) as if ticks_ms was on arrival
+    """
+    base = clock if clock else arrival
+    # ticks_ms wraps at 2**30; a record is within half a period of the header
+    return [base + (((r[1] - ticks_ms + _HALF_PERIOD) % TICKS_PERIOD) - _HALF_PERIOD) / 1000 for r in records]
+
+
+class Seen:
+    """
+    The sequence numbers taken from one device so far, as sorted, disjoint
+    [start, end) runs; a device numbers its records one after another (see
+    backlog.py), so this stays a handful of runs, split only where records
+    were lost or a reset skipped some numbers
+    """
+    def __init__(self, runs=SEEN_RUNS):
+        self.runs = runs
+        self.starts = []
+        self.ends = []
+
+    def take(self, first, end):
+        """
+        Mark [first, end) as seen; returns the parts of it that weren't, as
+        [start, end) pairs in order
+        """
+        starts, ends = self.starts, self.ends
+        new = []
+        pos = first
+        i = bisect_right(ends, first)
+        while pos < end and i < len(starts) and starts[i] < end:
+            if starts[i] > pos:
+                new.append((pos, starts[i]))
+            pos = max(pos, ends[i])
+            i += 1
+        if pos < end:
+            new.append((pos, end))
+        if new:
+            # merge with the runs it overlaps or touches
+            lo = bisect_left(ends, first)
+            hi = bisect_right(starts, end)
+            if lo < hi:
+                first, end = min(first, starts[lo]), max(end, ends[hi - 1])
+            starts[lo:hi] = [first]
+            ends[lo:hi] = [end]
+            if len(starts) > self.runs:
+                del starts[0], ends[0] # forget the oldest gap; anything before it counts as seen
+                starts[0] = 0
+        return new
+
+
+class Rollup:
+    """
+    Fixed-width time buckets of one series, in a ring: slot i holds bucket
+    number b (time // width) where b % slots == i
+    """
+    def __init__(self, width, slots):
+        self.width = width
+        self.slots = slots
+        self.bucket = array('q', [-1]) * slots
+        self.count = array('I', bytes(4 * slots))
+        self.ok = array('I', bytes(4 * slots))
+        self.on = array('I', bytes(4 * slots)) # samples with any relay on
+        self.t_sum = array('q', bytes(8 * slots))
+        self.t_min = array('h', bytes(2 * slots))
+        self.t_max = array('h', bytes(2 * slots))
+        self.rh_sum = array('q', bytes(8 * slots))
+        self.rh_min = array('H', bytes(2 * slots))
+        self.rh_max = array('H', bytes(2 * slots))
+        self.newest = -1 # highest bucket number seen
+
+    def add(self, times, ok, t, rh, relays):
+        # columns of one datagram, in time order; each run of samples in the
+        # same bucket is folded in at once
+        width = self.width
+        slots = self.slots
+        bucket_of, count, n_ok, on = self.bucket, self.count, self.ok, self.on
+        t_sum, t_min, t_max = self.t_sum, self.t_min, self.t_max
+        rh_sum, rh_min, rh_max = self.rh_sum, self.rh_min, self.rh_max
+        n = len(times)
+        start = 0
+        while start < n:
+            bucket = int(times[start] // width)
+            end = bisect_left(times, (bucket + 1) * width, start + 1)
+            if bucket > self.newest:
+                self.newest = bucket
+            elif bucket <= self.newest - slots:
+                start = end
+                continue # older than anything still held
+            slot = bucket % slots
+            if bucket_of[slot] != bucket:
+                bucket_of[slot] = bucket
+                count[slot] = n_ok[slot] = on[slot] = t_sum[slot] = rh_sum[slot] = 0
+                t_min[slot], t_max[slot] = 32767, -32768
+                rh_min[slot], rh_max[slot] = 65535, 0
+            if end == start + 1:
+                # one sample: at 1 s, nearly every bucket
+                count[slot] += 1
+                if relays[start]:
+                    on[slot] += 1
+                if ok[start]:
+                    value = t[start]
+                    n_ok[slot] += 1
+                    t_sum[slot] += value
+                    if value < t_min[slot]:
+                        t_min[slot] = value
+                    if value > t_max[slot]:
+                        t_max[slot] = value
+                    value = rh[start]
+                    rh_sum[slot] += value
+                    if value < rh_min[slot]:
+                        rh_min[slot] = value
+                    if value > rh_max[slot]:
+                        rh_max[slot] = value
+            else:
+                count[slot] += end - start
+                on[slot] += end - start - relays[start:end].count(0)
+                good = ok[start:end]
+                good_t = list(compress(t[start:end], good))
+                if good_t:
+                    good_rh = list(compress(rh[start:end], good))
+                    n_ok[slot] += len(good_t)
+                    t_sum[slot] += sum(good_t)
+                    t_min[slot] = min(t_min[slot], min(good_t))
+                    t_max[slot] = max(t_max[slot], max(good_t))
+                    rh_sum[slot] += sum(good_rh)
+                    rh_min[slot] = min(rh_min[slot], min(good_rh))
+                    rh_max[slot] = max(rh_max[slot], max(good_rh))
+            start = end
+
+    def rows(self, t0=0, t1=float('inf')):
+        """
+        Buckets overlapping t0..t1, oldest first, as dicts; T and RH in units
+        """
+        width = self.width
+        first = self.newest - self.slots + 1
+        if t0 > first * width:
+            first = int(t0 // width)
+        last = self.newest
+        if t1 < last * width:
+            last = int(t1 // width)
+        out = []
+        for bucket in range(first, last + 1):
+            slot = bucket % self.slots
+            if self.bucket[slot] != bucket:
+                continue
+            ok = self.ok[slot]
+            row = {'time': bucket * width, 'count': self.count[slot], 'ok': ok, 'on': self.on[slot]}
+            if ok:
+                row.update(t_mean=self.t_sum[slot] / ok / 100, t_min=self.t_min[slot] / 100,
+                           t_max=self.t_max[slot] / 100, rh_mean=self.rh_sum[slot] / ok / 100,
+                           rh_min=self.rh_min[slot] / 100, rh_max=self.rh_max[slot] / 100)
+            out.append(row)
+        return out
+
+
+class Series:
+    """
+    One sensor's recent samples, in arrival order, as a ring of columns, with
+    its rollups
+    """
+    def __init__(self, samples=SAMPLES, rollups=ROLLUPS):
+        self.size = samples
+        self.time = array('d', bytes(8 * samples))
+        self.sequence = array('I', bytes(4 * samples))
+        self.t = array('h', bytes(2 * samples))
+        self.rh = array('H', bytes(2 * samples))
+        self.relays = array('B', bytes(samples))
+        self.ok = array('B', bytes(samples))
+        self.cpu = array('h', bytes(2 * samples))
+        self.head = 0 # next slot written
+        self.count = 0
+        self.latest = -1 # slot of the newest sample by time
+        self.rollups = {width: Rollup(width, slots) for width, slots in rollups}
+
+    def add(self, times, sequence, t, rh, relays, ok, cpu):
+        # one datagram's columns, in time order (the order the device took them)
+        n = len(times)
+        if n > self.size:
+            times, sequence, t, rh, relays, ok, cpu = [column[-self.size:] for column in
+                                                        (times, sequence, t, rh, relays, ok, cpu)]
+            n = self.size
+        # at most two slice copies per column: up to the end of the ring, then from its start
+        head = self.head
+        first = min(n, self.size - head)
+        for column, values, kind in ((self.time, times, 'd'), (self.sequence, sequence, 'I'), (self.t, t, 'h'),
+                                     (self.rh, rh, 'H'), (self.relays, relays, 'B'), (self.ok, ok, 'B'),
+                                     (self.cpu, cpu, 'h')):
+            column[head:head + first] = array(kind, values[:first])
+            if first < n:
+                column[0:n - first] = array(kind, values[first:])
+        if self.latest < 0 or times[-1] >= self.time[self.latest]:
+            self.latest = (head + n - 1) % self.size
+        self.head = (head + n) % self.size
+        self.count = min(self.size, self.count + n)
+        for rollup in self.rollups.values():
+            rollup.add(times, ok, t, rh, relays)
+
+    def _row(self, i):
+        ok = self.ok[i]
+        return {'time': self.time[i], 'sequence': self.sequence[i],
+                't': self.t[i] / 100 if ok else None, 'rh': self.rh[i] / 100 if ok else None,
+                'relays': self.relays[i], 'ok': bool(ok), 'cpu': self.cpu[i] / 100}
+
+    def last(self):
+        return None if self.latest < 0 else self._row(self.latest)
+
+    def range(self, t0=0, t1=float('inf')):
+        """
+        Held samples from t0 to t1 inclusive, in time order
+        """
+        start = (self.head - self.count) % self.size
+        slots = [(start + i) % self.size for i in range(self.count)]
+        times = self.time
+        slots = [i for i in slots if t0 <= times[i] <= t1]
+        slots.sort(key=times.__getitem__) # backlog samples arrive after newer ones
+        return [self._row(i) for i in slots]
+
+
+class Device:
+    def __init__(self, device_id):
+        self.id = device_id
+        self.units = {} # unit number: Series
+        self.address = None
+        self.datagrams = 0
+        self.records = 0
+        self.duplicates = 0 # records already taken (resent from the device's backlog)
+        self.seen = Seen()
+        self.first_seen = None
+        self.last_seen = None
+        self.status = None # latest text datagram, and when
+        self.pending = bytearray() # archive chunks not yet flushed
+
+    def series(self, unit, samples, rollups):
+        series = self.units.get(unit)
+        if series is None:
+            series = self.units[unit] = Series(samples, rollups)
+        return series
+
+
+class Collector(asyncio.DatagramProtocol):
+    """
+    Ingests telemetry datagrams; run() serves until cancelled
+    """
+    def __init__(self, data_dir=None, flush=5.0, samples=SAMPLES, rollups=ROLLUPS):
+        self.data_dir = data_dir
+        self.flush_interval = flush
+        self.samples = samples
+        self.rollups = rollups
+        self.devices = {}
+        self.by_address = {} # (host, port): device id, for text datagrams
+        self.queue = []
+        self.scheduled = False
+        self.loop = None
+        self.transport = None
+        # counters
+        self.datagrams = 0
+        self.records = 0
+        self.texts = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.flushed_bytes = 0
+
+    # asyncio.DatagramProtocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queue.append((data, addr))
+        if not self.scheduled:
+            # asyncio hands over one datagram per wake-up, so give the rest of a
+            # burst a moment to queue up behind this one
+            self.scheduled = True
+            self.loop.call_later(DRAIN_S, self.drain)
+
+    # decoding
+
+    def drain(self):
+        """
+        Decode everything queued, as one batch
+        """
+        self.scheduled = False
+        queue = self.queue
+        if not queue:
+            return
+        self.queue = []
+        self.batches += 1
+        arrival = time.time()
+        for data, addr in queue:
+            self.ingest(data, addr, arrival)
+
+    def ingest(self, data, addr=None, arrival=None):
+        """
+        Decode one datagram; returns the number of records taken
+        """
+        if arrival is None:
+            arrival = time.time()
+        self.datagrams += 1
+        try:
+            device_id, count, clock, ticks_ms, size, version = header(data)
+        except ValueError:
+            if data[:2] != b'PG' and addr is not None and addr in self.by_address:
+                # a status line, e.g. the device's metrics report
+                self.texts += 1
+                self.devices[self.by_address[addr]].status = (arrival, bytes(data).decode('utf-8', 'replace'))
+            else:
+                self.rejected += 1
+            return 0
+        if count == 0:
+            return 0
+
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = Device(device_id)
+            device.first_seen = arrival
+        if addr is not None:
+            device.address = addr
+            self.by_address[addr] = device_id
+        device.datagrams += 1
+        device.last_seen = arrival
+
+        view = memoryview(data)[size:size + count * RECORD_SIZE]
+        records = unpack_records(view, version)
+        if not clock and not ticks_ms:
+            ticks_ms = records[-1][1] # version 2: as if the last record was taken on arrival
+
+        # drop records already taken: each fresh part is a slice of the datagram
+        first = records[0][0]
+        if records[-1][0] - first == count - 1:
+            fresh = [(start - first, end - first) for start, end in device.seen.take(first, first + count)]
+        else:
+            fresh = []
+            for i, record in enumerate(records): # not numbered one after another: a record at a time
+                if device.seen.take(record[0], record[0] + 1):
+                    if fresh and fresh[-1][1] == i:
+                        fresh[-1] = (fresh[-1][0], i + 1)
+                    else:
+                        fresh.append((i, i + 1))
+        taken = sum(end - start for start, end in fresh)
+        device.duplicates += count - taken
+        self.duplicates += count - taken
+        if not taken:
+            return 0
+        if taken < count:
+            records = [record for start, end in fresh for record in records[start:end]]
+            count = taken
+        device.records += count
+        self.records += count
+
+        if self.data_dir is not None:
+            for start, end in fresh:
+                device.pending += _chunk.pack(arrival, clock, ticks_ms, end - start, version)
+                device.pending += view[start * RECORD_SIZE:end * RECORD_SIZE]
+        times = record_times(records, clock, ticks_ms, arrival)
+
+        # columns, split by sensor unit (one unit unless the device is a rack)
+        sequence, _, t, rh, relays, flags, cpu = zip(*records)
+        units = {flag >> UNIT_SHIFT for flag in flags}
+        if len(units) == 1:
+            ok = [flag & FLAG_OK for flag in flags]
+            device.series(units.pop(), self.samples, self.rollups).add(
+                times, sequence, t, rh, relays, ok, cpu)
+        else:
+            for unit in units:
+                rows = [i for i in range(count) if flags[i] >> UNIT_SHIFT == unit]
+                device.series(unit, self.samples, self.rollups).add(
+                    [times[i] for i in rows], [sequence[i] for i in rows], [t[i] for i in rows],
+                    [rh[i] for i in rows], [relays[i] for i in rows], [flags[i] & FLAG_OK for i in rows],
+                    [cpu[i] for i in rows])
+        return count
+
+    # archive
+
+    def take_pending(self):
+        # (path, bytes) for each device with unflushed datagrams
+        out = []
+        for device in self.devices.values():
+            if device.pending:
+                out.append((os.path.join(self.data_dir, f'{device.id:08x}{ARCHIVE_SUFFIX}'), device.pending))
+                device.pending = bytearray()
+        return out
+
+    @staticmethod
+    def write_pending(pending):
+        written = 0
+        for path, data in pending:
+            with open(path, 'ab') as f:
+                f.write(data)
+            written += len(data)
+        return written
+
+    async def flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """
+        Append what has arrived since the last flush to the archives, off the event loop
+        """
+        pending = self.take_pending()
+        if pending:
+            self.flushed_bytes += await self.loop.run_in_executor(None, self.write_pending, pending)
+
+    # queries
+
+    def query(self, request):
+        """
+        Answer a query dict (see the module docstring); raises KeyError or
+        ValueError for a bad one
+        """
+        op = request.get('op', 'latest')
+        if op == 'devices':
+            return [{'device': device.id, 'address': device.address and device.address[0],
+                     'units': sorted(device.units), 'datagrams': device.datagrams, 'records': device.records,
+                     'duplicates': device.duplicates,
+                     'last_seen': device.last_seen} for device in self.devices.values()]
+        if op == 'stats':
+            return {'devices': len(self.devices), 'datagrams': self.datagrams, 'records': self.records,
+                    'duplicates': self.duplicates, 'texts': self.texts, 'rejected': self.rejected,
+                    'batches': self.batches, 'flushed_bytes': self.flushed_bytes}
+        device = self.devices[int(request['device'])]
+        if op == 'status':
+            return None if device.status is None else {'time': device.status[0], 'text': device.status[1]}
+        series = device.units[int(request.get('unit', 0))]
+        t0 = float(request.get('from', 0))
+        t1 = float(request.get('to', float('inf')))
+        if op == 'latest':
+            return series.last()
+        if op == 'range':
+            return series.range(t0, t1)
+        if op == 'rollup':
+            return series.rollups[int(request.get('resolution', 60))].rows(t0, t1)
+        raise ValueError(f'unknown op {op}')
+
+    async def serve_queries(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = {'result': self.query(json.loads(line))}
+                except (KeyError, ValueError, TypeError) as ex:
+                    reply = {'error': f'{type(ex).__name__}: {ex}'}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self, host='0.0.0.0', port=PORT, query_port=None, report=0):
+        self.loop = asyncio.get_running_loop()
+        if self.data_dir is not None:
+            os.makedirs(self.data_dir, exist_ok=True)
+        transport, _ = await self.loop.create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        # room for a burst of datagrams (a fleet coming back online) while a batch is decoded
+        transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        tasks = []
+        server = None
+        try:
+            if self.data_dir is not None:
+                tasks.append(asyncio.ensure_future(self.flusher()))
+            if query_port is not None:
+                server = await asyncio.start_server(self.serve_queries, host, query_port)
+            if report:
+                tasks.append(asyncio.ensure_future(self.reporter(report)))
+            await asyncio.Future() # until cancelled
+        finally:
+            for task in tasks:
+                task.cancel()
+            if server is not None:
+                server.close()
+            transport.close()
+            self.drain()
+            if self.data_dir is not None:
+                self.write_pending(self.take_pending())
+
+    async def reporter(self, interval):
+        last = (time.perf_counter(), self.datagrams, self.records)
+        while True:
+            await asyncio.sleep(interval)
+            now = (time.perf_counter(), self.datagrams, self.records)
+            elapsed = now[0] - last[0]
+            print(f'{len(self.devices)} devices, {(now[1] - last[1]) / elapsed:.0f} datagrams/s, '
+                  f'{(now[2] - last[2]) / elapsed:.0f} records/s, {self.rejected} rejected', flush=True)
+            last = now
+
+
+def read_archive(path):
+    """
+    Yields (time, sequence, T, RH, relay bits, ok, unit, CPU) from an archive
+    file, in the order the datagrams arrived; T, RH and CPU in hundredths
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    while pos + ARCHIVE_CHUNK_SIZE <= len(data):
+        arrival, clock, ticks_ms, count, version = _chunk.unpack_from(data, pos)
+        pos += ARCHIVE_CHUNK_SIZE
+        end = pos + count * RECORD_SIZE
+        if end > len(data):
+            break # cut short by a crash mid-write
+        records = unpack_records(memoryview(data)[pos:end], version)
+        for when, (sequence, _, t, rh, relays, flags, cpu) in zip(record_times(records, clock, ticks_ms, arrival),
+                                                                  records):
+            yield when, sequence, t, rh, relays, flags & FLAG_OK != 0, flags >> UNIT_SHIFT, cpu
+        pos = end
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='collect pigrostat telemetry')
+    parser.add_argument('--host', default='0.0.0.0', help='address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='UDP port for telemetry')
+    parser.add_argument('--query-port', type=int, help='TCP port for JSON-lines queries')
+    parser.add_argument('--data', help='directory for the per-device archives (none: keep in memory only)')
+    parser.add_argument('--flush', type=float, default=5.0, help='seconds between archive writes')
+    parser.add_argument('--samples', type=int, default=SAMPLES, help='raw samples held per device and unit')
+    parser.add_argument('--report', type=float, default=10.0, help='seconds between rate reports (0: none)')
+    parser.add_argument('--dump', metavar='ARCHIVE', help='print an archive file as CSV and exit')
+    args = parser.parse_args(argv)
+
+    if args.dump:
+        print('time,unit,sequence,t,rh,relays,ok,cpu')
+        for when, sequence, t, rh, relays, ok, unit, cpu in read_archive(args.dump):
+            if ok:
+                print(f'{when:.3f},{unit},{sequence},{t / 100},{rh / 100},{relays},1,{cpu / 100}')
+            else:
+                print(f'{when:.3f},{unit},{sequence},,,{relays},0,{cpu / 100}')
+        return 0
+
+    collector = Collector(args.data, args.flush, args.samples)
+    try:
+        asyncio.run(collector.run(args.host, args.port, args.query_port, args.report))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
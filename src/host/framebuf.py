@@ -0,0 +1,122 @@
+# host stand-in for MicroPython's `framebuf`; only MONO_VLSB (the SSD1306
+# layout) is implemented. Glyphs are synthetic rather than the firmware's
+# 8x8 font: each character gets a stable, distinct bit pattern, which is all
+# that matters for measuring what reaches the bus
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS2_HMSB = 5
+GS4_HMSB = 2
+GS8 = 6
+
+
+def _glyph(ch):
+    code = ord(ch)
+    if code == 32:
+        return bytes(8)
+    seed = (code * 2654435761) & 0xFFFFFFFF
+    cols = bytearray(8)
+    for i in range(1, 7):
+        cols[i] = ((seed >> (i * 4)) & 0x7E) | 0x02
+    return bytes(cols)
+
+
+_FONT = {}
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError('only MONO_VLSB is supported on the host')
+        self.buf = buffer
+        self.width = width
+        self.height = height
+        self.stride = width if stride is None else stride
+
+    def _set(self, x, y, c):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            index = (y >> 3) * self.stride + x
+            bit = 1 << (y & 7)
+            if c:
+                self.buf[index] |= bit
+            else:
+                self.buf[index] &= ~bit & 0xFF
+
+    def fill(self, c):
+        value = 0xFF if c else 0x00
+        for page in range((self.height + 7) >> 3):
+            start = page * self.stride
+            self.buf[start:start + self.width] = bytes((value,)) * self.width
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                return (self.buf[(y >> 3) * self.stride + x] >> (y & 7)) & 1
+            return 0
+        self._set(x, y, c)
+
+    def hline(self, x, y, w, c):
+        for i in range(x, x + w):
+            self._set(i, y, c)
+
+    def vline(self, x, y, h, c):
+        for j in range(y, y + h):
+            self._set(x, j, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        for j in range(y, y + h):
+            self.hline(x, j, w, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx, dy = abs(x2 - x1), -abs(y2 - y1)
+        sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+        err = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            glyph = _FONT.get(ch)
+            if glyph is None:
+                glyph = _FONT[ch] = _glyph(ch)
+            for col in range(8):
+                bits = glyph[col]
+                for row in range(8):
+                    if bits & (1 << row):
+                        self._set(x + col, y + row, c)
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        copy = FrameBuffer(bytearray(self.buf), self.width, self.height, MONO_VLSB, self.stride)
+        self.fill(0)
+        for y in range(self.height):
+            for x in range(self.width):
+                if copy.pixel(x, y):
+                    self._set(x + xstep, y + ystep, 1)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for j in range(fbuf.height):
+            for i in range(fbuf.width):
+                c = fbuf.pixel(i, j)
+                if c != key:
+                    self._set(x + i, y + j, c)
@@ -0,0 +1,363 @@
+"""
+Synthetic telemetry load: a fleet of virtual pigrostat devices in one process.
+
+Each virtual device samples a simulated SHT30 (machine.Environment, encoded
+and decoded as the sensor and driver do) every --interval seconds, packs the
+samples with the device's own TelemetryBatch, and sends a datagram when the
+batch is --batch seconds old or full, as uplink.Reporter does. Now and then
+its link drops (--dropout, --down; fleet-wide with --outage). While the link
+is down, datagrams wait in a backlog of --backlog slots, which overwrites the
+oldest when full. Once the link is back the backlog drains in bursts of
+--burst, as on the device. Each device also sends a metrics line every
+--metrics seconds.
+
+Device time runs --speed times faster than real time, so 200 devices at speed
+30 send as much as 6000 would. Several speeds step the load up, each for
+--duration seconds. With --query (a running collector's query port) or --spawn
+(start collector.py on free ports), each step also reports how much of the
+load the receiver got.
+
+Devices near each other share a room (one Environment), as in a grow room with
+several chambers; the rooms' readings are worked out once, up front, so the
+generator spends its time sending rather than simulating.
+
+Usage:
+
+    python src/host/loadgen.py --spawn --devices 200 --speed 10,50,100,200
+    python src/host/loadgen.py --target 192.168.1.10:62212 --query 192.168.1.10:62213 --devices 500
+"""
+
+import argparse, asyncio, json, os, random, socket, subprocess, sys, time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pigrostat'))
+
+from machine import Environment, Sht30Device
+from backlog import SLOTS as BACKLOG
+from sht30 import hum_centi
+from telemetry import BATCH_S, BURST, DRAIN_MS, GAP_S, MTU, TICKS_PERIOD, TelemetryBatch
+
+PORT = 62212
+
+# the shipped config's humidifier: on below 70 %RH, off above 75
+RH_ON = 7000
+RH_OFF = 7500
+
+# how long after a step the receiver is given to catch up before it's asked
+SETTLE_S = 1.0
+
+
+class Room:
+    """
+    One cycle of an environment's readings at the sample interval: the
+    simulated sensor's raw T and RH words, and the humidifier relay
+    """
+    def __init__(self, seed, interval):
+        rng = random.Random(seed)
+        environment = Environment(temperature=rng.uniform(21, 27), humidity=rng.uniform(70, 75),
+                                  period_s=rng.uniform(300, 900), seed=seed)
+        sensor = Sht30Device(environment=environment)
+        # temperature swings over 3 humidity periods (see Environment.sample)
+        n = max(1, round(3 * environment.period_s / interval))
+        readings = [sensor.encode(*environment.sample(round(i * interval * 1_000_000))) for i in range(n)]
+        self.raw_t = [data[0] << 8 | data[1] for data in readings]
+        self.raw_rh = [data[3] << 8 | data[4] for data in readings]
+        relays = [0] * n
+        on = 0
+        for _ in range(2): # the second time round starts from where the cycle ends
+            for i, raw_rh in enumerate(self.raw_rh):
+                rh = hum_centi(raw_rh)
+                if rh < RH_ON:
+                    on = 1
+                elif rh > RH_OFF:
+                    on = 0
+                relays[i] = on
+        self.relays = relays
+
+
+class Step:
+    """
+    One load level: counters for the datagrams sent while it ran
+    """
+    def __init__(self, speed):
+        self.speed = speed
+        self.datagrams = 0
+        self.records = 0
+        self.texts = 0
+        self.dropped = 0 # send buffer full: lost before the wire
+        self.overwritten = 0 # backlog full: lost on the device
+        self.lag = 0.0 # worst lateness of a send, in real seconds
+        self.elapsed = 0.0
+        self.received = None # from the collector, when there is one
+        self.received_records = None
+        self.backlog = 0 # left waiting on the devices at the end
+
+
+class VirtualDevice:
+    def __init__(self, index, room, args, target, rng):
+        self.index = index
+        self.room = room
+        self.args = args
+        self.rng = rng
+        self.batch = TelemetryBatch(0x50000000 + index, args.mtu)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.connect(target)
+        self.backlog = deque(maxlen=args.backlog)
+        self.sequence = 0
+        self.sample = rng.randrange(len(room.raw_t)) # where in the room's cycle it started
+        self.boot_ticks = rng.randrange(TICKS_PERIOD)
+        self.cpu = 2500 + rng.randrange(500)
+        self.vnow = 0.0 # device time, in seconds since the run started
+        # spread the fleet out, rather than all sending on the same tick
+        self.next_send = rng.uniform(0, args.batch)
+        self.next_sample = rng.uniform(0, args.interval)
+        self.next_drain = None
+        self.next_metrics = rng.uniform(0, args.metrics) if args.metrics else None
+        self.up = True
+        self.link_change = self.__next_drop()
+
+    def __next_drop(self):
+        return self.rng.expovariate(1 / self.args.dropout) if self.args.dropout else float('inf')
+
+    def __send(self, datagram, step):
+        try:
+            self.sock.send(datagram)
+            return True
+        except (BlockingIOError, ConnectionRefusedError):
+            # a full send buffer, or (over loopback) nothing listening yet
+            step.dropped += 1
+            return False
+
+    def __link_up(self, vnow):
+        outage = self.args.outage
+        return self.up and not (outage and outage[0] <= vnow < outage[0] + outage[1])
+
+    def __advance(self, vnow, step):
+        # everything the device would have done up to vnow, in order
+        args = self.args
+        batch = self.batch
+        room = self.room
+        n = len(room.raw_t)
+        while True:
+            due = min(self.next_sample, self.next_send, self.link_change,
+                      self.next_drain if self.next_drain is not None else float('inf'),
+                      self.next_metrics if self.next_metrics is not None else float('inf'))
+            if due > vnow:
+                return
+            ticks = (self.boot_ticks + int(due * 1000)) % TICKS_PERIOD
+            if due == self.link_change:
+                self.up = not self.up
+                self.link_change = due + (self.__next_drop() if self.up else
+                                          self.rng.expovariate(1 / args.down))
+            elif due == self.next_sample:
+                i = self.sample % n
+                batch.add(self.sequence, ticks, True, room.raw_t[i], room.raw_rh[i], room.relays[i], self.cpu)
+                self.sample += 1
+                self.sequence += 1
+                self.next_sample = due + args.interval
+                if batch.full():
+                    self.next_send = due
+            elif due == self.next_send:
+                if batch.count:
+                    datagram = bytes(batch.payload(args.clock + int(due), ticks))
+                    if self.__link_up(due) and self.__send(datagram, step):
+                        step.datagrams += 1
+                        step.records += batch.count
+                    else:
+                        if len(self.backlog) == self.backlog.maxlen:
+                            step.overwritten += 1
+                        self.backlog.append(datagram)
+                    batch.clear()
+                period = args.batch * (1 + self.rng.uniform(-args.jitter, args.jitter))
+                self.next_send = due + period
+                if self.backlog and self.next_drain is None:
+                    self.next_drain = due + args.gap
+            elif due == self.next_drain:
+                # one burst of the backlog, as Reporter.run drains it
+                self.next_drain = None
+                if self.__link_up(due):
+                    for _ in range(args.burst):
+                        if not self.backlog or not self.__send(self.backlog[0], step):
+                            break
+                        datagram = self.backlog.popleft()
+                        step.datagrams += 1
+                        step.records += datagram[3]
+                if self.backlog:
+                    self.next_drain = due + max(args.gap, args.burst * args.drain / 1000)
+            else:
+                self.next_metrics = due + args.metrics
+                if self.__link_up(due) and self.__send(b'Metrics 60000 ms: loadgen; errors none; idle 90%', step):
+                    step.datagrams += 1
+                    step.texts += 1
+
+    def next_due(self):
+        return min(self.next_sample, self.next_send, self.link_change,
+                   self.next_drain if self.next_drain is not None else float('inf'),
+                   self.next_metrics if self.next_metrics is not None else float('inf'))
+
+    async def run(self, step, vstart, rstart, rend):
+        # device time vstart + (real - rstart) * speed, until real time rend
+        speed = step.speed
+        while True:
+            rnow = time.perf_counter()
+            if rnow >= rend:
+                self.vnow = vstart + (rend - rstart) * speed
+                self.__advance(self.vnow, step)
+                return
+            vnow = vstart + (rnow - rstart) * speed
+            due = self.next_due()
+            if due <= vnow:
+                step.lag = max(step.lag, (vnow - due) / speed)
+                self.__advance(vnow, step)
+                due = self.next_due()
+            await asyncio.sleep(min(rend, rstart + (due - vstart) / speed) - rnow)
+
+
+async def _query(address, request):
+    reader, writer = await asyncio.open_connection(*address)
+    try:
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+    finally:
+        writer.close()
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+    return reply['result']
+
+
+async def _wait_for(address, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await _query(address, {'op': 'stats'})
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run(args, target, query):
+    rooms = [Room(args.seed + i, args.interval) for i in range(args.rooms)]
+    rng = random.Random(args.seed)
+    per_room = -(-args.devices // args.rooms)
+    devices = [VirtualDevice(i, rooms[i // per_room], args, target, rng) for i in range(args.devices)]
+    steps = []
+    before = await _wait_for(query) if query else None
+    vstart = 0.0
+    try:
+        for speed in args.speed:
+            step = Step(speed)
+            rstart = time.perf_counter()
+            rend = rstart + args.duration
+            await asyncio.gather(*[device.run(step, vstart, rstart, rend) for device in devices])
+            step.elapsed = time.perf_counter() - rstart
+            vstart = devices[0].vnow
+            step.backlog = sum(len(device.backlog) for device in devices)
+            if query:
+                await asyncio.sleep(SETTLE_S)
+                after = await _query(query, {'op': 'stats'})
+                step.received = after['datagrams'] - before['datagrams']
+                step.received_records = after['records'] - before['records']
+                before = after
+            steps.append(step)
+            if not args.json:
+                print(_row(step, args), flush=True)
+    finally:
+        for device in devices:
+            device.sock.close()
+    return steps
+
+
+COLUMNS = ['speed', 'as devices', 'target dg/s', 'sent dg/s', 'records/s', 'dropped', 'overwritten', 'backlog',
+           'recv dg/s', 'loss %', 'lag ms']
+
+
+def _row(step, args):
+    # one line of the table, padded to the header
+    target = args.devices * step.speed * (1 / args.batch + (1 / args.metrics if args.metrics else 0))
+    cells = [f'{step.speed:g}', f'{args.devices * step.speed:g}', f'{target:.0f}',
+             f'{step.datagrams / step.elapsed:.0f}', f'{step.records / step.elapsed:.0f}',
+             str(step.dropped), str(step.overwritten), str(step.backlog)]
+    if step.received is None:
+        cells += ['-', '-']
+    else:
+        loss = 100 * (step.datagrams - step.received) / step.datagrams if step.datagrams else 0
+        cells += [f'{step.received / step.elapsed:.0f}', f'{loss:.2f}']
+    cells.append(f'{step.lag * 1000:.0f}')
+    return '  '.join(cell.rjust(max(len(title), 7)) for cell, title in zip(cells, COLUMNS))
+
+
+def _address(text, port):
+    host, _, p = text.rpartition(':')
+    return (host, int(p)) if host else (text, port)
+
+
+def _free_port(kind):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='synthetic pigrostat telemetry load')
+    parser.add_argument('--target', default=f'127.0.0.1:{PORT}', help='collector address (host:port)')
+    parser.add_argument('--query', help="the collector's query port (host:port), to measure loss")
+    parser.add_argument('--spawn', action='store_true', help='run collector.py for the test, on free local ports')
+    parser.add_argument('--devices', type=int, default=200, help='virtual devices')
+    parser.add_argument('--rooms', type=int, default=8, help='environments shared among them')
+    parser.add_argument('--speed', default='1', help='device seconds per real second; a comma list steps the load')
+    parser.add_argument('--duration', type=float, default=10.0, help='real seconds per step')
+    parser.add_argument('--interval', type=float, default=1.0, help='device seconds between samples')
+    parser.add_argument('--batch', type=float, default=BATCH_S, help='device seconds between datagrams')
+    parser.add_argument('--jitter', type=float, default=0.1, help='random spread of --batch, as a fraction')
+    parser.add_argument('--mtu', type=int, default=MTU, help='datagram size limit, which caps samples per datagram')
+    parser.add_argument('--dropout', type=float, default=600.0,
+                        help='mean device seconds between link drops per device (0: never)')
+    parser.add_argument('--down', type=float, default=60.0, help='mean device seconds a dropped link stays down')
+    parser.add_argument('--outage', help='AT,FOR: the whole fleet offline from device second AT for FOR seconds')
+    parser.add_argument('--backlog', type=int, default=BACKLOG, help='datagrams a device keeps while offline')
+    parser.add_argument('--burst', type=int, default=BURST, help='backlog datagrams per burst')
+    parser.add_argument('--drain', type=float, default=DRAIN_MS, help='ms between datagrams of a burst')
+    parser.add_argument('--gap', type=float, default=GAP_S, help='device seconds between bursts')
+    parser.add_argument('--metrics', type=float, default=60.0, help='device seconds between metrics lines (0: none)')
+    parser.add_argument('--clock', type=int, default=int(time.time()), help='Unix time the devices start at')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='emit JSON instead of a table')
+    args = parser.parse_args(argv)
+    args.speed = [float(speed) for speed in args.speed.split(',')]
+    args.outage = [float(value) for value in args.outage.split(',')] if args.outage else None
+    if args.devices < 1 or args.rooms < 1:
+        parser.error('need at least one device and room')
+    args.rooms = min(args.rooms, args.devices)
+
+    target = _address(args.target, PORT)
+    query = _address(args.query, PORT + 1) if args.query else None
+    collector = None
+    if args.spawn:
+        target = ('127.0.0.1', _free_port(socket.SOCK_DGRAM))
+        query = ('127.0.0.1', _free_port(socket.SOCK_STREAM))
+        collector = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'collector.py'),
+                                      '--host', '127.0.0.1', '--port', str(target[1]),
+                                      '--query-port', str(query[1]), '--report', '0'])
+
+    if not args.json:
+        print(f'{args.devices} devices in {args.rooms} rooms, sending to {target[0]}:{target[1]}')
+        print('  '.join(title.rjust(7) for title in COLUMNS))
+    try:
+        steps = asyncio.run(run(args, target, query))
+    except KeyboardInterrupt:
+        return 1
+    finally:
+        if collector is not None:
+            collector.terminate()
+            collector.wait()
+    if args.json:
+        json.dump([step.__dict__ for step in steps], sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Reads sample logs (samples.log, copied off devices) on the host.
+
+Each file is memory-mapped rather than read: block headers give the sparse
+time index, a range read binary-searches into the blocks that overlap it, and
+records are unpacked straight out of the mapping, so logs from many devices can
+be scanned without loading or parsing them. The format is defined by
+src/pigrostat/samplelog.py.
+
+Usage:
+
+    python src/host/logview.py logs/*.log --summary
+    python src/host/logview.py pico-1.log --from 2024-05-01T00:00 --to 2024-05-02T00:00
+"""
+
+import argparse, calendar, mmap, os, struct, sys, time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pigrostat'))
+
+from samplelog import (BLOCK_SIZE, FLAG_OK, FLAG_VALID, HEADER_FORMAT, HEADER_SIZE, MAGIC,
+                       RECORD_FORMAT, RECORD_SIZE, RECORDS_PER_BLOCK, UNIT_MASK, UNIT_SHIFT, VERSION)
+from sht30 import hum_centi, temp_centi
+
+_record = struct.Struct(RECORD_FORMAT)
+
+
+class Block:
+    __slots__ = ('index', 'sequence', 'base', 'count', 'offset', 'first', 'last')
+
+    def __init__(self, index, sequence, base, count, offset, first, last):
+        self.index = index
+        self.sequence = sequence
+        self.base = base
+        self.count = count
+        self.offset = offset # of the first record in the file
+        self.first = first # time of the first and last records
+        self.last = last
+
+
+class SampleLogFile:
+    """
+    A sample log mapped read-only; blocks are in the order they were written
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.blocks = []
+        for index in range(len(self._map) // BLOCK_SIZE):
+            start = index * BLOCK_SIZE
+            magic, version, size, _, sequence, base = struct.unpack_from(HEADER_FORMAT, self._map, start)
+            if magic != MAGIC:
+                continue
+            if version != VERSION or size != RECORD_SIZE:
+                raise ValueError(f'{path}: unsupported log version {version}')
+            offset = start + HEADER_SIZE
+            count = self._find_end(offset)
+            if count:
+                self.blocks.append(Block(index, sequence, base, count, offset,
+                                         base + self._offset(offset, 0), base + self._offset(offset, count - 1)))
+        self.blocks.sort(key=lambda block: block.sequence)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return sum(block.count for block in self.blocks)
+
+    def _offset(self, offset, index):
+        return struct.unpack_from('<H', self._map, offset + index * RECORD_SIZE)[0]
+
+    def _find_end(self, offset):
+        lo, hi = 0, RECORDS_PER_BLOCK
+        flags = RECORD_SIZE - 1
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self._map[offset + mid * RECORD_SIZE + flags] & FLAG_VALID:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _spans(self, t0, t1):
+        # (block, first index, end index) for each block with records in range
+        for block in self.blocks:
+            if block.first > t1 or block.last < t0:
+                continue
+            lo, hi = 0, block.count
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if block.base + self._offset(block.offset, mid) < t0:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            end = lo
+            hi = block.count
+            while end < hi:
+                mid = (end + hi) >> 1
+                if block.base + self._offset(block.offset, mid) <= t1:
+                    end = mid + 1
+                else:
+                    hi = mid
+            if end > lo:
+                yield block, lo, end
+
+    def records(self, t0=0, t1=0xFFFFFFFF):
+        """
+        Yields (t, raw T, raw RH, relay bits, ok, unit) from t0 to t1 inclusive
+        """
+        for block, lo, end in self._spans(t0, t1):
+            start = block.offset + lo * RECORD_SIZE
+            view = memoryview(self._map)[start:block.offset + end * RECORD_SIZE]
+            try:
+                for offset, raw_t, raw_rh, relays, flags in _record.iter_unpack(view):
+                    yield (block.base + offset, raw_t, raw_rh, relays, flags & FLAG_OK != 0,
+                           (flags >> UNIT_SHIFT) & UNIT_MASK)
+            finally:
+                view.release()
+
+    def columns(self, t0=0, t1=0xFFFFFFFF, unit=None):
+        """
+        The range as arrays: times, T and RH in hundredths, relay bits and ok
+        flags; failed reads are left in (ok 0) with T and RH as 0. With unit,
+        just that sensor's records (logs from a rack hold several)
+        """
+        times = array('I')
+        t = array('i')
+        rh = array('i')
+        relays = array('B')
+        ok = array('B')
+        for when, raw_t, raw_rh, bits, good, which in self.records(t0, t1):
+            if unit is not None and which != unit:
+                continue
+            times.append(when)
+            t.append(temp_centi(raw_t) if good else 0)
+            rh.append(hum_centi(raw_rh) if good else 0)
+            relays.append(bits)
+            ok.append(good)
+        return times, t, rh, relays, ok
+
+    def units(self):
+        """
+        The sensor unit numbers that appear in the log
+        """
+        return sorted({record[5] for record in self.records()})
+
+
+def _parse_time(text):
+    if text is None:
+        return None
+    if text.isdigit():
+        return int(text)
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(text, fmt))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f'not a time: {text}')
+
+
+def _iso(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='read pigrostat sample logs')
+    parser.add_argument('paths', nargs='+', help='sample log files')
+    parser.add_argument('--from', dest='start', type=_parse_time, help='first time (UTC, ISO or epoch seconds)')
+    parser.add_argument('--to', dest='end', type=_parse_time, help='last time (inclusive)')
+    parser.add_argument('--summary', action='store_true', help='one line per file instead of the records')
+    args = parser.parse_args(argv)
+    t0 = 0 if args.start is None else args.start
+    t1 = 0xFFFFFFFF if args.end is None else args.end
+
+    if not args.summary:
+        print('file,unit,time,t,rh,relays,ok')
+    for path in args.paths:
+        with SampleLogFile(path) as log:
+            name = os.path.basename(path)
+            if args.summary:
+                units = log.units() or [0]
+                for unit in units:
+                    # one line per sensor, for logs from a rack
+                    label = name if len(units) == 1 else f'{name} unit {unit}'
+                    times, t, rh, relays, ok = log.columns(t0, t1, unit)
+                    good = [i for i in range(len(times)) if ok[i]]
+                    if not good:
+                        print(f'{label}: {len(times)} records, no readings')
+                        continue
+                    print(f'{label}: {len(times)} records {_iso(times[0])}..{_iso(times[-1])}, '
+                          f'T {min(t[i] for i in good) / 100}..{max(t[i] for i in good) / 100} C, '
+                          f'RH {min(rh[i] for i in good) / 100}..{max(rh[i] for i in good) / 100} %, '
+                          f'{len(times) - len(good)} failed reads')
+            else:
+                for when, raw_t, raw_rh, relays, ok, unit in log.records(t0, t1):
+                    if ok:
+                        print(f'{name},{unit},{_iso(when)},{temp_centi(raw_t) / 100},{hum_centi(raw_rh) / 100},{relays},1')
+                    else:
+                        print(f'{name},{unit},{_iso(when)},,,{relays},0')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# host stand-in for MicroPython's `machine` module (rp2 port flavour); every
+# object delegates to the active Board, so device code sees simulated buses,
+# pins and clocks while running under CPython
+
+from .board import Board, DEVICE_DIR
+from .clock import Halt, VirtualClock
+from .devices import Environment, Pcf8574LcdDevice, Sht30Device, Ssd1306Device, Tca9548aDevice
+
+_board = None
+
+
+def board():
+    global _board
+    if _board is None:
+        _board = Board()
+    return _board
+
+
+def _pin_id(pin):
+    return pin.id if isinstance(pin, Pin) else pin
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, *, value=None):
+        self.id = id
+        self._state = board().pin(id)
+        self.init(mode, pull, value=value)
+
+    def init(self, mode=-1, pull=-1, *, value=None):
+        if mode != -1:
+            self._state.mode = mode
+        if value is not None:
+            self._state.set(value)
+
+    def value(self, x=None):
+        if x is None:
+            return self._state.value
+        self._state.set(x)
+
+    def __call__(self, x=None):
+        return self.value(x)
+
+    def on(self):
+        self._state.set(1)
+
+    def off(self):
+        self._state.set(0)
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self._state.set(not self._state.value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        previous = [self._state.value]
+
+        def listener(state, value):
+            # edges only; rewriting the same level is not an interrupt
+            if value == previous[0]:
+                return
+            previous[0] = value
+            if handler is not None and ((value and trigger & Pin.IRQ_RISING) or (not value and trigger & Pin.IRQ_FALLING)):
+                handler(self)
+        self._state.listeners.append(listener)
+
+    def __repr__(self):
+        name = self.id if isinstance(self.id, str) else f'GPIO{self.id}'
+        mode = {Pin.IN: 'IN', Pin.OUT: 'OUT', Pin.OPEN_DRAIN: 'OPEN_DRAIN', Pin.ALT: 'ALT'}.get(self._state.mode)
+        return f'Pin({name}, mode={mode})' if mode else f'Pin({name})'
+
+
+class ADC:
+    def __init__(self, pin):
+        self.channel = _pin_id(pin)
+
+    def read_u16(self):
+        return board().read_adc(self.channel)
+
+
+class RTC:
+    def datetime(self, value=None):
+        if value is None:
+            return board().rtc_datetime()
+        board().set_rtc_datetime(value)
+
+
+class _I2CBase:
+    def __init__(self, scl, sda, freq):
+        self._bus = board().bus(_pin_id(sda), _pin_id(scl))
+        self._bus.freq = freq
+
+    def scan(self):
+        return self._bus.scan()
+
+    def writeto(self, addr, buf, stop=True):
+        return self._bus.write(addr, buf)
+
+    def writevto(self, addr, vector, stop=True):
+        return self._bus.write(addr, b''.join(bytes(b) for b in vector))
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._bus.read(addr, nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self._bus.read(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, *, addrsize=8):
+        return self._bus.write(addr, memaddr.to_bytes(addrsize // 8, 'big') + bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, *, addrsize=8):
+        self._bus.write(addr, memaddr.to_bytes(addrsize // 8, 'big'))
+        return self._bus.read(addr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, *, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize=addrsize)
+
+
+class I2C(_I2CBase):
+    def __init__(self, id=0, *, scl=None, sda=None, freq=400_000, timeout=50_000):
+        if scl is None or sda is None:
+            # rp2 defaults: I2C0 on GP4/GP5, I2C1 on GP6/GP7
+            sda, scl = (4, 5) if id == 0 else (6, 7)
+        self.id = id
+        super().__init__(scl, sda, freq)
+
+    def __repr__(self):
+        return f'I2C({self.id}, freq={self._bus.freq}, scl={self._bus.scl}, sda={self._bus.sda})'
+
+
+class SoftI2C(_I2CBase):
+    def __init__(self, scl, sda, *, freq=400_000, timeout=50_000):
+        super().__init__(scl, sda, freq)
+
+    def __repr__(self):
+        return f'SoftI2C(scl={self._bus.scl}, sda={self._bus.sda}, freq={self._bus.freq})'
+
+
+def reset():
+    board().resets += 1
+    raise Halt()
+
+
+soft_reset = reset
+
+
+def freq(hz=None):
+    return 125_000_000 if hz is None else None
+
+
+def unique_id():
+    return b'\xe6\x61\x41\x04\x03\x5c\x2b\x2f'
@@ -0,0 +1,242 @@
+# the simulated Pico: owns the virtual clock, the I2C buses, pin states and the
+# runtime patches that make CPython look enough like MicroPython to run the
+# device code in src/pigrostat unmodified
+
+import calendar, gc, io, os, runpy, sys, time
+
+from .bus import BusStats, SimBus
+from . import cores
+from .clock import Halt, VirtualClock
+
+DEVICE_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'pigrostat'))
+
+# approximation of the RP2040 heap available to Python on a Pico W with the
+# network stack loaded; only used to give gc.mem_free() something plausible
+HEAP_BYTES = 192 * 1024
+
+
+class PinState:
+    def __init__(self, id):
+        self.id = id
+        self.mode = -1
+        self.value = 0
+        self.writes = 0
+        self.listeners = []
+
+    def set(self, value):
+        value = 1 if value else 0
+        self.writes += 1
+        self.value = value
+        for listener in self.listeners:
+            listener(self, value)
+
+
+class SerialSink(io.TextIOBase):
+    """
+    Stands in for the USB serial console: counts what the device prints, and
+    optionally echoes it
+    """
+    def __init__(self, echo=None):
+        self.echo = echo
+        self.chars = 0
+        self.lines = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self.chars += len(s)
+        self.lines += s.count('\n')
+        if self.echo is not None:
+            self.echo.write(s)
+        return len(s)
+
+
+class Board:
+    """
+    Usage:
+
+        board = Board()
+        board.bus(0, 1).attach(Sht30Device(0x44))
+        with board:
+            board.run_script('main.py')
+    """
+    def __init__(self, flash_dir=None, echo=False):
+        self.clock = VirtualClock()
+        self.buses = {}
+        self.pins = {}
+        self.adc = {4: self._cpu_temperature_u16}
+        self.cpu_temperature = 27.0
+        self.rtc_base = calendar.timegm((2023, 1, 1, 0, 0, 0)) # RTC seconds at clock zero
+        self.flash_dir = flash_dir
+        self.serial = SerialSink(sys.__stdout__ if echo else None)
+        self.resets = 0
+        self.core1 = None # thread started through _thread, if any
+        self.gc_collects = 0
+        self.gc_threshold = -1
+        self._saved = None
+
+    # --- hardware ---
+
+    def bus(self, sda, scl):
+        key = (sda, scl)
+        bus = self.buses.get(key)
+        if bus is None:
+            bus = self.buses[key] = SimBus(self.clock, sda, scl)
+        return bus
+
+    def pin(self, id):
+        state = self.pins.get(id)
+        if state is None:
+            state = self.pins[id] = PinState(id)
+        return state
+
+    def _cpu_temperature_u16(self):
+        # inverse of the datasheet slope used by main.py
+        volts = 0.706 - (self.cpu_temperature - 27) * 0.001721
+        return max(0, min(0xFFFF, int(volts / 3.3 * 65536)))
+
+    def read_adc(self, channel):
+        source = self.adc.get(channel)
+        if source is None:
+            return 0
+        return source() if callable(source) else source
+
+    def rtc_seconds(self):
+        # the RTC runs off the virtual clock; seconds since 1970, as the
+        # firmware's time.time()
+        return self.rtc_base + self.clock.now_us // 1_000_000
+
+    def rtc_datetime(self):
+        tm = time.gmtime(self.rtc_seconds())
+        return (tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_wday, tm.tm_hour, tm.tm_min, tm.tm_sec, 0)
+
+    def set_rtc_datetime(self, value):
+        year, month, day, _, hour, minute, second = value[:7]
+        self.rtc_base = calendar.timegm((year, month, day, hour, minute, second)) - self.clock.now_us // 1_000_000
+
+    def bus_stats(self):
+        total = BusStats()
+        for bus in self.buses.values():
+            total.add(bus.stats)
+        return total
+
+    # --- runtime ---
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+        return False
+
+    def install(self):
+        import machine
+        if self._saved is not None:
+            return
+        clock = self.clock
+        board = self
+        real_collect = gc.collect
+
+        def collect(*args):
+            board.gc_collects += 1
+            return real_collect(*args)
+
+        saved = {
+            'board': machine._board,
+            'time': {name: getattr(time, name, None) for name in (
+                'sleep', 'sleep_ms', 'sleep_us', 'ticks_ms', 'ticks_us', 'ticks_cpu', 'ticks_add', 'ticks_diff',
+                'time', 'localtime')},
+            'gc': {name: getattr(gc, name, None) for name in ('collect', 'mem_alloc', 'mem_free', 'threshold')},
+            'modules': {name: sys.modules.get(name) for name in ('utime', '_thread')},
+            'stdout': sys.stdout,
+            'cwd': os.getcwd(),
+            'path': list(sys.path),
+        }
+        self._saved = saved
+        machine._board = self
+
+        time.sleep = clock.sleep
+        time.sleep_ms = clock.sleep_ms
+        time.sleep_us = clock.sleep_us
+        time.ticks_ms = clock.ticks_ms
+        time.ticks_us = clock.ticks_us
+        time.ticks_cpu = clock.ticks_us
+        time.ticks_add = clock.ticks_add
+        time.ticks_diff = clock.ticks_diff
+        # the Pico has no time zone: local time is UTC, from the RTC
+        gmtime = time.gmtime
+        time.time = board.rtc_seconds
+        time.localtime = lambda secs=None: gmtime(board.rtc_seconds() if secs is None else secs)
+        sys.modules['utime'] = time
+        sys.modules['_thread'] = cores
+
+        # heap use counts from install(), so the host's own objects don't fill
+        # it; asyncio (behind the uasyncio stand-in) is the bulk of those
+        import asyncio  # noqa: F401
+        base_blocks = sys.getallocatedblocks()
+
+        def threshold(*args):
+            if not args:
+                return board.gc_threshold
+            board.gc_threshold = args[0]
+
+        gc.collect = collect
+        gc.mem_alloc = lambda: max(0, min(HEAP_BYTES, (sys.getallocatedblocks() - base_blocks) * 32))
+        gc.mem_free = lambda: HEAP_BYTES - gc.mem_alloc()
+        gc.threshold = threshold
+
+        if DEVICE_DIR not in sys.path:
+            sys.path.insert(0, DEVICE_DIR)
+        if self.flash_dir is not None:
+            os.chdir(self.flash_dir)
+        sys.stdout = self.serial
+
+    def uninstall(self):
+        import machine
+        saved = self._saved
+        if saved is None:
+            return
+        self._saved = None
+        machine._board = saved['board']
+        for name, value in saved['time'].items():
+            if value is None:
+                if hasattr(time, name):
+                    delattr(time, name)
+            else:
+                setattr(time, name, value)
+        for name, value in saved['gc'].items():
+            if value is None:
+                if hasattr(gc, name):
+                    delattr(gc, name)
+            else:
+                setattr(gc, name, value)
+        for name, value in saved['modules'].items():
+            if value is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = value
+        sys.stdout = saved['stdout']
+        os.chdir(saved['cwd'])
+        sys.path[:] = saved['path']
+
+    def halt(self):
+        """
+        Stop the running script at its next sleep
+        """
+        self.clock.halt()
+
+    def run_script(self, name='main.py'):
+        """
+        Run a device script (from src/pigrostat) until it halts or returns
+        """
+        try:
+            runpy.run_path(os.path.join(DEVICE_DIR, name), run_name='__main__')
+        except Halt:
+            pass
+        finally:
+            # a reset stops both cores
+            if self.core1 is not None:
+                self.clock.halt()
+                self.core1.join()
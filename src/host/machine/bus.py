@@ -0,0 +1,127 @@
+import errno
+
+# I2C scan probes the 7-bit address range excluding the reserved blocks
+SCAN_FIRST = 0x08
+SCAN_LAST = 0x77
+
+
+class BusStats:
+    """
+    Running totals for one simulated bus; snapshot() and diff() let callers
+    attribute traffic to a frame or a single operation
+    """
+    __slots__ = ('transactions', 'bytes', 'reads', 'writes', 'nacks', 'scans', 'bus_us', 'collisions')
+
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.reads = 0
+        self.writes = 0
+        self.nacks = 0
+        self.scans = 0
+        self.bus_us = 0
+        self.collisions = 0 # transactions that more than one device answered
+
+    def snapshot(self):
+        copy = BusStats()
+        for name in BusStats.__slots__:
+            setattr(copy, name, getattr(self, name))
+        return copy
+
+    def diff(self, earlier):
+        delta = BusStats()
+        for name in BusStats.__slots__:
+            setattr(delta, name, getattr(self, name) - getattr(earlier, name))
+        return delta
+
+    def add(self, other):
+        for name in BusStats.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __repr__(self):
+        return (f'BusStats(transactions={self.transactions}, bytes={self.bytes}, '
+                f'reads={self.reads}, writes={self.writes}, nacks={self.nacks}, '
+                f'scans={self.scans}, bus_us={self.bus_us}, collisions={self.collisions})')
+
+
+class SimBus:
+    """
+    A shared pair of SDA/SCL pins with the simulated devices attached to it;
+    every machine.I2C/SoftI2C created on the same pins talks to the same bus
+    """
+    def __init__(self, clock, sda, scl):
+        self.clock = clock
+        self.sda = sda
+        self.scl = scl
+        self.devices = {}
+        self.stats = BusStats()
+        self.freq = 400_000
+
+    def attach(self, device):
+        if device.addr in self.devices:
+            raise ValueError(f'address {hex(device.addr)} already in use on bus {(self.sda, self.scl)}')
+        self.devices[device.addr] = device
+        device.attached(self)
+        return device
+
+    def detach(self, addr):
+        self.devices.pop(addr, None)
+
+    def _clock_out(self, nbytes):
+        # 9 clocks per byte (8 data + ACK) plus start/stop conditions
+        us = ((nbytes * 9) + 2) * 1_000_000 // self.freq
+        self.stats.transactions += 1
+        self.stats.bytes += nbytes
+        self.stats.bus_us += us
+        self.clock.advance_us(us)
+
+    def _device(self, addr):
+        # the device at addr, on the bus itself or behind an enabled mux channel
+        found = []
+        device = self.devices.get(addr)
+        if device is not None and device.present:
+            found.append(device)
+        for mux in list(self.devices.values()):
+            found.extend(mux.downstream(addr))
+        if not found:
+            # only the address byte goes out before the NACK
+            self._clock_out(1)
+            self.stats.nacks += 1
+            raise OSError(errno.ENODEV)
+        if len(found) > 1:
+            # two devices driving the bus at once: garbage, so treat it as an error
+            self._clock_out(1)
+            self.stats.collisions += 1
+            raise OSError(errno.EIO)
+        return found[0]
+
+    def scan(self):
+        self.stats.scans += 1
+        found = []
+        for addr in range(SCAN_FIRST, SCAN_LAST + 1):
+            self._clock_out(1)
+            device = self.devices.get(addr)
+            if device is not None and device.present:
+                found.append(addr)
+            elif any(mux.downstream(addr) for mux in self.devices.values()):
+                found.append(addr)
+        return found
+
+    def write(self, addr, data):
+        device = self._device(addr)
+        self._clock_out(1 + len(data))
+        self.stats.writes += 1
+        device.write(bytes(data))
+        return len(data)
+
+    def read(self, addr, nbytes):
+        device = self._device(addr)
+        data = device.read(nbytes)
+        if data is None:
+            # device exists but declined the read header (e.g. no data ready)
+            self._clock_out(1)
+            self.stats.nacks += 1
+            raise OSError(errno.EIO)
+        self._clock_out(1 + nbytes)
+        self.stats.reads += 1
+        return data
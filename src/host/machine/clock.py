@@ -0,0 +1,144 @@
+# virtual time for the host stand-in; every sleep, bus transaction and device
+# conversion advances this clock rather than the wall clock, so a run is
+# reproducible and a "1 second" loop delay costs nothing on the host
+#
+# with a second core running (see cores.py) the clock is shared: a sleeping
+# thread waits until the others are asleep too, and then the clock jumps to
+# the earliest wake-up; time spent running (bus transfers) is not overlapped
+#
+# simulated parts that act on their own (an alert pin) schedule timers with
+# call_at(); they fire as time passes them, and wait_us() (the event loop's
+# idle wait) returns early at a timer, as an interrupt would wake the device
+
+import heapq, itertools, threading
+
+TICKS_PERIOD = 1 << 30  # matches MicroPython's ticks wrap-around
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class Halt(BaseException):
+    """
+    Raised from the next sleep once a run has been asked to stop; derives from
+    BaseException so that it behaves like a reset rather than a recoverable fault
+    """
+    pass
+
+
+class VirtualClock:
+    def __init__(self, start_us=0):
+        self.now_us = start_us
+        self.slept_us = 0
+        self.halting = False
+        self.participants = 1 # threads that advance time by sleeping
+        self._cond = threading.Condition()
+        self._sleepers = {} # thread ident: wake-up time, while sleeping
+        self._timers = [] # heap of (due, sequence, callback)
+        self._sequence = itertools.count()
+
+    def call_at(self, due_us, callback):
+        heapq.heappush(self._timers, (int(due_us), next(self._sequence), callback))
+
+    def _run_to(self, target):
+        # move time to target, firing any timers on the way at their own time
+        timers = self._timers
+        if not timers:
+            if target > self.now_us:
+                self.now_us = target
+            return
+        with self._cond:
+            while timers and timers[0][0] <= target:
+                due, _, callback = heapq.heappop(timers)
+                if due > self.now_us:
+                    self.now_us = due
+                callback()
+            if target > self.now_us:
+                self.now_us = target
+
+    def advance_us(self, us):
+        # time passing "inside" an operation (bus clocks, clock stretching);
+        # never a stop point, so a run cannot halt half way through a transaction
+        if us > 0:
+            self._run_to(self.now_us + int(us))
+
+    def sleep_us(self, us):
+        if self.halting:
+            raise Halt()
+        if self.participants > 1:
+            self._sleep_shared(max(0, int(us)))
+        elif us > 0:
+            start = self.now_us
+            self._run_to(start + int(us))
+            self.slept_us += self.now_us - start
+
+    def wait_us(self, us):
+        """
+        As sleep_us(), but returns early once a timer has fired
+        """
+        if self.halting:
+            raise Halt()
+        timers = self._timers
+        if self.participants > 1 or not timers or timers[0][0] > self.now_us + us:
+            self.sleep_us(us)
+            return
+        start = self.now_us
+        self._run_to(timers[0][0])
+        self.slept_us += self.now_us - start
+
+    def _sleep_shared(self, us):
+        ident = threading.get_ident()
+        with self._cond:
+            wake = self.now_us + us
+            self._sleepers[ident] = wake
+            try:
+                while not self.halting and self.now_us < wake:
+                    if len(self._sleepers) >= self.participants:
+                        # everyone is asleep: jump to the first to wake
+                        earliest = min(self._sleepers.values())
+                        if earliest > self.now_us:
+                            start = self.now_us
+                            self._run_to(earliest)
+                            self.slept_us += self.now_us - start
+                        self._cond.notify_all()
+                        if self.now_us >= wake:
+                            break
+                    self._cond.wait()
+            finally:
+                del self._sleepers[ident]
+            if self.halting:
+                raise Halt()
+
+    def join(self):
+        # a thread starts taking part in time
+        with self._cond:
+            self.participants += 1
+
+    def leave(self):
+        with self._cond:
+            self.participants -= 1
+            self._cond.notify_all()
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * 1000)
+
+    def sleep(self, seconds):
+        self.sleep_us(seconds * 1_000_000)
+
+    def halt(self):
+        with self._cond:
+            self.halting = True
+            self._cond.notify_all()
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def ticks_ms(self):
+        return (self.now_us // 1000) & TICKS_MAX
+
+    @staticmethod
+    def ticks_add(ticks, delta):
+        return (ticks + delta) & TICKS_MAX
+
+    @staticmethod
+    def ticks_diff(ticks1, ticks2):
+        return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
@@ -0,0 +1,51 @@
+# stand-in for MicroPython's _thread on the RP2040: start_new_thread runs the
+# function on "core 1" (a real host thread that shares the board's virtual
+# clock), and like the firmware only one such thread may run at a time
+
+import sys, threading
+
+from .clock import Halt
+
+LockType = type(threading.Lock())
+
+
+def allocate_lock():
+    return threading.Lock()
+
+
+def get_ident():
+    return threading.get_ident()
+
+
+def stack_size(size=None):
+    return 0
+
+
+def exit():
+    raise SystemExit()
+
+
+def start_new_thread(function, args, kwargs=None):
+    import machine
+    board = machine.board()
+    if board.core1 is not None and board.core1.is_alive():
+        raise OSError('core1 in use')
+    clock = board.clock
+    stdout = sys.stdout
+
+    def run():
+        try:
+            function(*args, **(kwargs or {}))
+        except (Halt, SystemExit):
+            pass
+        except BaseException:
+            # the firmware prints the traceback and the core stops
+            import traceback
+            traceback.print_exc(file=stdout)
+        finally:
+            clock.leave()
+
+    clock.join()
+    board.core1 = threading.Thread(target=run, name='core1', daemon=True)
+    board.core1.start()
+    return board.core1.ident
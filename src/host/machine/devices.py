@@ -0,0 +1,538 @@
+# simulated I2C peripherals for the host stand-in; each one decodes the same
+# byte stream the real part would see, so drivers run unmodified against them
+
+import math, random
+
+
+class I2cDevice:
+    def __init__(self, addr):
+        self.addr = addr
+        self.present = True
+        self.bus = None
+
+    def attached(self, bus):
+        self.bus = bus
+
+    @property
+    def now_us(self):
+        return self.bus.clock.now_us
+
+    def write(self, data):
+        pass
+
+    def read(self, nbytes):
+        return bytes(nbytes)
+
+    def downstream(self, addr):
+        # devices at addr this one connects to the bus (see Tca9548aDevice)
+        return ()
+
+
+def sht30_crc(data):
+    crc = 0xFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x131) if crc & 0x80 else (crc << 1)
+    return crc & 0xFF
+
+
+class Environment:
+    """
+    Deterministic temperature/humidity source; the default drifts humidity
+    slowly across the shipped 70/75 % thresholds so relays get exercised
+    """
+    def __init__(self, temperature=24.0, humidity=72.5, t_swing=0.5, rh_swing=4.0,
+                 period_s=600.0, noise=0.05, seed=1):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.t_swing = t_swing
+        self.rh_swing = rh_swing
+        self.period_s = period_s
+        self.noise = noise
+        self.random = random.Random(seed)
+
+    def sample(self, now_us):
+        phase = 2 * math.pi * (now_us / 1_000_000) / self.period_s
+        t = self.temperature + self.t_swing * math.sin(phase / 3)
+        rh = self.humidity + self.rh_swing * math.sin(phase)
+        if self.noise:
+            t += self.random.gauss(0, self.noise)
+            rh += self.random.gauss(0, self.noise)
+        return t, rh
+
+
+class Sht30Device(I2cDevice):
+    """
+    Sensirion SHT3x: single-shot (with/without clock stretching), periodic
+    acquisition with fetch, status register, reset, heater, ART and alert
+    limits; connect_alert() wires the ALERT output to a board pin, which is then
+    updated after each periodic measurement
+    """
+    # single shot: (stretch, conversion time in us) keyed by command
+    SINGLE_SHOT = {
+        0x2C06: (True, 15_000), 0x2C0D: (True, 6_000), 0x2C10: (True, 4_000),
+        0x2400: (False, 15_000), 0x240B: (False, 6_000), 0x2416: (False, 4_000),
+    }
+    # periodic: (measurements per second, conversion time in us)
+    PERIODIC = {
+        0x2032: (0.5, 15_000), 0x2024: (0.5, 6_000), 0x202F: (0.5, 4_000),
+        0x2130: (1, 15_000), 0x2126: (1, 6_000), 0x212D: (1, 4_000),
+        0x2236: (2, 15_000), 0x2220: (2, 6_000), 0x222B: (2, 4_000),
+        0x2334: (4, 15_000), 0x2322: (4, 6_000), 0x2329: (4, 4_000),
+        0x2737: (10, 15_000), 0x2721: (10, 6_000), 0x272A: (10, 4_000),
+        0x2B32: (4, 15_000),  # ART: accelerated response time, 4 Hz
+    }
+    FETCH = 0xE000
+    BREAK = 0x3093
+    STATUS = 0xF32D
+    CLEAR_STATUS = 0x3041
+    SOFT_RESET = 0x30A2
+    HEATER_ON = 0x306D
+    HEATER_OFF = 0x3066
+    # alert limits, in the order high set, high clear, low clear, low set
+    ALERT_READ = (0xE11F, 0xE114, 0xE109, 0xE102)
+    ALERT_WRITE = (0x611D, 0x6116, 0x610B, 0x6100)
+
+    STATUS_ALERT = 0x8000
+    STATUS_HEATER = 0x2000
+    STATUS_RH_ALERT = 0x0800
+    STATUS_T_ALERT = 0x0400
+    STATUS_RESET = 0x0010
+    STATUS_CMD_ERROR = 0x0002
+    STATUS_CRC_ERROR = 0x0001
+
+    def __init__(self, addr=0x44, environment=None):
+        super().__init__(addr)
+        self.environment = environment or Environment()
+        self.measurements = 0
+        self.commands = 0
+        self.alert_pin = None
+        self.alert_changes = 0
+        self._epoch = 0 # bumped whenever periodic mode starts or stops
+        self._reset()
+
+    def connect_alert(self, pin_state):
+        self.alert_pin = pin_state
+        pin_state.set(1 if self.alert else 0)
+
+    def _reset(self):
+        self.status = self.STATUS_ALERT | self.STATUS_RESET
+        self.pending = None     # bytes the next read returns
+        self.ready_us = 0       # when the pending conversion completes
+        self.stretch = False
+        self.periodic = None    # (period_us, conversion_us, started_us)
+        self.fetched_us = None  # start of the last periodic sample handed out
+        self.measured = None    # (completed_us, data) of the last conversion
+        # datasheet defaults: 80/79 %RH and 60/58 C high; 22/20 %RH and -9/-10 C low
+        self.limits = [self.limit_word(60, 80), self.limit_word(58, 79),
+                       self.limit_word(-9, 22), self.limit_word(-10, 20)]
+        self._epoch += 1
+        self._set_alert(False)
+
+    def encode(self, t, rh):
+        raw_t = min(0xFFFF, max(0, round((t + 45) * 0xFFFF / 175)))
+        raw_rh = min(0xFFFF, max(0, round(rh * 0xFFFF / 100)))
+        out = bytearray(6)
+        out[0], out[1] = raw_t >> 8, raw_t & 0xFF
+        out[2] = sht30_crc(out[0:2])
+        out[3], out[4] = raw_rh >> 8, raw_rh & 0xFF
+        out[5] = sht30_crc(out[3:5])
+        return bytes(out)
+
+    @staticmethod
+    def limit_word(t, rh):
+        # alert limits keep the 9 MSBs of temperature and 7 MSBs of humidity
+        raw_t = min(0xFFFF, max(0, round((t + 45) * 0xFFFF / 175)))
+        raw_rh = min(0xFFFF, max(0, round(rh * 0xFFFF / 100)))
+        return (raw_rh >> 9) << 9 | raw_t >> 7
+
+    def _convert(self, at_us):
+        if self.measured is not None and self.measured[0] == at_us:
+            return self.measured[1]  # already measured, for the alert check
+        self.measurements += 1
+        data = self.encode(*self.environment.sample(at_us))
+        self.measured = (at_us, data)
+        return data
+
+    def _set_alert(self, alert, rh=False, t=False):
+        self.alert = alert
+        self.status &= ~(self.STATUS_RH_ALERT | self.STATUS_T_ALERT)
+        if alert:
+            self.status |= self.STATUS_ALERT
+            self.status |= (self.STATUS_RH_ALERT if rh else 0) | (self.STATUS_T_ALERT if t else 0)
+        if self.alert_pin is not None and self.alert_pin.value != (1 if alert else 0):
+            self.alert_changes += 1
+            self.alert_pin.set(1 if alert else 0)
+
+    def _check_alert(self, data):
+        t9 = (data[0] << 8 | data[1]) >> 7
+        rh7 = (data[3] << 8 | data[4]) >> 9
+        high_set, high_clear, low_clear, low_set = self.limits
+        if not self.alert:
+            t = t9 >= high_set & 0x1FF or t9 <= low_set & 0x1FF
+            rh = rh7 >= high_set >> 9 or rh7 <= low_set >> 9
+            if t or rh:
+                self._set_alert(True, rh, t)
+        elif low_clear & 0x1FF <= t9 <= high_clear & 0x1FF and low_clear >> 9 <= rh7 <= high_clear >> 9:
+            self._set_alert(False)
+
+    def _schedule_measurement(self, due_us):
+        epoch = self._epoch
+
+        def measured():
+            if epoch != self._epoch or self.periodic is None:
+                return  # periodic mode stopped or restarted since
+            self._check_alert(self._convert(due_us))
+            self._schedule_measurement(due_us + self.periodic[0])
+        self.bus.clock.call_at(due_us, measured)
+
+    def _word(self, value):
+        word = bytes((value >> 8, value & 0xFF))
+        return word + bytes((sht30_crc(word),))
+
+    def write(self, data):
+        if len(data) < 2:
+            return
+        cmd = data[0] << 8 | data[1]
+        self.commands += 1
+        now = self.now_us
+        if cmd in self.ALERT_WRITE and len(data) == 5:
+            if sht30_crc(data[2:4]) != data[4]:
+                self.status |= self.STATUS_CRC_ERROR
+                return
+            self.limits[self.ALERT_WRITE.index(cmd)] = data[2] << 8 | data[3]
+        elif cmd in self.ALERT_READ:
+            self.stretch = False
+            self.ready_us = now
+            self.pending = self._word(self.limits[self.ALERT_READ.index(cmd)])
+        elif cmd in self.SINGLE_SHOT and self.periodic is None:
+            self.stretch, duration = self.SINGLE_SHOT[cmd]
+            self.ready_us = now + duration
+            self.pending = self._convert(self.ready_us)
+        elif cmd in self.PERIODIC and self.periodic is None:
+            mps, duration = self.PERIODIC[cmd]
+            self.periodic = (int(1_000_000 / mps), duration, now)
+            self.fetched_us = None
+            self.pending = None
+            self._epoch += 1
+            if self.alert_pin is not None:
+                self._schedule_measurement(now + duration)
+        elif cmd == self.FETCH and self.periodic is not None:
+            period, duration, started = self.periodic
+            if now < started + duration:
+                self.pending = None
+                return
+            latest = started + ((now - started - duration) // period) * period
+            if latest == self.fetched_us:
+                self.pending = None  # nothing new since the last fetch: NACK
+                return
+            self.fetched_us = latest
+            self.stretch = False
+            self.ready_us = now
+            self.pending = self._convert(latest + duration)
+        elif cmd == self.BREAK:
+            self.periodic = None
+            self.pending = None
+            self._epoch += 1
+        elif cmd == self.STATUS:
+            self.stretch = False
+            self.ready_us = now
+            self.pending = self._word(self.status)
+        elif cmd == self.CLEAR_STATUS:
+            self.status &= ~(self.STATUS_ALERT | self.STATUS_RESET | self.STATUS_CMD_ERROR | self.STATUS_CRC_ERROR)
+        elif cmd == self.SOFT_RESET:
+            self._reset()
+        elif cmd == self.HEATER_ON:
+            self.status |= self.STATUS_HEATER
+        elif cmd == self.HEATER_OFF:
+            self.status &= ~self.STATUS_HEATER
+        else:
+            self.status |= self.STATUS_CMD_ERROR
+            self.pending = None
+
+    def read(self, nbytes):
+        if self.pending is None:
+            return None
+        now = self.now_us
+        if now < self.ready_us:
+            if not self.stretch:
+                return None  # still converting and not allowed to stretch: NACK
+            self.bus.clock.advance_us(self.ready_us - now)
+        data = self.pending[:nbytes]
+        self.pending = None
+        return data + bytes(nbytes - len(data))
+
+
+class Tca9548aDevice(I2cDevice):
+    """
+    TI TCA9548A 1-to-8 I2C switch: a one-byte control register with a bit per
+    downstream channel; devices attached to an enabled channel answer on the
+    upstream bus as if they were on it
+    """
+    def __init__(self, addr=0x70):
+        super().__init__(addr)
+        self.control = 0
+        self.switches = 0 # control register changes
+        self.channels = [dict() for _ in range(8)]
+
+    def attach(self, channel, device):
+        if device.addr in self.channels[channel]:
+            raise ValueError(f'address {hex(device.addr)} already in use on channel {channel}')
+        self.channels[channel][device.addr] = device
+        if self.bus is not None:
+            device.attached(self.bus)
+        return device
+
+    def attached(self, bus):
+        super().attached(bus)
+        for channel in self.channels:
+            for device in channel.values():
+                device.attached(bus)
+
+    def write(self, data):
+        if data and data[-1] != self.control:
+            self.control = data[-1]
+            self.switches += 1
+
+    def read(self, nbytes):
+        return bytes((self.control,)) * nbytes
+
+    def downstream(self, addr):
+        found = []
+        for channel in range(8):
+            if self.control & (1 << channel):
+                device = self.channels[channel].get(addr)
+                if device is not None and device.present:
+                    found.append(device)
+        return found
+
+
+class Pcf8574LcdDevice(I2cDevice):
+    """
+    HD44780 character LCD behind a PCF8574 backpack; decodes E-strobed nibbles
+    (P0=RS, P1=RW, P2=E, P3=backlight, P4-P7=data) into DDRAM
+    """
+    MASK_RS = 0x01
+    MASK_E = 0x04
+    MASK_BACKLIGHT = 0x08
+
+    def __init__(self, addr=0x27, lines=2, columns=16):
+        super().__init__(addr)
+        self.lines = lines
+        self.columns = columns
+        self.port = 0
+        self.ddram = bytearray(b' ' * 128)
+        self.cgram = bytearray(64)
+        self.address = 0
+        self.cgram_mode = False
+        self.increment = True
+        self.display_on = False
+        self.four_bit = False
+        self.high = None  # first nibble of a 4-bit transfer
+        self.strobes = 0
+        self.commands = 0
+        self.chars = 0
+
+    @property
+    def backlight(self):
+        return bool(self.port & self.MASK_BACKLIGHT)
+
+    def write(self, data):
+        for b in data:
+            if (self.port & self.MASK_E) and not (b & self.MASK_E):
+                self._strobe(self.port)  # latched on the falling edge of E
+            self.port = b
+
+    def read(self, nbytes):
+        return bytes((self.port,)) * nbytes
+
+    def _strobe(self, port):
+        self.strobes += 1
+        nibble = port >> 4
+        rs = port & self.MASK_RS
+        if not self.four_bit:
+            # 8-bit interface during init: only the upper data lines are wired
+            self._execute(rs, nibble << 4)
+            return
+        if self.high is None:
+            self.high = nibble
+        else:
+            value = (self.high << 4) | nibble
+            self.high = None
+            self._execute(rs, value)
+
+    def _advance(self):
+        step = 1 if self.increment else -1
+        if self.cgram_mode:
+            self.address = (self.address + step) & 0x3F
+            return
+        addr = self.address + step
+        if self.lines > 1:
+            if addr == 0x28:
+                addr = 0x40
+            elif addr == 0x68:
+                addr = 0x00
+            elif addr == 0x3F:
+                addr = 0x27
+            elif addr < 0:
+                addr = 0x67
+        else:
+            addr %= 0x50
+        self.address = addr
+
+    def _execute(self, rs, value):
+        if rs:
+            self.chars += 1
+            if self.cgram_mode:
+                self.cgram[self.address] = value
+            else:
+                self.ddram[self.address & 0x7F] = value
+            self._advance()
+            return
+        self.commands += 1
+        if value & 0x80:
+            self.cgram_mode = False
+            self.address = value & 0x7F
+        elif value & 0x40:
+            self.cgram_mode = True
+            self.address = value & 0x3F
+        elif value & 0x20:
+            # function set; DL=0 selects the 4-bit interface
+            self.four_bit = not (value & 0x10)
+            self.high = None
+        elif value & 0x10:
+            pass  # cursor/display shift
+        elif value & 0x08:
+            self.display_on = bool(value & 0x04)
+        elif value & 0x04:
+            self.increment = bool(value & 0x02)
+        elif value & 0x02:
+            self.address = 0
+            self.cgram_mode = False
+        elif value & 0x01:
+            self.ddram[:] = b' ' * 128
+            self.address = 0
+            self.cgram_mode = False
+            self.increment = True
+
+    def line_address(self, y):
+        addr = 0x40 if y & 1 else 0x00
+        if y & 2:
+            addr += self.columns
+        return addr
+
+    def text(self):
+        """
+        The visible characters, one string per line
+        """
+        rows = []
+        for y in range(self.lines):
+            base = self.line_address(y)
+            rows.append(bytes(self.ddram[base:base + self.columns]).decode('latin-1'))
+        return rows
+
+
+class Ssd1306Device(I2cDevice):
+    """
+    SSD1306 OLED controller: control-byte framing, the command set used by the
+    MicroPython driver, and horizontal/vertical/page addressing into GDDRAM
+    """
+    ARGS = {
+        0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5, 0x81: 1, 0x8D: 1,
+        0xA3: 2, 0xA8: 1, 0xAD: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1,
+    }
+
+    def __init__(self, addr=0x3C, width=128, height=32):
+        super().__init__(addr)
+        self.width = width
+        self.height = height
+        self.gddram = bytearray(128 * 8)
+        self.mode = 2  # page addressing after reset
+        self.col_start, self.col_end = 0, 127
+        self.page_start, self.page_end = 0, 7
+        self.col = 0
+        self.page = 0
+        self.display_on = False
+        self.command = None
+        self.args = []
+        self.cmd_bytes = 0
+        self.data_bytes = 0
+
+    def write(self, data):
+        i = 0
+        n = len(data)
+        while i < n:
+            control = data[i]
+            i += 1
+            is_data = control & 0x40
+            if control & 0x80:
+                # Co=1: a single byte follows, then another control byte
+                if i < n:
+                    self._data(data[i]) if is_data else self._cmd(data[i])
+                    i += 1
+            else:
+                for b in data[i:]:
+                    self._data(b) if is_data else self._cmd(b)
+                i = n
+
+    def _cmd(self, b):
+        self.cmd_bytes += 1
+        if self.command is not None:
+            self.args.append(b)
+            if len(self.args) < self.ARGS[self.command]:
+                return
+            cmd, args = self.command, self.args
+            self.command, self.args = None, []
+            self._execute(cmd, args)
+        elif b in self.ARGS:
+            self.command = b
+        else:
+            self._execute(b, ())
+
+    def _execute(self, cmd, args):
+        if cmd == 0x20:
+            self.mode = args[0] & 0x03
+        elif cmd == 0x21:
+            self.col_start, self.col_end = args[0] & 0x7F, args[1] & 0x7F
+            self.col = self.col_start
+        elif cmd == 0x22:
+            self.page_start, self.page_end = args[0] & 0x07, args[1] & 0x07
+            self.page = self.page_start
+        elif cmd in (0xAE, 0xAF):
+            self.display_on = cmd == 0xAF
+        elif self.mode == 2 and 0xB0 <= cmd <= 0xB7:
+            self.page = cmd & 0x07
+        elif self.mode == 2 and cmd <= 0x0F:
+            self.col = (self.col & 0xF0) | cmd
+        elif self.mode == 2 and 0x10 <= cmd <= 0x1F:
+            self.col = (self.col & 0x0F) | ((cmd & 0x0F) << 4)
+
+    def _data(self, b):
+        self.data_bytes += 1
+        self.gddram[self.page * 128 + self.col] = b
+        if self.mode == 0:  # horizontal
+            if self.col >= self.col_end:
+                self.col = self.col_start
+                self.page = self.page_start if self.page >= self.page_end else self.page + 1
+            else:
+                self.col += 1
+        elif self.mode == 1:  # vertical
+            if self.page >= self.page_end:
+                self.page = self.page_start
+                self.col = self.col_start if self.col >= self.col_end else self.col + 1
+            else:
+                self.page += 1
+        else:  # page
+            self.col = min(self.col + 1, 127)
+
+    def pixel(self, x, y):
+        offset = (128 - self.width) // 2
+        return (self.gddram[(y // 8) * 128 + x + offset] >> (y & 7)) & 1
+
+    def render(self):
+        """
+        The visible panel as rows of '#' and '.'
+        """
+        return [''.join('#' if self.pixel(x, y) else '.' for x in range(self.width))
+                for y in range(self.height)]
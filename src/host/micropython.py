@@ -0,0 +1,38 @@
+# host stand-in for MicroPython's `micropython` module; code emitters become
+# no-ops, so decorated functions simply run as bytecode under CPython
+
+
+def const(value):
+    return value
+
+
+def _passthrough(func):
+    return func
+
+
+native = viper = asm_thumb = _passthrough
+
+
+def opt_level(level=None):
+    return 0 if level is None else None
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def mem_info(verbose=False):
+    import gc
+    print(f'mem: total={gc.mem_alloc() + gc.mem_free()}, current={gc.mem_alloc()}')
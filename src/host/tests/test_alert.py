@@ -0,0 +1,54 @@
+import json, os, shutil, sys, tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from machine import Board, DEVICE_DIR, Sht30Device
+import ujson
+
+DROP_S = 60.5 # when the room's RH falls below the humidifier's on threshold
+RELAY_PIN = 7
+
+
+class Step:
+    # 72 %RH (inside the 70-75 band) until DROP_S, then 65
+    def sample(self, now_us):
+        return 24.0, 72.0 if now_us < DROP_S * 1_000_000 else 65.0
+
+
+def run(config, seconds):
+    # main.py on the simulated board; returns the relay pin's (seconds, value) writes
+    flash_dir = tempfile.mkdtemp(prefix='pigrostat-test-')
+    try:
+        with open(os.path.join(flash_dir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        board = Board(flash_dir=flash_dir)
+        sensor = config['sensor']
+        sht = Sht30Device(sensor['addr'], Step())
+        board.bus(sensor['sda'], sensor['scl']).attach(sht)
+        sht.connect_alert(board.pin(sensor['alert']['pin']))
+        writes = []
+        board.pin(RELAY_PIN).listeners.append(lambda pin, value: writes.append((board.clock.now_us / 1e6, value)))
+        board.clock.call_at(seconds * 1_000_000, board.halt)
+        with board:
+            board.run_script('main.py')
+        return writes
+    finally:
+        shutil.rmtree(flash_dir, ignore_errors=True)
+
+
+@pytest.mark.parametrize('cores', [1, 2])
+def test_alert_switches_relay_promptly(cores):
+    # shipped config (a median of 3 on RH) woken by ALERT, polling every 10 s otherwise
+    with open(os.path.join(DEVICE_DIR, 'config.json'), encoding='utf-8') as f:
+        config = ujson.loads(f.read())
+    for key in ('display', '_display', '_sensors', 'log', 'metrics', 'history', 'memory'):
+        config.pop(key, None)
+    config['sensor']['alert'] = {'pin': 22, 'poll': 10}
+    config['cores'] = cores
+    writes = run(config, 90)
+    on = [t for t, value in writes if value and t > DROP_S]
+    assert on, writes
+    # the alert, then the readings the median needs at the usual 1 s delay
+    assert on[0] - DROP_S < 5
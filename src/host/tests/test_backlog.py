@@ -0,0 +1,25 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+from backlog import Backlog
+
+
+def test_sequence_survives_reset(tmp_path):
+    path = str(tmp_path / 'backlog.bin')
+    backlog = Backlog(4, 100, path)
+    assert backlog.sequence == 0
+    backlog.reserve(4096)
+    backlog.store(b'datagram')
+
+    backlog = Backlog(4, 100, path) # after a reset
+    assert backlog.sequence == 4096
+    assert backlog.count == 1
+
+
+def test_sequence_kept_when_slots_change(tmp_path):
+    path = str(tmp_path / 'backlog.bin')
+    Backlog(4, 100, path).reserve(8192)
+    backlog = Backlog(8, 120, path)
+    assert backlog.count == 0
+    assert backlog.sequence == 8192
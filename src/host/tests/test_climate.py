@@ -0,0 +1,14 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import climate
+
+
+def test_help(capsys):
+    with pytest.raises(SystemExit) as exit:
+        climate.main(['--help'])
+    assert exit.value.code == 0
+    assert '--ambient-rh' in capsys.readouterr().out
@@ -0,0 +1,72 @@
+import os, struct, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from collector import Collector, read_archive
+from telemetry import CENTI_RECORD_FORMAT, HEADER_FORMAT, MAGIC, TelemetryBatch
+
+CLOCK = 1_700_000_000
+
+# sensor words for 25.00 C and 50.00 %RH
+RAW_T = 0x6666
+RAW_RH = 0x8000
+
+
+def datagram(first, count, device=0x1234):
+    batch = TelemetryBatch(device)
+    for i in range(count):
+        batch.add(first + i, 1000 * i, True, RAW_T, RAW_RH, i & 1, 3000)
+    return bytes(batch.payload(CLOCK, 1000 * count))
+
+
+def test_same_datagram_twice(tmp_path):
+    collector = Collector(str(tmp_path))
+    data = datagram(100, 10)
+    assert collector.ingest(data, arrival=CLOCK) == 10
+    assert collector.ingest(data, arrival=CLOCK + 5) == 0
+    assert collector.records == 10
+    assert collector.duplicates == 10
+
+    series = collector.devices[0x1234].units[0]
+    assert series.count == 10
+    for rollup in series.rollups.values():
+        assert sum(row['count'] for row in rollup.rows()) == 10
+
+    collector.write_pending(collector.take_pending())
+    archive = os.path.join(str(tmp_path), f'{0x1234:08x}.pgc')
+    assert [record[1] for record in read_archive(archive)] == list(range(100, 110))
+
+
+def test_overlapping_resend():
+    collector = Collector()
+    collector.ingest(datagram(0, 10), arrival=CLOCK)
+    collector.ingest(datagram(20, 10), arrival=CLOCK)
+    # 5..24: only 10..19 are new
+    assert collector.ingest(datagram(5, 20), arrival=CLOCK) == 10
+    rows = collector.query({'op': 'range', 'device': 0x1234})
+    assert sorted(row['sequence'] for row in rows) == list(range(30))
+
+
+def test_raw_words_in_hundredths(tmp_path):
+    collector = Collector(str(tmp_path))
+    collector.ingest(datagram(0, 3), arrival=CLOCK)
+    row = collector.query({'op': 'latest', 'device': 0x1234})
+    assert (row['t'], row['rh'], row['cpu']) == (25.0, 50.0, 30.0)
+
+    collector.write_pending(collector.take_pending())
+    archive = os.path.join(str(tmp_path), f'{0x1234:08x}.pgc')
+    assert {(record[2], record[3]) for record in read_archive(archive)} == {(2500, 5000)}
+
+
+def test_version_3_hundredths(tmp_path):
+    # a datagram from firmware that sent T and RH in hundredths, say from a backlog
+    data = struct.pack(HEADER_FORMAT, MAGIC, 3, 2, 0x1234, CLOCK, 2000)
+    data += b''.join(struct.pack(CENTI_RECORD_FORMAT, i, 1000 * i, 2431, 7250, 0, 1, 3000) for i in range(2))
+    collector = Collector(str(tmp_path))
+    assert collector.ingest(data, arrival=CLOCK) == 2
+    row = collector.query({'op': 'latest', 'device': 0x1234})
+    assert (row['t'], row['rh']) == (24.31, 72.5)
+
+    collector.write_pending(collector.take_pending())
+    archive = os.path.join(str(tmp_path), f'{0x1234:08x}.pgc')
+    assert {(record[2], record[3]) for record in read_archive(archive)} == {(2431, 7250)}
@@ -0,0 +1,66 @@
+import os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import pytest
+
+from filters import Filter
+
+
+def test_median_matches_sorting():
+    rng = random.Random(1)
+    f = Filter({"median": 5})
+    readings = []
+    for _ in range(200):
+        x = rng.randrange(6000, 8000)
+        readings.append(x)
+        window = sorted(readings[-5:])
+        assert f.apply(x) == window[len(window) // 2]
+
+
+def test_median_outvotes_a_spike():
+    f = Filter({"median": 3})
+    assert [f.apply(x) for x in (7200, 7210, 9000, 7220, 7230)] == [7200, 7210, 7210, 7220, 7230]
+
+
+def test_median_must_be_odd():
+    with pytest.raises(ValueError):
+        Filter({"median": 4})
+
+
+def test_rate_clamp():
+    f = Filter({"rate": 0.5}) # 50 hundredths per sample
+    assert f.apply(7000) == 7000 # the first reading is taken as it is
+    assert f.apply(8000) == 7050
+    assert f.apply(8000) == 7100
+    assert f.apply(6000) == 7050
+    assert f.apply(7060) == 7060
+
+
+def test_ewma():
+    f = Filter({"ewma": 2}) # alpha 1/4
+    assert f.apply(7000) == 7000
+    assert f.apply(7400) == 7100
+    assert f.apply(7400) == 7175
+    for _ in range(40):
+        value = f.apply(7400)
+    assert value == 7400 # settles on a steady input
+
+
+def test_hold_then_err():
+    f = Filter({"median": 3, "hold": 2})
+    f.apply(7000)
+    f.apply(7100)
+    assert f.miss() == 7100
+    assert f.miss() == 7100
+    assert f.miss() is None
+    # after ERR the past is forgotten: the next reading starts afresh
+    assert f.apply(6000) == 6000
+
+
+def test_reading_clears_misses():
+    f = Filter({"hold": 1})
+    f.apply(7000)
+    assert f.miss() == 7000
+    f.apply(7100)
+    assert f.miss() == 7100
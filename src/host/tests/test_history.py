@@ -0,0 +1,80 @@
+import math, os, random, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import pytest
+
+from history import History, RH, T, Window, isqrt, spread_centi, to_centi
+
+
+def brute(values):
+    # min, max, rounded mean and floor of the population variance, from scratch
+    n = len(values)
+    total = sum(values)
+    return min(values), max(values), (total + (n >> 1)) // n, (n * sum(v * v for v in values) - total * total) // (n * n)
+
+
+@pytest.mark.parametrize('spread', [40, 2000, 65535])
+def test_window_matches_brute_force(spread):
+    # random walks and jumps, several laps of the ring (so recentring too)
+    rng = random.Random(spread)
+    window = Window(17)
+    pushed = []
+    value = 30000
+    for _ in range(500):
+        if rng.random() < 0.05:
+            value = rng.randrange(65536)
+        value = min(65535, max(0, value + rng.randrange(-spread, spread + 1)))
+        window.push(value)
+        pushed.append(value)
+        latest = pushed[-17:]
+        assert (window.min(), window.max(), window.mean(), window.variance()) == brute(latest)
+        assert window.count == len(latest) and window.at(0) == value
+    assert window.pushes == 500
+    assert [window.at(age) for age in range(17)] == pushed[:-18:-1]
+
+
+def test_window_monotonic_runs():
+    # the wedges' worst cases: every value evicts the whole wedge, or none of it
+    for values in (range(100), range(100, 0, -1)):
+        window = Window(8)
+        for n, value in enumerate(values):
+            window.push(value)
+            assert (window.min(), window.max()) == brute(list(values)[max(0, n - 7):n + 1])[:2]
+
+
+def test_empty_window():
+    window = Window(4)
+    assert (window.min(), window.max(), window.mean(), window.variance()) == (None, None, None, None)
+
+
+def test_tiers_take_means():
+    history = History(RH, [(6, 1), (4, 3), (2, 2)])
+    for raw in range(1, 16):
+        history.push(raw * 100)
+    assert list(history.tiers[0].values) == [1300, 1400, 1500, 1000, 1100, 1200]
+    # means of 3: 200, 500, 800, 1100, 1400 (the last four kept)
+    assert history.tiers[1].count == 4
+    assert [history.tiers[1].at(age) for age in range(4)] == [1400, 1100, 800, 500]
+    # means of 2 of those: 350, 950
+    assert [history.tiers[2].at(age) for age in range(2)] == [950, 350]
+    assert history.tiers[2].pushes == 2
+
+
+def test_stats_in_hundredths():
+    history = History(T, [(10, 1), (10, 10)])
+    out = [0, 0, 0, 0]
+    assert not history.stats(0, out)
+    raws = [0x6666 + d for d in (-400, -200, 0, 200, 400)]
+    for raw in raws:
+        history.push(raw)
+    assert history.stats(0, out)
+    assert out[:3] == [to_centi(T, raws[0]), to_centi(T, raws[-1]), to_centi(T, 0x6666)]
+    assert out[3] == spread_centi(T, isqrt((sum((r - 0x6666) ** 2 for r in raws)) // 5))
+    assert not history.stats(1, out) # the tier above has nothing yet
+
+
+def test_isqrt():
+    for n in list(range(1000)) + [2 ** 32 - 1, 2 ** 40 + 12345]:
+        assert isqrt(n) == math.isqrt(n)
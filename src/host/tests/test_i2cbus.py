@@ -0,0 +1,34 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import machine
+from machine import Board, Sht30Device
+
+from i2cbus import I2cBridge
+
+
+def test_reservations_pruned_without_display():
+    # one reservation per sample, and no display ever asks for a turn
+    board = Board()
+    with board:
+        board.bus(0, 1).attach(Sht30Device(0x44))
+        bridge = I2cBridge(machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)))
+        sensor = bridge.device(0x44)
+        for _ in range(200):
+            sensor.reserve(1000, 100)
+            board.clock.advance_us(1_000_000)
+        assert len(bridge.windows) <= 3
+
+
+def test_wait_for_reserved_window():
+    board = Board()
+    with board:
+        bridge = I2cBridge(machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)))
+        bridge.reserve(1000, 1000) # the bus is needed 1-2 ms from now
+        assert bridge.wait_us(500) == 2000 # with the guard, too close: wait until it's over
+        assert bridge.wait_us(0) == 0 # a turn that ends a guard's length before fits now
+        board.clock.advance_us(2000)
+        assert bridge.wait_us(500) == 0
+        assert bridge.windows == []
@@ -0,0 +1,141 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import pytest
+
+import machine
+from machine import Board, Sht30Device, Tca9548aDevice
+
+from i2cbus import I2cBridge
+from rack import Mux, MuxedI2C, Rack, Unit
+
+MUX = 0x70
+
+
+class Fixed:
+    # a chamber held at one temperature and humidity
+    def __init__(self, t, rh):
+        self.t = t
+        self.rh = rh
+
+    def sample(self, now_us):
+        return self.t, self.rh
+
+
+def build(board, config):
+    # Units the way main.py makes them, from (name, addr, mux channel or None),
+    # one simulated sensor per entry at 20 C plus its index and 50 %RH plus its index
+    import sht30
+    bus = board.bus(0, 1)
+    tca = bus.attach(Tca9548aDevice(MUX))
+    bridge = I2cBridge(machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)))
+    mux = Mux(MUX, [])
+    units = []
+    for index, (name, addr, channel) in enumerate(config):
+        device = Sht30Device(addr, Fixed(20 + index, 50 + index))
+        bus_device = bridge.device(addr)
+        if channel is None:
+            bus.attach(device)
+            i2c = bus_device
+        else:
+            tca.attach(channel, device)
+            i2c = MuxedI2C(mux, channel, bus_device)
+        sht = sht30.SHT30(i2c=i2c, i2c_address=addr)
+        units.append(Unit(index, name, sht, bus_device, [], None if channel is None else mux, -1 if channel is None else channel))
+    return units, mux
+
+
+CONFIG = [('c', 0x44, 2), ('a', 0x44, 0), ('bench', 0x45, None), ('d', 0x44, 3), ('b', 0x44, 1)]
+
+
+def test_plan_order():
+    board = Board()
+    with board:
+        units, _ = build(board, CONFIG)
+        rack = Rack(units)
+    # the sensor straight on the bus first, then the mux's channels in order
+    assert [unit.name for unit in rack.order] == ['bench', 'a', 'b', 'c', 'd']
+    assert [unit.index for unit in rack.units] == [0, 1, 2, 3, 4] # config order is kept
+    assert rack.describe() == 'bench, a via 0x70:0, b via 0x70:1, c via 0x70:2, d via 0x70:3'
+    assert rack.found() == 5 and rack.single
+
+
+def test_rounds_read_every_unit():
+    board = Board()
+    with board:
+        units, _ = build(board, CONFIG)
+        rack = Rack(units)
+        for _ in range(3):
+            t0 = board.clock.now_us
+            rack.measure()
+            # the conversions overlap: one conversion's wait per round, not five
+            assert board.clock.now_us - t0 < 200_000
+            for unit in units:
+                t, rh, ok = unit.sample
+                assert ok, unit.error
+                assert abs(t - (20 + unit.index) * 100) <= 2 and abs(rh - (50 + unit.index) * 100) <= 2
+
+
+def test_mux_switches_once_per_channel():
+    board = Board()
+    with board:
+        units, mux = build(board, CONFIG)
+        rack = Rack(units)
+        rack.measure()
+        # trigger pass: channels 0 to 3; collect pass, back the other way,
+        # starts on channel 3, which is still selected
+        assert mux.switches == 4 + 3
+        assert rack.switches() == mux.switches
+        for _ in range(4):
+            rack.measure()
+        assert mux.switches == 4 + 3 + 4 * (3 + 3)
+
+
+def test_missing_sensor_stays_in_rack():
+    board = Board()
+    with board:
+        units, _ = build(board, CONFIG)
+        units[3] = Unit(3, 'd', None, units[3].bus, [], units[3].mux, 3) # not found at boot
+        rack = Rack(units)
+        assert [unit.name for unit in rack.order] == ['bench', 'a', 'b', 'c']
+        rack.measure()
+        assert [unit.sample[2] for unit in units] == [True, True, True, False, True]
+
+
+class Placed:
+    # just enough of a sensor, and of its bus, for the planner
+    def __init__(self, addr, bridge):
+        self.i2c_addr = addr
+        self.periodic = None
+        self.raw = [0, 0]
+        self.bridge = bridge
+
+
+def placed(config, bridges):
+    # Units from (name, addr, mux channel or None, bus) without any hardware
+    mux = Mux(MUX, [])
+    units = []
+    for index, (name, addr, channel, bus) in enumerate(config):
+        sht = Placed(addr, bridges[bus])
+        units.append(Unit(index, name, sht, sht, [], None if channel is None else mux, -1 if channel is None else channel))
+    return units
+
+
+@pytest.mark.parametrize('config', [
+    [('a', 0x44, None, 0), ('b', 0x44, None, 0)], # two on the bus at one address
+    [('a', 0x44, None, 0), ('b', 0x44, 1, 0)], # one on the bus answers every channel
+    [('a', 0x44, 1, 0), ('b', 0x44, 1, 0)], # two on one channel
+])
+def test_clash(config):
+    bridges = [object(), object()]
+    with pytest.raises(ValueError, match='clash'):
+        Rack(placed(config, bridges))
+    # the same sensors apart on two buses are fine
+    config[1] = config[1][:3] + (1,)
+    Rack(placed(config, bridges))
+
+
+def test_no_clash():
+    Rack(placed([('a', 0x44, 0, 0), ('b', 0x44, 1, 0), ('bench', 0x45, None, 0)], [object()]))
@@ -0,0 +1,89 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+from machine import Board
+
+from relay import RelaySequencer, STEP_MS
+
+
+def watch(board, pins):
+    # (ms, pin, value) for every write to the given pins
+    writes = []
+    for id in pins:
+        board.pin(id).listeners.append(lambda pin, value, id=id: writes.append((board.clock.now_us // 1000, id, value)))
+    return writes
+
+
+def drain(board, sequencer):
+    # poll the way the asyncio task does, sleeping for the time poll() asks
+    while True:
+        wait = sequencer.poll()
+        if wait < 0:
+            return
+        board.clock.advance_us(wait * 1000)
+
+
+def test_pair_order():
+    board = Board()
+    with board:
+        sequencer = RelaySequencer()
+        relay = sequencer.relay([5, 6])
+        writes = watch(board, (5, 6))
+        t0 = board.clock.now_us // 1000
+        relay.on()
+        assert not relay.settled()
+        drain(board, sequencer)
+        relay.off()
+        drain(board, sequencer)
+        assert relay.settled()
+    # on from the last pin to the first, off from the first to the last
+    assert [(t - t0, id, value) for t, id, value in writes] == [
+        (0, 6, 1), (STEP_MS, 5, 1), (STEP_MS, 5, 0), (2 * STEP_MS, 6, 0)]
+
+
+def test_switch_back_finishes_first():
+    board = Board()
+    with board:
+        notified = []
+        sequencer = RelaySequencer(lambda: notified.append(True))
+        relay = sequencer.relay([5, 6])
+        writes = watch(board, (5, 6))
+        t0 = board.clock.now_us // 1000
+        relay.on()
+        assert sequencer.poll() == STEP_MS # pin 6 switched, pin 5 waits
+        relay.off() # before the on sequence has finished
+        assert relay.value() is False and relay.pending == 3
+        drain(board, sequencer)
+        assert len(notified) == 4
+    assert [(t - t0, id, value) for t, id, value in writes] == [
+        (0, 6, 1), (STEP_MS, 5, 1), (2 * STEP_MS, 5, 0), (3 * STEP_MS, 6, 0)]
+
+
+def test_repeated_switch_queues_nothing():
+    board = Board()
+    with board:
+        sequencer = RelaySequencer()
+        relay = sequencer.relay(5)
+        relay.value(False)
+        assert not sequencer.busy()
+        relay.value(True)
+        relay.value(True)
+        assert len(sequencer.steps) == 1
+        drain(board, sequencer)
+        assert board.pin(5).value == 1 and relay.settled()
+
+
+def test_relays_share_one_queue():
+    board = Board()
+    with board:
+        sequencer = RelaySequencer()
+        humidifier = sequencer.relay(5)
+        fan = sequencer.relay(6)
+        writes = watch(board, (5, 6))
+        t0 = board.clock.now_us // 1000
+        humidifier.on()
+        fan.on() # behind the humidifier, so it waits a step
+        drain(board, sequencer)
+    assert [(t - t0, id, value) for t, id, value in writes] == [(0, 5, 1), (STEP_MS, 6, 1)]
@@ -0,0 +1,64 @@
+import os, random, sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+from ring import SampleRing
+
+
+def put(ring, *values):
+    at = ring.claim()
+    if at < 0:
+        return False
+    ring.data[at:at + len(values)] = array('i', values)
+    ring.publish()
+    return True
+
+
+def take(ring):
+    at = ring.peek()
+    if at < 0:
+        return None
+    record = tuple(ring.data[at:at + ring.width])
+    ring.advance()
+    return record
+
+
+def test_empty():
+    ring = SampleRing(4, 2)
+    assert ring.peek() == -1
+    assert take(ring) is None
+
+
+def test_full_drops():
+    ring = SampleRing(4, 2)
+    assert all(put(ring, n, -n) for n in range(3)) # one slot is kept empty
+    assert not put(ring, 3, -3)
+    assert not put(ring, 4, -4)
+    assert ring.dropped == 2
+    # the records already in the ring are untouched by the drops
+    assert [take(ring) for _ in range(4)] == [(0, 0), (1, -1), (2, -2), None]
+    assert put(ring, 5, -5)
+    assert take(ring) == (5, -5)
+    assert ring.dropped == 2
+
+
+def test_wraps_in_order():
+    # the producer and consumer running at uneven rates, many times round
+    rng = random.Random(2)
+    ring = SampleRing(5, 3)
+    sent = received = 0
+    for _ in range(1000):
+        for _ in range(rng.randrange(4)):
+            if put(ring, sent, sent * 2, -sent):
+                sent += 1
+        for _ in range(rng.randrange(4)):
+            record = take(ring)
+            if record is None:
+                break
+            assert record == (received, received * 2, -received)
+            received += 1
+    assert sent > 5 * ring.slots and ring.dropped > 0
+    while take(ring) is not None:
+        received += 1
+    assert received == sent
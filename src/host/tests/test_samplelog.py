@@ -0,0 +1,51 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import pytest
+
+from samplelog import SampleLog
+
+
+class FailingFile:
+    # a flash file whose writes fail, as when the filesystem is full
+    def __init__(self, f):
+        self.f = f
+        self.failing = True
+
+    def write(self, data):
+        if self.failing:
+            raise OSError(28) # ENOSPC
+        return self.f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def test_append_and_read(tmp_path):
+    path = str(tmp_path / 'samples.log')
+    samples = SampleLog(2, 4, path)
+    for t in range(10):
+        samples.append(1000 + t, 100 + t, 200 + t, t & 1, t != 3)
+    samples.flush()
+
+    samples = SampleLog(2, 4, path) # after a reset
+    rows = list(samples.read(1002, 1004))
+    assert rows == [(1002, 102, 202, 0, True, 0), (1003, 0, 0, 1, False, 0), (1004, 104, 204, 0, True, 0)]
+
+
+def test_flush_fault_loses_only_the_buffer(tmp_path):
+    samples = SampleLog(2, 4, str(tmp_path / 'samples.log'))
+    samples.append(1000, 100, 200, 0, True) # starts the block
+    f = FailingFile(samples._SampleLog__file)
+    samples._SampleLog__file = f
+    for t in range(1, 3):
+        samples.append(1000 + t, 100 + t, 200 + t, 0, True)
+    with pytest.raises(OSError):
+        samples.append(1003, 103, 203, 0, True) # the buffer is full: flushed
+    f.failing = False
+
+    # the buffer was freed, so logging carries on
+    for t in range(4, 8):
+        samples.append(1000 + t, 100 + t, 200 + t, 0, True)
+    assert [row[0] for row in samples.read(1000, 1010)] == [1004, 1005, 1006, 1007]
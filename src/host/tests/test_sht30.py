@@ -0,0 +1,78 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'pigrostat'))
+
+import pytest
+
+import machine
+from machine import Board, Sht30Device
+
+
+def _sensor(board):
+    import sht30
+    board.bus(0, 1).attach(Sht30Device(0x44))
+    return sht30.SHT30(i2c=machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)), i2c_address=0x44)
+
+
+def test_periodic_fetch_nacked_read():
+    # the sensor ACKs the fetch command but NACKs the read when nothing new has
+    # been measured; that is the previous sample again, not a bus error
+    board = Board()
+    with board:
+        sht = _sensor(board)
+        sht.start_periodic(1)
+        first = sht.measure()
+        nacks = board.bus(0, 1).stats.nacks
+        assert sht.measure() == first
+        assert board.bus(0, 1).stats.nacks == nacks + 1
+
+        out = [0, 0]
+        sht.measure_centi(out)
+        assert abs(out[0] - first[0] * 100) <= 1 and abs(out[1] - first[1] * 100) <= 1
+
+
+def test_periodic_fetch_stale():
+    import sht30
+    board = Board()
+    with board:
+        sht = _sensor(board)
+        sht.start_periodic(1)
+        sht.measure()
+        board.bus(0, 1).detach(0x44) # sensor gone: nothing answers
+        board.clock.advance_us(2_500_000)
+        with pytest.raises(sht30.SHT30Error) as ex:
+            sht.measure()
+        assert ex.value.error_code == sht30.SHT30Error.BUS_ERROR
+
+
+class Corrupting(Sht30Device):
+    # flips a bit of the RH word on the way out, so its CRC no longer matches
+    def read(self, nbytes):
+        data = super().read(nbytes)
+        if data is None or nbytes < 6:
+            return data
+        return data[:3] + bytes((data[3] ^ 0x01,)) + data[4:]
+
+
+def test_crc_checked_in_place():
+    import sht30
+    board = Board()
+    with board:
+        board.bus(0, 1).attach(Corrupting(0x44))
+        sht = sht30.SHT30(i2c=machine.SoftI2C(sda=machine.Pin(0), scl=machine.Pin(1)), i2c_address=0x44)
+        with pytest.raises(sht30.SHT30Error) as ex:
+            sht.measure_centi([0, 0])
+        assert ex.value.error_code == sht30.SHT30Error.CRC_ERROR
+
+
+def test_single_shot_centi():
+    board = Board()
+    with board:
+        sht = _sensor(board)
+        out = [0, 0]
+        sht.measure_centi(out)
+        # the integer conversion, against the datasheet's formulas on the same words
+        raw_t, raw_rh = sht.raw
+        assert abs(out[0] - (-4500 + 17500 * raw_t / 65535)) <= 1
+        assert abs(out[1] - 10000 * raw_rh / 65535) <= 1
@@ -0,0 +1,118 @@
+# host stand-in for MicroPython's uasyncio, built on CPython's asyncio with an
+# event loop that runs on the board's virtual clock: when every task is
+# waiting, the loop advances the clock to the next timer instead of blocking
+
+import asyncio as _asyncio
+import math, selectors, threading
+
+from asyncio import (  # noqa: F401 - re-exported API
+    CancelledError, Event, Lock, TimeoutError, create_task, current_task, gather,
+    sleep, wait_for,
+)
+
+import machine
+from machine import Halt
+
+# how many idle steps a halted loop gets to let cancelled tasks unwind
+_DRAIN_STEPS = 10_000
+
+
+def sleep_ms(ms):
+    return sleep(ms / 1000)
+
+
+def wait_for_ms(aw, timeout):
+    return wait_for(aw, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    """
+    Single-waiter flag that may be set from an IRQ handler or another thread
+    """
+    def __init__(self):
+        self._event = Event()
+        self._loop = None
+        self._thread = None
+
+    def set(self):
+        if self._loop is not None and threading.get_ident() != self._thread:
+            self._loop.call_soon_threadsafe(self._event.set)
+        else:
+            self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        self._loop = _asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        await self._event.wait()
+        self._event.clear()
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.draining = 0
+
+    def select(self, timeout=None):
+        events = super().select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # nothing scheduled: only real I/O (or another thread) can wake us
+            return super().select(None)
+        us = max(1, math.ceil(timeout * 1_000_000))
+        if self.draining:
+            self.draining += 1
+            if self.draining > _DRAIN_STEPS:
+                raise Halt()
+            self.clock.advance_us(us)
+        else:
+            self.clock.wait_us(us)  # raises Halt once halting; returns early on an interrupt
+        return super().select(0)
+
+
+class VirtualTimeLoop(_asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self._virtual_clock = clock
+
+    def time(self):
+        return self._virtual_clock.now_us / 1_000_000
+
+
+def new_event_loop():
+    loop = VirtualTimeLoop(machine.board().clock)
+    _asyncio.set_event_loop(loop)
+    return loop
+
+
+def get_event_loop():
+    return _asyncio.get_event_loop()
+
+
+def run(coro):
+    loop = new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        _shutdown(loop)
+
+
+def _shutdown(loop):
+    # MicroPython just abandons outstanding tasks; CPython wants them finished,
+    # so cancel them and let them unwind without the halt firing again
+    tasks = [task for task in _asyncio.all_tasks(loop) if not task.done()]
+    loop._selector.draining = 1
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        try:
+            loop.run_until_complete(gather(*tasks, return_exceptions=True))
+        except BaseException:
+            pass
+    loop.set_exception_handler(lambda loop, context: None)
+    loop.close()
+    _asyncio.set_event_loop(None)
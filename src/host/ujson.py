@@ -0,0 +1,28 @@
+# host stand-in for MicroPython's ujson; the device parser tolerates trailing
+# commas (which config.json relies on) so strip them before handing to json
+
+import json, re
+
+_TRAILING_COMMA = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])')
+
+
+def _strip_trailing_commas(text):
+    return _TRAILING_COMMA.sub(lambda m: m.group(1) or m.group(2), text)
+
+
+def loads(text):
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode()
+    return json.loads(_strip_trailing_commas(text))
+
+
+def load(stream):
+    return loads(stream.read())
+
+
+def dumps(obj, separators=None):
+    return json.dumps(obj, separators=separators or (', ', ': '))
+
+
+def dump(obj, stream, separators=None):
+    stream.write(dumps(obj, separators))
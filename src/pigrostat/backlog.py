@@ -0,0 +1,129 @@
+# store-and-forward for telemetry: datagrams that could not be sent are kept
+# in a fixed-size file on flash, and sent on (oldest first) once the link is
+# back; the records inside carry their sequence numbers, so a datagram that is
+# sent twice (say, the board reset before the file caught up) can be dropped by
+# the collector
+#
+# for that, sequence numbers must not repeat across resets: the header also
+# keeps how far numbering may have got. the reporter reserves a block of
+# numbers ahead of use (one header write per block, not per sample), and after
+# a reset carries on above the block, so a reset skips some numbers but never
+# reuses one
+#
+# the file is a header (magic, slot size, slot count, tail, count, sequence)
+# followed by `slots` fixed-size slots, each a u16 length and the datagram; it
+# is written once at full size, so storing a datagram rewrites one slot and the
+# header and never grows the file. when full, the oldest datagram is overwritten
+
+import struct
+
+BACKLOG_FILE = 'backlog.bin'
+
+MAGIC = b'PGB2'
+HEADER_FORMAT = '>4sHHHHI'
+HEADER_SIZE = 16
+
+# datagrams kept, unless network.json says otherwise ("backlog")
+SLOTS = 64
+
+# sequence numbers reserved at a time
+SEQUENCE_BLOCK = 4096
+
+
+class Backlog:
+    def __init__(self, slots, datagram_size, path=BACKLOG_FILE):
+        self.path = path
+        self.slots = slots
+        self.slot_size = 2 + datagram_size
+        self.tail = 0 # oldest stored datagram
+        self.count = 0
+        self.dropped = 0 # datagrams overwritten before they could be sent
+        self.sequence = 0 # telemetry sequence numbers below this may have been used
+        self.__length = bytearray(2)
+        try:
+            self.__file = open(path, 'r+b')
+            magic, slot_size, slots, tail, count, sequence = struct.unpack(HEADER_FORMAT,
+                                                                           self.__file.read(HEADER_SIZE))
+            if magic == MAGIC:
+                self.sequence = sequence # kept even if the datagrams can't be
+            if magic == MAGIC and slot_size == self.slot_size and slots == self.slots and tail < slots and count <= slots:
+                self.tail = tail
+                self.count = count
+            else:
+                self.__create() # the batch size or slot count changed: start afresh
+        except (OSError, ValueError):
+            self.__create() # first boot, or unreadable
+
+    def __create(self):
+        try:
+            self.__file.close()
+        except AttributeError:
+            pass
+        f = open(self.path, 'w+b')
+        f.write(bytes(HEADER_SIZE))
+        empty = bytes(self.slot_size)
+        for _ in range(self.slots):
+            f.write(empty)
+        self.__file = f
+        self.tail = 0
+        self.count = 0
+        self.__save()
+
+    def __save(self):
+        f = self.__file
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, MAGIC, self.slot_size, self.slots, self.tail, self.count, self.sequence))
+        f.flush()
+
+    def __seek(self, slot):
+        self.__file.seek(HEADER_SIZE + slot * self.slot_size)
+
+    def store(self, datagram):
+        """
+        Keep a datagram for later, overwriting the oldest if the backlog is full
+        """
+        n = len(datagram)
+        if n > self.slot_size - 2:
+            raise ValueError('datagram too large for backlog')
+        if self.count == self.slots:
+            self.tail = (self.tail + 1) % self.slots
+            self.count -= 1
+            self.dropped += 1
+        self.__seek((self.tail + self.count) % self.slots)
+        struct.pack_into('>H', self.__length, 0, n)
+        f = self.__file
+        f.write(self.__length)
+        f.write(datagram)
+        self.count += 1
+        self.__save()
+
+    def peek(self, buf):
+        """
+        Read the oldest datagram into buf (a memoryview at least the datagram
+        size); returns its length, or 0 if the backlog is empty
+        """
+        if self.count == 0:
+            return 0
+        f = self.__file
+        self.__seek(self.tail)
+        f.readinto(self.__length)
+        n = struct.unpack('>H', self.__length)[0]
+        f.readinto(buf[:n])
+        return n
+
+    def advance(self):
+        """
+        Release the datagram returned by peek(), once it has been sent
+        """
+        if self.count > 0:
+            self.tail = (self.tail + 1) % self.slots
+            self.count -= 1
+            self.__save()
+
+    def reserve(self, sequence):
+        """
+        Record that sequence numbers up to (not including) `sequence` may be
+        used, so numbering after a reset starts there
+        """
+        self.sequence = sequence & 0xFFFFFFFF
+        self.__save()
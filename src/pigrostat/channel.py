@@ -0,0 +1,140 @@
+# sensor output channels, compiled once from config.json: thresholds become
+# numbers, the label/unit text is pre-encoded for the LCD code page, and
+# readings are formatted straight into a caller's bytearray, so the loop
+# doesn't build strings or look things up in the config dicts
+#
+# readings and thresholds are integer hundredths (2431 for 24.31): small ints
+# don't allocate on MicroPython, where every float result does
+#
+# a value with a "filter" section passes its readings through a Filter (see
+# filters.py) before the latch sees them
+
+from filters import Filter
+
+ERR = b'ERR'
+ON = b'on'
+OFF = b'off'
+
+
+def encode(text):
+    # HD44780 code page: degree sign is 0xDF; anything else non-ASCII is '?'
+    out = bytearray(len(text))
+    for i, c in enumerate(text):
+        o = ord(c)
+        if c == '°':
+            o = 223
+        elif o > 127:
+            o = 63
+        out[i] = o
+    return bytes(out)
+
+
+def decode(buf, n):
+    # for displays that want str; the inverse of encode() for the degree sign
+    return ''.join([chr(buf[i]) for i in range(n)])
+
+
+def put_bytes(buf, pos, data):
+    for i in range(len(data)):
+        buf[pos + i] = data[i]
+    return pos + len(data)
+
+
+def centi(value):
+    return int(round(float(value) * 100))
+
+
+def put_centi(buf, pos, value):
+    # hundredths written to one decimal place, rounding half away from zero
+    tenths = (value + 5) // 10 if value >= 0 else -((5 - value) // 10)
+    if tenths < 0:
+        buf[pos] = 45 # '-'
+        pos += 1
+        tenths = -tenths
+    whole = tenths // 10
+    start = pos
+    while True:
+        buf[pos] = 48 + whole % 10
+        pos += 1
+        whole //= 10
+        if not whole:
+            break
+    # digits went in least significant first
+    end = pos - 1
+    while start < end:
+        buf[start], buf[end] = buf[end], buf[start]
+        start += 1
+        end -= 1
+    buf[pos] = 46 # '.'
+    buf[pos + 1] = 48 + tenths % 10
+    return pos + 2
+
+
+class Channel:
+    __slots__ = ('index', 'name', 'label', 'on', 'off', 'relay', 'value', 'filter', 'prefix', 'suffix')
+
+    def __init__(self, index, cfg, relay=None):
+        self.index = index
+        self.name = cfg["name"]
+        self.label = cfg["label"]
+        self.on = centi(cfg["on"])
+        self.off = centi(cfg["off"])
+        self.relay = relay
+        self.value = None # latest (filtered) reading in hundredths; None after a failed read
+        self.filter = Filter(cfg["filter"]) if "filter" in cfg else None
+        self.prefix = encode(f'{cfg["label"]}: ')
+        self.suffix = encode(f' {cfg["unit"]} ')
+
+    def update(self, reading):
+        """
+        Take a reading (hundredths, or None after a failed read) through the
+        filter, if any, into value
+        """
+        f = self.filter
+        if f is None:
+            self.value = reading
+        elif reading is None:
+            self.value = f.miss()
+        else:
+            self.value = f.apply(reading)
+
+    def target(self):
+        """
+        The relay state this reading calls for
+        """
+        current = self.relay.value()
+        # logic here is absurdly simple latch; we don't need to be clever
+        if current is True:
+            if self.value >= self.off:
+                return False
+        else:
+            if self.value <= self.on:
+                return True
+        return current
+
+    def format(self, buf):
+        """
+        Write the display line for the latest reading into buf; returns the length
+        """
+        pos = put_bytes(buf, 0, self.prefix)
+        if self.value is None:
+            return put_bytes(buf, pos, ERR)
+        pos = put_centi(buf, pos, self.value)
+        pos = put_bytes(buf, pos, self.suffix)
+        if self.relay is not None:
+            pos = put_bytes(buf, pos, ON if self.relay.value() else OFF)
+        return pos
+
+
+def compile_channels(values, relay_factory):
+    """
+    Build a Channel per sensor output value; relay_factory(pins) makes the relay
+    for values that have one
+    """
+    channels = []
+    for idx, val in enumerate(values):
+        relay = None
+        if val.get("relay") is not None:
+            relay = relay_factory(val["relay"])
+        channels.append(Channel(idx, val, relay))
+    return channels
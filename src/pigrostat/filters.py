@@ -0,0 +1,108 @@
+# streaming filter between a channel's readings and its relay latch, so one
+# spiky or marginal reading near a threshold doesn't cost a relay cycle
+#
+# stages, each optional, in order:
+#   rate    readings may move at most this much per sample (a spike is clamped
+#           to the last accepted value plus or minus the rate)
+#   median  median of the last N (odd) clamped readings
+#   ewma    exponential moving average with alpha = 1 / 2 ** ewma
+#   hold    failed reads to ride out on the last value before reporting ERR
+#
+# values are integer hundredths, and every stage works in place on buffers
+# allocated here, in constant time per sample (the median's sorted copy is
+# kept up to date by insertion, fixed by the window size)
+
+from array import array
+
+
+class Filter:
+    def __init__(self, cfg):
+        self.rate = int(round(float(cfg.get("rate", 0)) * 100)) # hundredths per sample; 0: off
+        self.hold = cfg.get("hold", 0)
+        size = cfg.get("median", 1)
+        if size < 1 or size % 2 == 0:
+            raise ValueError('median window must be odd')
+        self.size = size
+        self.__ring = array('i', bytes(4 * size)) # readings, oldest at head once full
+        self.__sorted = array('i', bytes(4 * size))
+        self.shift = cfg.get("ewma", 0)
+        self.reset()
+
+    def reset(self):
+        # forget the past, e.g. after a long gap in readings
+        self.__count = 0
+        self.__head = 0
+        self.__previous = 0 # last accepted (clamped) reading
+        self.__acc = 0 # EWMA, scaled up by 2 ** shift
+        self.__misses = 0
+        self.value = None # last output
+
+    def apply(self, x):
+        """
+        Filter a reading; returns the value to act on
+        """
+        self.__misses = 0
+        count = self.__count
+        rate = self.rate
+        if rate and count:
+            previous = self.__previous
+            if x > previous + rate:
+                x = previous + rate
+            elif x < previous - rate:
+                x = previous - rate
+        self.__previous = x
+
+        size = self.size
+        if size > 1:
+            x = self.__median(x, count)
+        elif count == 0:
+            self.__count = 1
+
+        shift = self.shift
+        if shift:
+            if count == 0:
+                self.__acc = x << shift
+            else:
+                self.__acc += x - ((self.__acc + (1 << (shift - 1))) >> shift)
+            x = (self.__acc + (1 << (shift - 1))) >> shift
+
+        self.value = x
+        return x
+
+    def __median(self, x, count):
+        ring = self.__ring
+        ordered = self.__sorted
+        size = self.size
+        head = self.__head
+        if count == size:
+            # take the oldest reading out of the sorted copy
+            old = ring[head]
+            i = 0
+            while ordered[i] != old:
+                i += 1
+            while i < count - 1:
+                ordered[i] = ordered[i + 1]
+                i += 1
+            count -= 1
+        # insert the new one in order
+        i = count
+        while i > 0 and ordered[i - 1] > x:
+            ordered[i] = ordered[i - 1]
+            i -= 1
+        ordered[i] = x
+        count += 1
+        ring[head] = x
+        self.__head = (head + 1) % size
+        self.__count = count
+        return ordered[count >> 1]
+
+    def miss(self):
+        """
+        A failed read: the last value while it can be held, then None (ERR)
+        """
+        self.__misses += 1
+        if self.__misses > self.hold:
+            if self.value is not None:
+                self.reset()
+            return None
+        return self.value
@@ -0,0 +1,69 @@
+# heap accounting for the main loop: tracks the high-water mark of the heap,
+# how often it was collected and how long collection paused us, per reporting
+# interval
+#
+# with static memory the loop itself allocates nothing, so garbage comes only
+# from the occasional print or failed read; collecting that explicitly in the
+# idle gap after each sample keeps the automatic collector (which runs at
+# whatever moment an allocation happens to fail, with a fragmented heap) out
+# of the timing-sensitive paths
+
+import gc, time
+from logger import log
+
+
+class HeapMonitor:
+    def __init__(self, threshold=None, static=False):
+        self.static = static
+        if threshold is not None:
+            gc.threshold(threshold)
+        gc.collect() # start from a compacted heap, with setup garbage gone
+        self.__last = gc.mem_alloc()
+        self.__start = time.ticks_ms()
+        self.high = self.__last # heap high-water mark (bytes allocated)
+        self.collects = 0 # explicit collections
+        self.auto = 0 # collections we didn't ask for, inferred from the heap shrinking
+        self.pause_us = 0
+        self.pause_max_us = 0
+
+    def sample(self):
+        """
+        Note the heap size; call at points where allocation may have happened
+        """
+        used = gc.mem_alloc()
+        if used < self.__last:
+            self.auto += 1
+        if used > self.high:
+            self.high = used
+        self.__last = used
+
+    def idle(self):
+        """
+        Call when there is time to spare; collects now if in static mode
+        """
+        self.sample()
+        if not self.static:
+            return
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+        self.collects += 1
+        self.pause_us += pause
+        if pause > self.pause_max_us:
+            self.pause_max_us = pause
+        self.__last = gc.mem_alloc()
+
+    def report(self):
+        """
+        Print the stats for the interval since the last report, and start a new one
+        """
+        self.sample()
+        elapsed = time.ticks_diff(time.ticks_ms(), self.__start)
+        log.info(f'Heap: high {self.high} B, free {gc.mem_free()} B, gc {self.collects}+{self.auto} auto, '
+              f'pause {self.pause_us} us (max {self.pause_max_us} us) in {elapsed} ms')
+        self.__start = time.ticks_ms()
+        self.high = gc.mem_alloc()
+        self.collects = 0
+        self.auto = 0
+        self.pause_us = 0
+        self.pause_max_us = 0
@@ -0,0 +1,190 @@
+# rolling history of one reading, as the sensor's raw 16-bit words in
+# fixed-size array('H') rings, so RAM use is set at boot and never grows with
+# uptime
+#
+# a History is a stack of tiers: the first holds the latest samples, and each
+# tier above holds the means of `factor` consecutive entries of the one below
+# (with the shipped config, at 1 sample a second: a minute of samples, an hour
+# of minute means and a day of quarter-hour means)
+#
+# each tier keeps its window's statistics up to date as entries come and go,
+# in O(1) per entry: sums for the mean and variance, and monotonic wedges
+# (amortised O(1)) for the min and max. sums are kept about a reference near
+# the mean, so they stay small ints (no allocation) unless the window spans a
+# very wide range
+
+from array import array
+from sht30 import hum_centi, temp_centi
+
+# raw word to hundredths, and raw spread to hundredths
+T = 0
+RH = 1
+
+
+def to_centi(kind, raw):
+    if kind == T:
+        return temp_centi(raw)
+    return hum_centi(raw)
+
+
+def spread_centi(kind, raw):
+    # a difference of raw words: the scale without the offset
+    if kind == T:
+        return temp_centi(raw) - temp_centi(0)
+    return hum_centi(raw)
+
+
+def isqrt(n):
+    # integer square root (floor), without going through float
+    if n <= 0:
+        return 0
+    x = n
+    y = (x + 1) >> 1
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+    return x
+
+
+class Window:
+    """
+    The latest `slots` values, with min/max/mean/variance kept up to date
+    """
+    def __init__(self, slots):
+        self.slots = slots
+        self.values = array('H', bytes(2 * slots))
+        self.count = 0 # values held, up to slots
+        self.head = 0 # slot the next value goes in
+        self.pushes = 0 # values ever pushed; lets a reader tell if anything changed
+        self.__ref = 0
+        self.__sum = 0 # of (value - ref)
+        self.__squares = 0 # of (value - ref) ** 2
+        # wedges: slot indices whose values increase (lo) or decrease (hi)
+        # from front to back; the front is the window's min (max)
+        self.__lo = array('H', bytes(2 * slots))
+        self.__lo_front = 0
+        self.__lo_len = 0
+        self.__hi = array('H', bytes(2 * slots))
+        self.__hi_front = 0
+        self.__hi_len = 0
+
+    def push(self, value):
+        slots = self.slots
+        values = self.values
+        head = self.head
+        if self.count == slots:
+            # evict the oldest, which sits where the new value goes
+            d = values[head] - self.__ref
+            self.__sum -= d
+            self.__squares -= d * d
+            if self.__lo[self.__lo_front] == head:
+                self.__lo_front = (self.__lo_front + 1) % slots
+                self.__lo_len -= 1
+            if self.__hi[self.__hi_front] == head:
+                self.__hi_front = (self.__hi_front + 1) % slots
+                self.__hi_len -= 1
+        else:
+            if self.count == 0:
+                self.__ref = value
+            self.count += 1
+        values[head] = value
+        d = value - self.__ref
+        self.__sum += d
+        self.__squares += d * d
+
+        # drop wedge entries the new value supersedes, then add it at the back
+        lo = self.__lo
+        n = self.__lo_len
+        while n and values[lo[(self.__lo_front + n - 1) % slots]] >= value:
+            n -= 1
+        lo[(self.__lo_front + n) % slots] = head
+        self.__lo_len = n + 1
+        hi = self.__hi
+        n = self.__hi_len
+        while n and values[hi[(self.__hi_front + n - 1) % slots]] <= value:
+            n -= 1
+        hi[(self.__hi_front + n) % slots] = head
+        self.__hi_len = n + 1
+
+        self.head = (head + 1) % slots
+        self.pushes += 1
+        if self.head == 0:
+            self.__recentre()
+
+    def __recentre(self):
+        # once a lap, move the reference to the mean, so the sums stay small;
+        # exact: sum((x - r - s) ** 2) == squares - 2 * s * sum + n * s * s
+        n = self.count
+        shift = self.__sum // n
+        if shift:
+            self.__squares += n * shift * shift - 2 * shift * self.__sum
+            self.__sum -= n * shift
+            self.__ref += shift
+
+    def min(self):
+        return self.values[self.__lo[self.__lo_front]] if self.count else None
+
+    def max(self):
+        return self.values[self.__hi[self.__hi_front]] if self.count else None
+
+    def mean(self):
+        n = self.count
+        return self.__ref + (self.__sum + (n >> 1)) // n if n else None
+
+    def variance(self):
+        # population variance, in raw units squared
+        n = self.count
+        if not n:
+            return None
+        s = self.__sum
+        return (self.__squares * n - s * s) // (n * n)
+
+    def at(self, age):
+        # the value `age` entries back (0: the latest)
+        return self.values[(self.head - 1 - age) % self.slots]
+
+
+class History:
+    """
+    Tiers of Windows over one reading; tiers is a list of (slots, factor)
+    """
+    def __init__(self, kind, tiers):
+        self.kind = kind
+        self.tiers = [Window(slots) for slots, _ in tiers]
+        self.factors = [factor for _, factor in tiers]
+        # running sum and count of entries towards the next one up, per tier
+        self.__sums = array('i', bytes(4 * len(tiers)))
+        self.__counts = array('H', bytes(2 * len(tiers)))
+
+    def push(self, raw):
+        value = raw
+        sums = self.__sums
+        counts = self.__counts
+        factors = self.factors
+        tiers = self.tiers
+        for i in range(len(tiers)):
+            if i:
+                # this tier takes the mean of `factor` entries from the one below
+                sums[i] += value
+                counts[i] += 1
+                if counts[i] < factors[i]:
+                    return
+                value = (sums[i] + (counts[i] >> 1)) // counts[i]
+                sums[i] = 0
+                counts[i] = 0
+            tiers[i].push(value)
+
+    def stats(self, tier, out):
+        """
+        Min, max, mean and standard deviation of a tier, in hundredths, into
+        out[0..3]; False (out untouched) while the tier is empty
+        """
+        window = self.tiers[tier]
+        if not window.count:
+            return False
+        kind = self.kind
+        out[0] = to_centi(kind, window.min())
+        out[1] = to_centi(kind, window.max())
+        out[2] = to_centi(kind, window.mean())
+        out[3] = spread_centi(kind, isqrt(window.variance()))
+        return True
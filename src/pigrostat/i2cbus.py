@@ -0,0 +1,237 @@
+# shared I2C bridges: one I2cBridge owns each (sda, scl) pair, and hands out
+# BusDevice proxies that look like a machine.I2C object, so drivers are unchanged
+#
+# sensors reserve the moments they will need the bus (a periodic fetch, or the
+# end of a single-shot conversion); display updates acquire the bus and wait
+# until their turn fits before the next reservation, so display traffic fills
+# the idle time between sensor transactions instead of delaying a reading
+#
+# with sampling on core 1 (see main.py), bridges are shared through a lock per
+# transaction instead
+
+import time, ujson
+import uasyncio as asyncio
+
+# slack left between the end of a display turn and a reserved sensor window
+GUARD_US = 1000
+
+# smallest window a sensor reservation covers
+MIN_WINDOW_US = 500
+
+
+# where the last-good device map is kept on flash
+BUSMAP_FILE = 'busmap.json'
+
+
+def probe(i2c, addr):
+    """
+    True if a device ACKs addr: an empty write, rather than scanning the bus
+    """
+    try:
+        i2c.writeto(addr, b'')
+        return True
+    except OSError:
+        return False
+
+
+class BusMap:
+    """
+    The (sda, scl, addr) each device was last found at, kept on flash so that
+    after a reboot a device that is where it was last time can be used without
+    waiting for the bus to settle; only written when something changes
+    """
+    def __init__(self, path=BUSMAP_FILE):
+        self.path = path
+        self.changed = False
+        try:
+            with open(path, 'r') as f:
+                self.devices = ujson.loads(f.read())
+        except (OSError, ValueError):
+            self.devices = {} # first boot, or unreadable: rediscover
+
+    def known(self, label, sda, scl, addr):
+        return self.devices.get(label) == [sda, scl, addr]
+
+    def found(self, label, sda, scl, addr):
+        if not self.known(label, sda, scl, addr):
+            self.devices[label] = [sda, scl, addr]
+            self.changed = True
+
+    def lost(self, label):
+        if label in self.devices:
+            del self.devices[label]
+            self.changed = True
+
+    def save(self):
+        if self.changed:
+            try:
+                with open(self.path, 'w') as f:
+                    f.write(ujson.dumps(self.devices))
+                self.changed = False
+            except OSError:
+                pass # a read-only or full flash only costs the next boot some time
+
+
+class I2cBridge:
+    def __init__(self, i2c, freq=400_000):
+        self.i2c = i2c
+        self.byte_us = 9_000_000 // freq + 1 # 8 data bits + ACK per byte
+        self.windows = [] # (start, end) in ticks_us, reserved by sensors
+        self.__lock = asyncio.Lock()
+
+    def device(self, addr):
+        return BusDevice(self, addr)
+
+    def share(self, lock):
+        """
+        Guard every transaction with lock (a _thread lock), for buses used from
+        both cores; core 1 makes no reservations (the window list is core 0's)
+        """
+        if not isinstance(self.i2c, LockedI2C):
+            self.i2c = LockedI2C(self.i2c, lock)
+
+    def reserve(self, start_us, duration_us):
+        now = time.ticks_us()
+        # windows that have passed are dropped here too, not only in wait_us():
+        # with no display sharing the bus, nothing else would ever prune them
+        windows = self.windows
+        i = 0
+        while i < len(windows):
+            if time.ticks_diff(windows[i][1], now) <= 0:
+                windows.pop(i)
+            else:
+                i += 1
+        start = time.ticks_add(now, start_us)
+        windows.append((start, time.ticks_add(start, duration_us)))
+
+    def wait_us(self, turn_us):
+        # how long until a turn of turn_us fits without running into a reserved
+        # window (0 if it fits now); windows that have passed are dropped
+        now = time.ticks_us()
+        wait = 0
+        windows = self.windows
+        i = 0
+        while i < len(windows):
+            start, end = windows[i]
+            if time.ticks_diff(end, now) <= 0:
+                windows.pop(i)
+                continue
+            if time.ticks_diff(start, now) < turn_us + GUARD_US:
+                wait = max(wait, time.ticks_diff(end, now))
+            i += 1
+        return wait
+
+    async def acquire(self, device):
+        await self.__lock.acquire()
+        try:
+            while True:
+                wait = self.wait_us(device.turn_us)
+                if wait <= 0:
+                    return
+                await asyncio.sleep_ms((wait + 999) // 1000)
+        except BaseException:
+            self.__lock.release()
+            raise
+
+    def release(self):
+        self.__lock.release()
+
+
+class LockedI2C:
+    """
+    Wraps an I2C object so each transaction holds a lock; lets the two cores
+    share a bus, a whole transaction at a time
+    """
+    def __init__(self, i2c, lock):
+        self.i2c = i2c
+        self.lock = lock
+
+    def scan(self):
+        with self.lock:
+            return self.i2c.scan()
+
+    def writeto(self, addr, buf, stop=True):
+        with self.lock:
+            return self.i2c.writeto(addr, buf, stop)
+
+    def writevto(self, addr, vector, stop=True):
+        with self.lock:
+            return self.i2c.writevto(addr, vector, stop)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        with self.lock:
+            return self.i2c.readfrom(addr, nbytes, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        with self.lock:
+            return self.i2c.readfrom_into(addr, buf, stop)
+
+
+class BusDevice:
+    def __init__(self, bridge, addr):
+        self.bridge = bridge
+        self.addr = addr
+        self.turn_us = 0 # estimated bus time per turn, from observed traffic
+        self.__bytes = 0
+
+    def __track(self, nbytes):
+        self.__bytes += nbytes + 1 # plus the address byte
+
+    def __settle(self):
+        # fast attack, slow decay: one unusually large turn is remembered for a
+        # while, so the next one isn't granted a gap it won't fit in
+        used = self.__bytes * self.bridge.byte_us
+        self.__bytes = 0
+        if used > self.turn_us:
+            self.turn_us = used
+        else:
+            self.turn_us = (self.turn_us * 7 + used) // 8
+
+    # I2C surface used by the drivers
+
+    def scan(self):
+        return self.bridge.i2c.scan()
+
+    def writeto(self, addr, buf, stop=True):
+        self.__track(len(buf))
+        return self.bridge.i2c.writeto(addr, buf, stop)
+
+    def writevto(self, addr, vector, stop=True):
+        n = 0
+        for buf in vector:
+            n += len(buf)
+        self.__track(n)
+        return self.bridge.i2c.writevto(addr, vector, stop)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        self.__track(nbytes)
+        return self.bridge.i2c.readfrom(addr, nbytes, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self.__track(len(buf))
+        return self.bridge.i2c.readfrom_into(addr, buf, stop)
+
+    # scheduling
+
+    def reserve(self, *delays_ms, after_us=0):
+        """
+        Announce that this device will need the bus at each of the given offsets
+        from now (plus after_us, for devices queued behind another); the window
+        length is learned from its traffic so far, and returned
+        """
+        self.__settle()
+        duration = max(self.turn_us, MIN_WINDOW_US)
+        for delay in delays_ms:
+            self.bridge.reserve(delay * 1000 + after_us, duration)
+        return duration
+
+    async def acquire(self):
+        """
+        Wait for a turn on the bus that won't run into a reserved window
+        """
+        await self.bridge.acquire(self)
+        self.__bytes = 0
+
+    def release(self):
+        self.__settle()
+        self.bridge.release()
@@ -154,16 +154,49 @@ class LcdApi:
             self.cursor_x = 0
             self.cursor_y += 1
             self.implied_newline = (char != '\n')
-        if self.cursor_y >= self.num_lines:
-            self.cursor_y = 0
-        self.move_to(self.cursor_x, self.cursor_y)
+            if self.cursor_y >= self.num_lines:
+                self.cursor_y = 0
+            # the controller auto-increments within a line, so we only need
+            # to reposition when moving on to the next one
+            self.move_to(self.cursor_x, self.cursor_y)
 
     def putstr(self, string):
         """Write the indicated string to the LCD at the current cursor
         position and advances the cursor position appropriately.
         """
-        for char in string:
-            self.putchar(char)
+        self.hal_begin_batch()
+        try:
+            for char in string:
+                self.putchar(char)
+        finally:
+            self.hal_end_batch()
+
+    def putbytes(self, data, start=0, end=None):
+        """Write the raw character codes data[start:end] at the current cursor
+        position, relying on the controller's auto-increment. Unlike putstr
+        there is no newline handling or wrapping, so the run should fit on
+        the current line.
+        """
+        if end is None:
+            end = len(data)
+        self.hal_begin_batch()
+        try:
+            for i in range(start, end):
+                self.hal_write_data(data[i])
+        finally:
+            self.hal_end_batch()
+        self.cursor_x += end - start
+
+    def begin_batch(self):
+        """Starts queueing writes, so that everything up to the matching
+        end_batch() can be sent to the LCD in as few transfers as the hal
+        allows. Batches may be nested.
+        """
+        self.hal_begin_batch()
+
+    def end_batch(self):
+        """Ends a batch started with begin_batch(), sending anything queued."""
+        self.hal_end_batch()
 
     def custom_char(self, location, charmap):
         """Write a character to one of the 8 CGRAM locations, available
@@ -191,6 +224,20 @@ class LcdApi:
         """
         pass
 
+    def hal_begin_batch(self):
+        """Allows the hal layer to start queueing writes.
+
+        If desired, a derived HAL class will implement this function.
+        """
+        pass
+
+    def hal_end_batch(self):
+        """Allows the hal layer to send writes queued since hal_begin_batch.
+
+        If desired, a derived HAL class will implement this function.
+        """
+        pass
+
     def hal_write_command(self, cmd):
         """Write a command to the LCD.
 
@@ -0,0 +1,100 @@
+# leveled console logging; once the loop is running, messages are buffered
+# and printed together by a background task, so the USB serial write happens
+# when the loop is idle rather than in the middle of a sample
+#
+# a message is built before log() sees it, so call sites in the hot path that
+# would only log at DEBUG sit behind a const() flag, which the compiler drops
+# entirely when it is 0:
+#
+#     _DEBUG = const(0)
+#     ...
+#     if _DEBUG:
+#         log.debug(f'...')
+
+import uasyncio as asyncio
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+PREFIXES = {DEBUG: 'DEBUG: ', WARNING: 'WARNING: ', ERROR: 'ERROR: '}
+
+
+class Logger:
+    def __init__(self, level=INFO, lines=32):
+        self.level = level
+        self.buffered = False # print straight away until start() is called
+        self.dropped = 0 # buffered messages lost to a full buffer
+        self.__lines = [None] * lines
+        self.__head = 0
+        self.__count = 0
+
+    def configure(self, cfg):
+        # from config.json's "logging": level name, buffer size in lines
+        self.level = LEVELS[cfg.get("level", "info")]
+        if "lines" in cfg:
+            self.__lines = [None] * cfg["lines"]
+            self.__head = 0
+            self.__count = 0
+
+    def log(self, level, msg):
+        if level < self.level:
+            return
+        if level != INFO:
+            msg = PREFIXES[level] + msg
+        if not self.buffered:
+            print(msg)
+            return
+        lines = self.__lines
+        size = len(lines)
+        if self.__count == size:
+            # full: the oldest message goes
+            self.__head = (self.__head + 1) % size
+            self.__count -= 1
+            self.dropped += 1
+        lines[(self.__head + self.__count) % size] = msg
+        self.__count += 1
+
+    def debug(self, msg):
+        self.log(DEBUG, msg)
+
+    def info(self, msg):
+        self.log(INFO, msg)
+
+    def warning(self, msg):
+        self.log(WARNING, msg)
+
+    def error(self, msg):
+        self.log(ERROR, msg)
+
+    def flush(self):
+        """
+        Print any buffered messages
+        """
+        lines = self.__lines
+        size = len(lines)
+        while self.__count:
+            print(lines[self.__head])
+            lines[self.__head] = None
+            self.__head = (self.__head + 1) % size
+            self.__count -= 1
+        if self.dropped:
+            print(f'({self.dropped} messages dropped)')
+            self.dropped = 0
+
+    async def run(self, interval_ms=500):
+        # buffer from now on, and print what has built up every interval
+        self.buffered = True
+        try:
+            while True:
+                await asyncio.sleep_ms(interval_ms)
+                self.flush()
+        finally:
+            self.flush()
+            self.buffered = False
+
+
+# the shared logger
+log = Logger()
@@ -1,13 +1,43 @@
-import time, sht30, ujson
+import time, sht30, ujson, machine
+import uasyncio as asyncio
+from micropython import const
+from logger import log
+from metrics import Metrics, SENSOR, CRC, CONTROL, RELAY, RENDER, TELEMETRY
+from channel import compile_channels, decode, put_bytes, put_centi
+from heap import HeapMonitor
+from ring import SampleRing
+from history import History
+from relay import RelaySequencer
+from i2cbus import BusMap, I2cBridge, probe
+from rack import Mux, MuxedI2C, Rack, Unit
 from machine import I2C, SoftI2C, Pin, ADC
-from ssd1306 import SSD1306_I2C
-from pico_i2c_lcd import I2cLcd
+
+# instrumentation and debug logging in the loop; at 0, the compiler leaves
+# the guarded code out altogether
+_METRICS = const(1)
+_DEBUG = const(0)
 
 try:
-    print("Loading configuration...")
+    log.info("Loading configuration...")
     f = open('config.json', 'r')
     config = ujson.loads(f.read())
     f.close()
+    if "logging" in config:
+        log.configure(config["logging"])
+
+    # boot timings (ticks_ms counts from reset), printed with the first reading
+    boot_phases = []
+
+    def boot_phase(name):
+        boot_phases.append((name, time.ticks_ms()))
+
+    def report_boot():
+        global boot_phases
+        boot_phase("first reading")
+        log.info('Boot: ' + ', '.join(f'{name} {ms} ms' for name, ms in boot_phases))
+        boot_phases = None
+
+    boot_phase("config")
 
     class DummyPin:
         def on(self):
@@ -22,17 +52,11 @@ try:
     try:
         led = Pin("LED", Pin.OUT)
         led.on()
-        print(f'Using onboard LED: {led}')
+        log.info(f'Using onboard LED: {led}')
     except:
-        print('Using dummy LED')
+        log.warning('Using dummy LED')
         led = DummyPin()
         
-    def HasLength(value):
-        try:
-            return len(value) >= 0
-        except:
-            return False;
-        
     class Display:
         def clear(self, hard = False):
             pass # no-op
@@ -45,88 +69,245 @@ try:
             self.text(msg, 0)
             self.show()
 
+        def shows(self, y):
+            # whether line y appears anywhere; the renderer skips the rest
+            # rather than format lines only to drop them
+            return True
+
         def text(self, msg, y):
-            print(msg)
+            log.info(msg)
+
+        def line(self, buf, n, y):
+            # as text(), from the first n bytes of buf (LCD code page)
+            self.text(decode(buf, n), y)
+
+        def graph(self, window):
+            pass # no room for one
 
     class Lcd1602Display(Display):
+        # text() only updates a frame in RAM; show() compares it to a shadow
+        # copy of what the LCD already displays and sends just the changed runs
         def __init__(self, lcd):
             self.__lcd = lcd
+            self.__lines = lcd.num_lines
+            self.__columns = lcd.num_columns
+            self.__frame = bytearray(b' ' * (self.__lines * self.__columns))
+            self.__shown = bytearray(self.__frame) # LcdApi init leaves it cleared
+
+        def shows(self, y):
+            return y >= 0 and y < self.__lines
 
         def clear(self, hard = False):
             if hard:
                 self.__lcd.clear()
+                for i in range(len(self.__frame)):
+                    self.__frame[i] = 32
+                    self.__shown[i] = 32
 
         def text(self, msg, y):
-            if y >= 0 and y < 2:
-                self.__lcd.move_to(0, y)
-                self.__lcd.putstr(msg)
-                if len(msg) < 16:
-                    self.__lcd.move_to(len(msg), y)
-                    self.__lcd.putstr(" " * (16 - len(msg)))
+            if y >= 0 and y < self.__lines:
+                frame = self.__frame
+                base = y * self.__columns
+                n = min(len(msg), self.__columns)
+                for i in range(n):
+                    c = ord(msg[i])
+                    frame[base + i] = c if c < 256 else 63 # '?'
+                for i in range(n, self.__columns):
+                    frame[base + i] = 32 # pad, overwriting any previous text
             else:
                 super().text(msg, y) # use default logic
 
+        def line(self, buf, n, y):
+            # bytes go straight into the frame; no str needed
+            if y >= 0 and y < self.__lines:
+                frame = self.__frame
+                base = y * self.__columns
+                n = min(n, self.__columns)
+                for i in range(n):
+                    frame[base + i] = buf[i]
+                for i in range(n, self.__columns):
+                    frame[base + i] = 32
+            else:
+                super().line(buf, n, y)
+
+        def show(self):
+            lcd = self.__lcd
+            frame = self.__frame
+            shown = self.__shown
+            columns = self.__columns
+            batching = False
+            for y in range(self.__lines):
+                base = y * columns
+                x = 0
+                while x < columns:
+                    if frame[base + x] == shown[base + x]:
+                        x += 1
+                        continue
+                    start = x
+                    x += 1
+                    # rewriting a single unchanged character costs the same as
+                    # repositioning, so bridge one-character gaps
+                    while x < columns:
+                        if frame[base + x] != shown[base + x]:
+                            x += 1
+                        elif x + 1 < columns and frame[base + x + 1] != shown[base + x + 1]:
+                            x += 2
+                        else:
+                            break
+                    if not batching:
+                        lcd.begin_batch() # the whole frame in one I2C write
+                        batching = True
+                    lcd.move_to(start, y)
+                    lcd.putbytes(frame, base + start, base + x)
+                    for i in range(base + start, base + x):
+                        shown[i] = frame[i]
+            if batching:
+                lcd.end_batch()
+
     class Ssd1306Display(Display):
+        # drawing goes to the framebuffer with per-page dirty column ranges;
+        # show() narrows those against a shadow copy of what the panel already
+        # has, and sends only the changed column range of each changed page
+        LINE_HEIGHT = 12
+        GLYPH_SIZE = 8
+        GRAPH_LINE = 3 # the graph takes the rows from this text line down
+
         def __init__(self, ssd):
             self.__ssd = ssd
+            self.__buf = ssd.buffer
+            self.__mv = memoryview(ssd.buffer)
+            self.__sent = bytearray(len(ssd.buffer)) # driver init leaves the panel blank
+            self.__width = ssd.width
+            self.__height = ssd.height
+            self.__pages = ssd.pages
+            self.__offset = (128 - ssd.width) // 2 # narrow panels use centred columns
+            self.__dirty_lo = bytearray(b'\xff' * ssd.pages) # lo > hi: page is clean
+            self.__dirty_hi = bytearray(ssd.pages)
+            self.__widths = {} # pixel width of what each text line last drew
+            self.__drawn = 0 # bitmask of lines drawn since the last soft clear
+            self.__graphed = -1 # window.pushes when the graph was last drawn
+            # Co=0, D/C#=0 command stream: column range, page range
+            self.__cmd = bytearray(b'\x00\x21\x00\x00\x22\x00\x00')
+
+        def __mark(self, page0, page1, col0, col1):
+            lo = self.__dirty_lo
+            hi = self.__dirty_hi
+            for p in range(max(page0, 0), min(page1, self.__pages - 1) + 1):
+                if col0 < lo[p]:
+                    lo[p] = col0
+                if col1 > hi[p]:
+                    hi[p] = col1
+
+        def __blank(self, y, width):
+            top = y * self.LINE_HEIGHT
+            self.__ssd.fill_rect(0, top, width, self.GLYPH_SIZE, 0)
+            self.__mark(top >> 3, (top + self.GLYPH_SIZE - 1) >> 3, 0, width - 1)
 
         def clear(self, hard = False):
-            self.__ssd.fill(0)
+            if hard:
+                self.__ssd.fill(0)
+                self.__mark(0, self.__pages - 1, 0, self.__width - 1)
+                self.__widths.clear()
+                self.__graphed = -1
+            # soft: lines not redrawn before show() get blanked then, rather
+            # than wiping (and re-sending) the whole buffer every frame
+            self.__drawn = 0
+
+        def shows(self, y):
+            return y >= 0 and y * self.LINE_HEIGHT < self.__height
 
         def text(self, msg, y):
-            self.__ssd.text(msg, 0, y * 12)
+            top = y * self.LINE_HEIGHT
+            if top >= self.__height:
+                return
+            width = min(len(msg) * self.GLYPH_SIZE, self.__width)
+            previous = self.__widths.get(y, 0)
+            if previous:
+                self.__blank(y, max(previous, width))
+            self.__ssd.text(msg, 0, top)
+            if width:
+                self.__mark(top >> 3, (top + self.GLYPH_SIZE - 1) >> 3, 0, width - 1)
+            self.__widths[y] = width
+            self.__drawn |= 1 << y
+
+        def graph(self, window):
+            # sparkline of a history window below the text, newest on the
+            # right, scaled to the window's range; redrawn only when it changes
+            if window.pushes == self.__graphed:
+                return
+            self.__graphed = window.pushes
+            top = self.GRAPH_LINE * self.LINE_HEIGHT
+            height = self.__height - top
+            if height < 8:
+                return
+            ssd = self.__ssd
+            width = self.__width
+            ssd.fill_rect(0, top, width, height, 0)
+            self.__mark(top >> 3, (top + height - 1) >> 3, 0, width - 1)
+            n = min(window.count, width)
+            if not n:
+                return
+            lo = window.min()
+            span = window.max() - lo
+            bottom = top + height - 1
+            for age in range(n):
+                v = window.at(age) - lo
+                ssd.pixel(width - 1 - age, bottom - (v * (height - 1) // span if span else 0), 1)
 
         def show(self):
-            self.__ssd.show()
-
-    class Relay:
+            for y in list(self.__widths):
+                if not self.__drawn & (1 << y):
+                    self.__blank(y, self.__widths.pop(y))
+
+            ssd = self.__ssd
+            buf = self.__buf
+            sent = self.__sent
+            cmd = self.__cmd
+            dirty_lo = self.__dirty_lo
+            dirty_hi = self.__dirty_hi
+            for p in range(self.__pages):
+                lo = dirty_lo[p]
+                hi = dirty_hi[p]
+                dirty_lo[p] = 0xff
+                dirty_hi[p] = 0
+                if lo > hi:
+                    continue
+                base = p * self.__width
+                while lo <= hi and buf[base + lo] == sent[base + lo]:
+                    lo += 1
+                while hi >= lo and buf[base + hi] == sent[base + hi]:
+                    hi -= 1
+                if lo > hi:
+                    continue # redrawn, but identical to what's displayed
+                cmd[2] = lo + self.__offset
+                cmd[3] = hi + self.__offset
+                cmd[5] = p
+                cmd[6] = p
+                ssd.i2c.writeto(ssd.addr, cmd)
+                ssd.write_data(self.__mv[base + lo:base + hi + 1])
+                sent[base + lo:base + hi + 1] = self.__mv[base + lo:base + hi + 1]
+
+    class RelayMirror:
+        # core 0's copy of a relay that core 1 owns, for display
         def __init__(self, pins):
-            if HasLength(pins):
-                self.__pins = []
-                for idx, pin in enumerate(pins):
-                    self.__pins.append(Pin(pin, Pin.OUT))
-            else:
-                self.__pins = [ Pin(pins, Pin.OUT) ]
-            self.__state = False
-            print(f'Relays: {self.__pins}')
-            
-        def value(self, newValue = None):
-            if newValue is None:
-                return self.__state
-            elif newValue is True:
-                self.on()
-            else:
-                self.off()
-            
-        def on(self):
-            if self.__state is True:
-                return
-            for idx, pin in enumerate(reversed(self.__pins)):
-                if idx != 0:
-                    print('Pausing between pins...')
-                    time.sleep(0.1)
-                print(f'Activating {pin}')
-                pin.on()
-            self.__state = True
-            
-        def off(self):
-            if self.__state is False:
-                return
-            for idx, pin in enumerate(self.__pins):
-                if idx != 0:
-                    print('Pausing between pins...')
-                    time.sleep(0.1)
-                print(f'Deactivating {pin}')
-                pin.off()
-            self.__state = False
-
-    def getI2C(bridges, sda, scl, addr, label):
+            self.state = False
+
+        def value(self):
+            return self.state
+
+    SETTLE_MS = 50 # first use of a bus with no known-good map: let devices power up
+    PROBE_ATTEMPTS = 5
+    PROBE_RETRY_MS = 20
+
+    def getI2C(bridges, sda, scl, addr, label, mux=None):
+        # mux is (Mux, channel) for a device behind a multiplexer
+        known = busmap.known(label, sda, scl, addr)
         key = (sda, scl)
         if key in bridges:
-            print(f"Reusing I2C bridge for {key}")
-            i2c = bridges[key]
+            log.info(f"Reusing I2C bridge for {key}")
+            bridge = bridges[key]
         else:
-            print(f"Creating new I2C bridge for {key}")
+            log.info(f"Creating new I2C bridge for {key}")
 
             # hardware I2C bridge seems less reliable; may times hardware_test.py
             # will work fine with software, and utterly fail with hardware bridge
@@ -140,137 +321,600 @@ try:
             # module 1 handles SDA 2/6/10/14/18/26 (where SCL=SDA+1); try to use hardware
             try:
                 i2c = I2C((sda >> 1) & 1, sda=Pin(sda), scl=Pin(scl))
-                print(f"Using hardware I2C, controller {(sda >> 1) & 1}")
+                log.info(f"Using hardware I2C, controller {(sda >> 1) & 1}")
             except ValueError:
-                print("Unable to use hardware I2C; trying software...")
+                log.info("Unable to use hardware I2C; trying software...")
                 i2c = SoftI2C(sda=Pin(sda), scl=Pin(scl))
             """
-            time.sleep(1) # allow things to initialize
-            bridges[key] = i2c
-
-        print(f"Scanning for I2C device {hex(addr)} ({addr})...")
-        devices = i2c.scan()
-        print(f'Available devices: {devices}')
-        
-        if addr in devices:
-            print(f'Device ({label}) found')
-            return i2c
-
-        print(f'Device ({label}) not found')
+            if not known:
+                time.sleep_ms(SETTLE_MS) # allow things to initialize
+            bridge = I2cBridge(i2c)
+            bridges[key] = bridge
+
+        # the bridge schedules traffic between devices sharing the pins
+        device = bridge.device(addr)
+        i2c = bridge.i2c if mux is None else MuxedI2C(mux[0], mux[1], device)
+
+        # probe the configured address rather than scanning the whole bus
+        log.info(f"Probing for I2C device {hex(addr)} ({addr})...")
+        for attempt in range(PROBE_ATTEMPTS):
+            if probe(i2c, addr):
+                log.info(f'Device ({label}) found')
+                busmap.found(label, sda, scl, addr)
+                return device if mux is None else i2c
+            time.sleep_ms(PROBE_RETRY_MS)
+
+        log.warning(f'Device ({label}) not found; available devices: {i2c.scan()}')
+        busmap.lost(label)
         return None
 
+    def getMux(bridges, sda, scl, addr):
+        # one Mux per TCA9548A, shared by the sensors behind it
+        key = (sda, scl, addr)
+        if key not in muxes:
+            device = getI2C(bridges, sda, scl, addr, f'mux {hex(addr)}')
+            muxes[key] = None if device is None else Mux(addr, mux_peers.setdefault((sda, scl), []))
+        return muxes[key]
+
+    def setAlertLimits(sht, channels):
+        # the sensor raises ALERT once a reading reaches a relay's on or off
+        # threshold; channels are T then RH, and one without a relay never alerts
+        low = [-45, 0]
+        high = [130, 100]
+        for ch in channels:
+            if ch.relay is not None:
+                low[ch.index] = min(ch.on, ch.off) / 100
+                high[ch.index] = max(ch.on, ch.off) / 100
+        log.info(f'Alert limits: T {low[0]}..{high[0]}, RH {low[1]}..{high[1]}')
+        sht.set_alert_limits(low[0], high[0], low[1], high[1])
+
     def statusString(val):
         return "on" if val is True else "off"
-    
+
     display = Display()
+    display_bus = None
     bridges = dict() # I2C could be shared between pins; we'll re-use
-    
+    muxes = dict() # (sda, scl, addr): Mux, or None if it wasn't found
+    mux_peers = dict() # (sda, scl): every Mux on those pins
+    busmap = BusMap() # where devices were found last boot
+
     if 'display' in config:
         try:
-            print("Configuring display...")
+            log.info("Configuring display...")
             cfg = config["display"]
             i2c = getI2C(bridges, cfg["sda"], cfg["scl"], cfg["addr"], 'display')
             
             if i2c is not None:
-                print(f'Configuring {cfg["type"]} display...')
+                display_bus = i2c
+                log.info(f'Configuring {cfg["type"]} display...')
+                # only the configured driver is imported
                 if cfg["type"] == "ssd1306":
+                    from ssd1306 import SSD1306_I2C
                     display = Ssd1306Display(SSD1306_I2C(cfg["width"], cfg["height"], i2c, cfg["addr"]))
                 elif cfg["type"] == "lcd1602":
-                    display = Lcd1602Display(I2cLcd(i2c, cfg["addr"], 2, 16))
+                    from pico_i2c_lcd import I2cLcd
+                    display = Lcd1602Display(I2cLcd(i2c, cfg["addr"], cfg.get("lines", 2), cfg.get("columns", 16)))
         except:
-            print('Fault configuring display')
+            log.error('Fault configuring display')
             raise
     else:
-        print('Display not configured')
+        log.info('Display not configured')
 
     display.simple("Initializing...")
-
-    sensor = config["sensor"]
-    print(sensor)
-    values = sensor["values"]
-    print(f'Sensor has {len(values)} output values')
-    for val in values:
-        if 'relay' in val:
-            if val["relay"] is None:
-                val.pop("relay")
-            else:
-                val["relay"] = Relay(val["relay"])
-
-    print("Configuring sensor...")
-    i2c = getI2C(bridges, sensor["sda"], sensor["scl"], sensor["addr"], 'sensor')
-    sht = None
-    if i2c is not None:
-        sht=sht30.SHT30(i2c=i2c, i2c_address=sensor["addr"])
+    boot_phase("display")
+
+    # one "sensor", or a rack of them under "sensors": on any pins, and behind
+    # TCA9548A multiplexers ("mux": {"addr": ..., "channel": ...})
+    sensors = config["sensors"] if "sensors" in config else [config["sensor"]]
+    # optionally, core 1 owns sampling and the relays, and core 0 only draws
+    # and reports; readings cross over through a lock-free ring
+    dual_core = config.get("cores", 1) == 2
+
+    # switching a relay only queues its pin changes; a task (or core 1's loop)
+    # makes them, so a switch never blocks sampling
+    stepped = asyncio.Event() # relay steps queued
+    sequencer = RelaySequencer(None if dual_core else stepped.set)
+
+    alert = None # wired ALERT pins: sample when any of them fires
+    alert_pins = []
+    units = []
+    for index, sensor in enumerate(sensors):
+        log.info(str(sensor))
+        name = sensor.get("name", str(index))
+        label = 'sensor' if len(sensors) == 1 else f'sensor {name}'
+        # compiled once, so the loop doesn't go back to the config dicts
+        channels = compile_channels(sensor["values"], sequencer.relay)
+        log.info(f'Sensor has {len(channels)} output values')
+
+        log.info(f"Configuring {label}...")
+        mux = None
+        channel = -1
+        i2c = None
+        if "mux" in sensor:
+            mux = getMux(bridges, sensor["sda"], sensor["scl"], sensor["mux"]["addr"])
+            channel = sensor["mux"]["channel"]
+            if mux is not None:
+                i2c = getI2C(bridges, sensor["sda"], sensor["scl"], sensor["addr"], label, (mux, channel))
+        else:
+            i2c = getI2C(bridges, sensor["sda"], sensor["scl"], sensor["addr"], label)
+        sht = None
+        if i2c is not None:
+            sht=sht30.SHT30(i2c=i2c, i2c_address=sensor["addr"])
+            if "alert" in sensor:
+                alert = sensor["alert"]
+                sht.stop_periodic() # limits are written with the sensor idle
+                setAlertLimits(sht, channels)
+                alert_pins.append(Pin(alert["pin"], Pin.IN))
+            if "mps" in sensor or "alert" in sensor:
+                # periodic mode: the sensor measures in the background, and each
+                # read just fetches the latest sample (no 100ms conversion wait);
+                # alerts are only raised in periodic mode
+                mps = sensor.get("mps", 1)
+                repeatability = ["high", "medium", "low"].index(sensor.get("repeatability", "high"))
+                log.info(f'Starting periodic acquisition: {mps} mps, {sensor.get("repeatability", "high")} repeatability')
+                sht.start_periodic(mps, repeatability)
+        # scheduling goes through the bus device, even behind a mux
+        bus = i2c if mux is None or i2c is None else i2c.device
+        units.append(Unit(index, name, sht, bus, channels, mux, channel))
+    busmap.save()
+
+    # the sampling plan: see rack.py
+    rack = Rack(units)
+    if len(units) > 1:
+        log.info(f'Sampling {rack.found()} of {len(units)} sensors: {rack.describe()}')
+    # for log lines, with more than one sensor
+    tags = [f'{unit.name}: ' if len(units) > 1 else '' for unit in units]
+    boot_phase("sensor")
 
     cpu = machine.ADC(4) # allows access to CPU temperature
 
-    # main loop (note: no point running if we don't have a sensor)
-    print('Running...')
-    while sht is not None:
-        # enable the device LED to show we're alive
-        led.on()
-
-        display.clear() # soft clear; minimize 1602 flicker
+    READ_DELAY_MS = 100 # single-shot conversion wait
+
+    # with an ALERT pin, the steady-state loop only needs to poll slowly, to
+    # keep the display current; the alert wakes it when a relay may need to switch,
+    # and while it stays high sampling goes at the usual "delay", so a relay's
+    # filter (a median, say) gets the readings it needs to act on the crossing
+    PERIOD_MS = int((alert.get("poll", 10) if alert_pins else config["delay"]) * 1000)
+    ALERT_PERIOD_MS = int(config["delay"] * 1000)
+    ALERT_POLL_MS = 10 # how often core 1 looks at the ALERT pin
+
+    # per-iteration state is allocated once, here; the loop below then runs
+    # without allocating (readings are integer hundredths, lines are bytes)
+    line = bytearray(40) # reused for every display line
+    CPU_PREFIX = b'CPU: '
+    CPU_SUFFIX = b' C'
+
+    sampled = asyncio.Event() # new sample for the controller
+    changed = asyncio.Event() # something to redraw
+    beat = asyncio.Event() # new sample for the heartbeat LED
+
+    RING_SLOTS = max(8, 2 * len(units) + 1) # a round of every unit, twice over
+    POLL_MS = 20 # how often core 0 looks for new records
+    core1_error = None
+    if dual_core:
+        import _thread
+        # unit, flags (bit 0: read ok, bit 1 + i: channel i has a value), relay
+        # bits, raw T, raw RH, then each channel's (filtered) value
+        ring = SampleRing(RING_SLOTS, 5 + max([len(unit.channels) for unit in units]))
+        bus_lock = _thread.allocate_lock()
+        for bridge in bridges.values():
+            bridge.share(bus_lock)
+        # what core 0 shows: its own copies, updated from the ring
+        views = [compile_channels(sensor["values"], RelayMirror) for sensor in sensors]
+    else:
+        views = [unit.channels for unit in units]
 
-        # read the values from the sensor
+    # with network.json (on a Pico W) samples also go out as telemetry; the
+    # link comes up in the background, so control starts straight away
+    reporter = None
+    try:
+        f = open('network.json', 'r')
+        network_config = ujson.loads(f.read())
+        f.close()
+    except OSError:
+        network_config = None
+    if network_config is not None:
         try:
-            tuple = sht.measure()
-        except:
-            tuple = None
-        
-        for idx, x in enumerate(values):
-            val = None if tuple is None else tuple[idx]
-            
-            if val is None:
-                display.text(f'{x["label"]}: ERR', idx)
-            else:
-                try:
-                    status = ""
-                    if 'relay' in x:
-                        relay = x["relay"]
-                        current = relay.value()
-                        target = current # assume no change
-
-                        # logic here is absurdly simple latch; we don't need to be clever
-                        if current is True:
-                            if val >= x["off"]:
-                                target = False
-                        else:
-                            if val <= x["on"]:
-                                target = True
-
-                        status = statusString(target)
-
-                        if target != current:
-                            relay.value(target)
-                            print(f'{x["name"]} now {statusString(relay.value())}')
-
-                    unit = x["unit"].replace("°", chr(223)) # fix code-page
-                    display.text(f'{x["label"]}: {round(val, 1)} {unit} {status}', idx)
-                except:
-                    display.text(f'{x["label"]}: ERR', idx)
+            from uplink import Uplink, Reporter
+            uplink = Uplink(network_config)
+            reporter = Reporter(uplink, network_config, machine.unique_id())
+        except ImportError:
+            log.warning('Network not available on this board')
+    else:
+        log.info('Network not configured')
 
+    def cpu_centi():
         # read the ambient CPU temperature (ADC 4 is a slope showing temp,
         # with defined gradient/origin; these numbers are from the spec)
         # see: https://electrocredible.com/raspberry-pi-pico-temperature-sensor-tutorial/
-        ADC_voltage = cpu.read_u16() * (3.3 / (65536))
-        cputemp = 27 - (ADC_voltage - 0.706) / 0.001721
-
-        display.text(f'CPU: {round(cputemp, 1)} C', 2)
-        display.show()
-
-        # pause for long enough to ensure the status LED is visible
-        time.sleep(0.05)
+        # (in integers: volts are in 10uV units, so 3.3V is 330000)
+        ADC_voltage = (cpu.read_u16() * 330000) >> 16
+        return 2700 - (ADC_voltage - 70600) * 1000 // 1721 # hundredths
+
+    # with "log", every sample is also kept in an append-only log on flash
+    sample_log = None
+    if "log" in config:
+        from samplelog import SampleLog
+        cfg = config["log"]
+        sample_log = SampleLog(cfg.get("blocks", 32), cfg.get("flush", 32))
+        log.info(f'Logging samples to {sample_log.path} ({sample_log.blocks} blocks)')
+
+    # with "history", T and RH are kept in rolling windows, with statistics,
+    # for the display's graph and the console telemetry
+    # (per unit)
+    histories = None
+    graphs = None
+    if "history" in config:
+        cfg = config["history"]
+        tiers = cfg.get("tiers", [[60, 1], [60, 60], [96, 15]])
+        histories = [[History(0, tiers), History(1, tiers)] for _ in units]
+        if "graph" in cfg:
+            graphs = [pair[cfg["graph"]["value"]].tiers[cfg["graph"].get("tier", 0)] for pair in histories]
+    stats = [0, 0, 0, 0]
+
+    def report(unit, ok, raw_t, raw_rh, relays):
+        # each sample, once the controller has acted on it
+        if _METRICS:
+            start = time.ticks_us()
+        if histories is not None and ok:
+            histories[unit][0].push(raw_t)
+            histories[unit][1].push(raw_rh)
+        if reporter is not None:
+            reporter.record(ok, raw_t, raw_rh, relays, cpu_centi(), unit)
+        if sample_log is not None:
+            try:
+                sample_log.append(time.time(), raw_t, raw_rh, relays, ok, unit)
+            except OSError as ex:
+                log.warning(f'Sample log: write failed ({ex})') # flash full or worn: lose the samples
+        if _METRICS:
+            metrics.stop(TELEMETRY, start)
+
+    memory = config.get("memory", {})
+    heap = HeapMonitor(memory.get("threshold"), memory.get("static", False))
+
+    # per-stage timings and sensor error counts, reported with "metrics"
+    metrics = Metrics()
+    control_us = [0] # the sampler's share of the control stage
+    relay_bits = bytearray(len(units)) # per unit, from the controller's pass
+    page = [0] # the unit on the display
+
+    # the work is split into cooperative tasks so that a slow display update or
+    # relay sequencing never pushes back the next measurement
+
+    if alert_pins and not dual_core:
+        alerted = asyncio.ThreadSafeFlag()
+        for pin in alert_pins:
+            pin.irq(lambda pin: alerted.set(), Pin.IRQ_RISING)
+
+    def alert_high():
+        # the sensor holds ALERT high while a reading is outside its limits
+        for pin in alert_pins:
+            if pin.value():
+                return True
+        return False
+
+    async def pause(due):
+        # until the next sample is due, or the ALERT pin fires; True if it fired
+        wait = max(0, time.ticks_diff(due, time.ticks_ms()))
+        if not alert_pins:
+            await asyncio.sleep_ms(wait)
+            return False
+        try:
+            await asyncio.wait_for_ms(alerted.wait(), wait)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def sampler():
+        due = time.ticks_ms()
+        while True:
+            # every sensor, conversions overlapping; each unit's sample says how it went
+            await rack.measure_async(READ_DELAY_MS)
+            for unit in rack.order:
+                if unit.sample[2]:
+                    if _METRICS:
+                        metrics.add(SENSOR, unit.sht.read_us)
+                        metrics.add(CRC, unit.sht.crc_us)
+                else:
+                    if _METRICS:
+                        metrics.error(unit.error)
+                    if _DEBUG:
+                        log.debug(f'{tags[unit.index]}Read failed: {unit.error}')
+            if _METRICS:
+                start = time.ticks_us()
+            for unit in units:
+                sample = unit.sample
+                ok = sample[2]
+                for ch in unit.channels:
+                    ch.update(sample[ch.index] if ok else None)
+            if _METRICS:
+                control_us[0] = time.ticks_diff(time.ticks_us(), start)
+            if boot_phases:
+                report_boot()
+            sampled.set()
+            changed.set()
+            beat.set()
+
+            # fixed-rate schedule; if we overran, start again from now rather
+            # than bursting to catch up
+            due = time.ticks_add(due, ALERT_PERIOD_MS if alert_pins and alert_high() else PERIOD_MS)
+            wait = time.ticks_diff(due, time.ticks_ms())
+            if wait < 0:
+                due = time.ticks_ms()
+                wait = 0
+
+            # tell the bridge when we next need the bus, so display traffic
+            # goes around us: a single-shot reading writes the command now
+            # and reads the result once the conversion is done
+            rack.reserve(wait, READ_DELAY_MS)
+            await asyncio.sleep_ms(0) # let the other tasks handle this sample
+            heap.idle()
+            if _METRICS:
+                start = time.ticks_us()
+            alerted_now = await pause(due)
+            if _METRICS:
+                metrics.idle(start)
+            if alerted_now:
+                due = time.ticks_ms() # the schedule restarts from the alert
+
+    async def controller():
+        while True:
+            await sampled.wait()
+            sampled.clear()
+            if _METRICS:
+                start = time.ticks_us()
+            for unit in units:
+                relays = 0
+                for ch in unit.channels:
+                    if ch.relay is None:
+                        continue
+                    if ch.value is not None:
+                        target = ch.target()
+                        if target != ch.relay.value():
+                            ch.relay.value(target)
+                            log.info(f'{tags[unit.index]}{ch.name} now {statusString(target)}')
+                            changed.set()
+                    if ch.relay.value():
+                        relays |= 1 << ch.index
+                relay_bits[unit.index] = relays
+            if _METRICS:
+                # with the sampler's filtering
+                metrics.add(CONTROL, control_us[0] + time.ticks_diff(time.ticks_us(), start))
+            for unit in units:
+                report(unit.index, unit.sample[2], unit.raw[0], unit.raw[1], relay_bits[unit.index])
+
+    async def switcher():
+        # carries out queued relay steps
+        while True:
+            if _METRICS:
+                start = time.ticks_us()
+            wait = sequencer.poll()
+            if _METRICS:
+                metrics.stop(RELAY, start)
+            if wait < 0:
+                await stepped.wait()
+                stepped.clear()
+            else:
+                await asyncio.sleep_ms(wait)
+
+    async def renderer():
+        while True:
+            await changed.wait()
+            changed.clear()
+
+            display.clear() # soft clear; minimize 1602 flicker
+            unit = page[0]
+            for ch in views[unit]:
+                if display.shows(ch.index):
+                    display.line(line, ch.format(line), ch.index)
+                    await asyncio.sleep_ms(0) # let a due sample in between lines
+
+            if display.shows(2): # not on a 2-line LCD
+                n = put_bytes(line, 0, CPU_PREFIX)
+                n = put_centi(line, n, cpu_centi())
+                display.line(line, put_bytes(line, n, CPU_SUFFIX), 2)
+            if graphs is not None:
+                display.graph(graphs[unit])
+            if display_bus is None:
+                if _METRICS:
+                    start = time.ticks_us()
+                display.show()
+            else:
+                # wait for a gap in the sensor's use of the bus that fits this update
+                await display_bus.acquire()
+                if _METRICS:
+                    start = time.ticks_us()
+                try:
+                    display.show()
+                finally:
+                    display_bus.release()
+            if _METRICS:
+                metrics.stop(RENDER, start)
+
+    async def heartbeat():
+        while True:
+            # flash the device LED for each sample to show we're alive
+            await beat.wait()
+            beat.clear()
+            led.on()
+            await asyncio.sleep_ms(50) # long enough for the flash to be visible
+            led.off()
 
-        # show that we're done thinking (thinking will appear as a flash)
-        led.off()
+    async def telemetry(interval):
+        while True:
+            await asyncio.sleep(interval)
+            for unit in range(len(units)):
+                log.info(tags[unit] + ' '.join(f'{ch.label}={"ERR" if ch.value is None else round(ch.value / 100, 1)}{summary(unit, ch.index)}'
+                                               for ch in views[unit]))
+
+    async def pager(interval):
+        # with more than one sensor, the display shows each in turn
+        while True:
+            await asyncio.sleep(interval)
+            page[0] = (page[0] + 1) % len(units)
+            changed.set()
+
+    def summary(unit, index):
+        # the range and spread of the shortest history window
+        if histories is None or not histories[unit][index].stats(0, stats):
+            return ''
+        return f' ({stats[0] / 100}..{stats[1] / 100}, mean {stats[2] / 100}, sd {stats[3] / 100})'
+
+    def core1():
+        # sampler and controller in one blocking loop on the second core, so
+        # control latency doesn't depend on how long core 0 spends drawing
+        global core1_error
+        due = time.ticks_ms()
+        alert_level = 0
+        data = ring.data
+        try:
+            while True:
+                rack.measure(READ_DELAY_MS)
+                if _METRICS:
+                    for unit in rack.order:
+                        if unit.sample[2]:
+                            metrics.add(SENSOR, unit.sht.read_us)
+                            metrics.add(CRC, unit.sht.crc_us)
+                        else:
+                            metrics.error(unit.error)
+                for unit in units:
+                    if _METRICS:
+                        start = time.ticks_us()
+                    sample = unit.sample
+                    ok = sample[2]
+                    relays = 0
+                    flags = 1 if ok else 0
+                    for ch in unit.channels:
+                        ch.update(sample[ch.index] if ok else None)
+                        if ch.value is not None:
+                            flags |= 2 << ch.index
+                        if ch.relay is None:
+                            continue
+                        if ch.value is not None:
+                            target = ch.target()
+                            if target != ch.relay.value():
+                                ch.relay.value(target) # core 0 logs the change
+                        if ch.relay.value():
+                            relays |= 1 << ch.index
+                    if _METRICS:
+                        metrics.stop(CONTROL, start)
+
+                    base = ring.claim()
+                    if base >= 0:
+                        data[base] = unit.index
+                        data[base + 1] = flags
+                        data[base + 2] = relays
+                        data[base + 3] = unit.raw[0]
+                        data[base + 4] = unit.raw[1]
+                        for ch in unit.channels:
+                            data[base + 5 + ch.index] = 0 if ch.value is None else ch.value
+                        ring.publish()
+
+                # wait for the next sample, making relay steps as they fall due
+                due = time.ticks_add(due, ALERT_PERIOD_MS if alert_pins and alert_high() else PERIOD_MS)
+                while True:
+                    if _METRICS:
+                        start = time.ticks_us()
+                    step = sequencer.poll()
+                    if _METRICS:
+                        metrics.stop(RELAY, start)
+                    wait = time.ticks_diff(due, time.ticks_ms())
+                    if wait <= 0:
+                        break
+                    if alert_pins:
+                        # this core has nothing better to do than watch the pins
+                        level = 0
+                        for pin in alert_pins:
+                            level |= pin.value()
+                        rose = level and not alert_level
+                        alert_level = level
+                        if rose:
+                            due = time.ticks_ms()
+                            break
+                        wait = min(wait, ALERT_POLL_MS)
+                    if _METRICS:
+                        start = time.ticks_us()
+                    time.sleep_ms(wait if step < 0 else min(wait, step))
+                    if _METRICS:
+                        metrics.idle(start)
+                if wait < 0:
+                    due = time.ticks_ms()
+        except Exception as ex:
+            core1_error = ex # core 0 notices, and fails the run
+
+    async def consumer():
+        # core 0's side of the ring: apply every record, then redraw once
+        data = ring.data
+        while True:
+            if core1_error is not None:
+                raise core1_error
+            fresh = False
+            base = ring.peek()
+            while base >= 0:
+                unit = data[base]
+                flags = data[base + 1]
+                relays = data[base + 2]
+                for ch in views[unit]:
+                    ch.value = data[base + 5 + ch.index] if flags & (2 << ch.index) else None
+                    if ch.relay is not None:
+                        state = (relays >> ch.index) & 1 == 1
+                        if state != ch.relay.state:
+                            ch.relay.state = state
+                            log.info(f'{tags[unit]}{ch.name} now {statusString(state)}')
+                report(unit, flags & 1, data[base + 3], data[base + 4], relays)
+                ring.advance()
+                fresh = True
+                base = ring.peek()
+            if fresh and boot_phases:
+                report_boot()
+            if fresh:
+                changed.set()
+                beat.set()
+                heap.idle()
+            await asyncio.sleep_ms(POLL_MS)
+
+    async def heap_report(interval):
+        while True:
+            await asyncio.sleep(interval)
+            heap.report()
+
+    async def metrics_report(interval, udp):
+        while True:
+            await asyncio.sleep(interval)
+            text = metrics.report()
+            log.info(text)
+            if udp and reporter is not None:
+                reporter.send_text(text)
+
+    async def run():
+        if dual_core:
+            _thread.start_new_thread(core1, ())
+            tasks = [consumer(), renderer(), heartbeat()]
+        else:
+            tasks = [sampler(), controller(), switcher(), renderer(), heartbeat()]
+        if reporter is not None:
+            tasks += [uplink.run(), reporter.run()]
+        if "telemetry" in config:
+            tasks.append(telemetry(config["telemetry"]["interval"]))
+        if len(units) > 1:
+            tasks.append(pager(config.get("display", {}).get("page", 5)))
+        if "report" in memory:
+            tasks.append(heap_report(memory["report"]))
+        if _METRICS and "metrics" in config:
+            tasks.append(metrics_report(config["metrics"]["report"], config["metrics"].get("udp", False)))
+        # console output is buffered from here on
+        tasks.append(log.run(config.get("logging", {}).get("flush", 500)))
+        await asyncio.gather(*tasks) # any task failing ends the run (and reboots)
 
-        # wait a second (there's no point updating too frequently)
-        time.sleep(config["delay"])
+    # main loop (note: no point running if we don't have a sensor)
+    if rack.found():
+        log.info('Running...')
+        asyncio.run(run())
 finally:
+    log.flush()
     # show exit condition
     try:
-        display.simple("Sensor failure" if sht is None else "Terminated")
+        display.simple("Sensor failure" if not rack.found() else "Terminated")
         for i in range(5):
             led.on()
             time.sleep(0.5)
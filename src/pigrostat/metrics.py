@@ -0,0 +1,103 @@
+# hot-path instrumentation: how long each stage of the loop takes, as
+# fixed-bucket histograms of ticks_us durations, plus counts of sensor errors
+# by SHT30Error code; report() gives one compact line per interval and starts
+# the next
+#
+# recording is a couple of compares and an array increment, with nothing
+# allocated; main.py guards its timing calls with a const() so that they can
+# be compiled out altogether
+
+import time
+from array import array
+from sht30 import SHT30Error
+
+# stages
+SENSOR = 0 # bus transaction reading the sensor
+CRC = 1 # checking the readout
+CONTROL = 2 # filters and latch, for all channels
+RELAY = 3 # making due relay steps
+RENDER = 4 # formatting and sending a frame to the display
+TELEMETRY = 5 # recording a sample for telemetry, the log and history
+STAGES = ('sensor', 'crc', 'control', 'relay', 'render', 'telemetry')
+
+# bucket upper bounds in us; one more bucket counts everything above the last
+BOUNDS = (50, 150, 500, 1500, 5000, 15000, 50000)
+
+# error counters: the SHT30Error codes, and anything else
+ERRORS = ('other', 'bus', 'data', 'crc')
+
+
+class Metrics:
+    def __init__(self):
+        width = len(BOUNDS) + 1
+        self.width = width
+        self.counts = array('I', bytes(4 * width * len(STAGES)))
+        self.maxima = array('I', bytes(4 * len(STAGES)))
+        self.errors = array('I', bytes(4 * len(ERRORS)))
+        self.idle_us = 0 # time the loop spent waiting for the next sample
+        self.__since = time.ticks_ms()
+
+    def add(self, stage, us):
+        """
+        Count a duration for a stage
+        """
+        bucket = 0
+        for bound in BOUNDS:
+            if us < bound:
+                break
+            bucket += 1
+        self.counts[stage * self.width + bucket] += 1
+        if us > self.maxima[stage]:
+            self.maxima[stage] = us
+
+    def stop(self, stage, start_us):
+        # add() the time since start_us, from time.ticks_us()
+        self.add(stage, time.ticks_diff(time.ticks_us(), start_us))
+
+    def idle(self, start_us):
+        self.idle_us += time.ticks_diff(time.ticks_us(), start_us)
+
+    def error(self, ex):
+        code = ex.error_code if isinstance(ex, SHT30Error) else 0
+        self.errors[code if code is not None and 0 <= code < len(ERRORS) else 0] += 1
+
+    def __percentile(self, stage, n, fraction):
+        # upper bound of the bucket holding that fraction of samples
+        counts = self.counts
+        base = stage * self.width
+        wanted = n * fraction
+        seen = 0
+        for bucket in range(self.width):
+            seen += counts[base + bucket]
+            if seen >= wanted:
+                return f'<{BOUNDS[bucket]}' if bucket < len(BOUNDS) else f'>{BOUNDS[-1]}'
+        return '-'
+
+    def report(self):
+        """
+        The interval's figures as one line: per stage the count, median and
+        95th percentile (as bucket bounds) and max in us; errors; loop idle
+        time. Then resets for the next interval
+        """
+        elapsed_ms = max(1, time.ticks_diff(time.ticks_ms(), self.__since))
+        parts = []
+        counts = self.counts
+        for stage in range(len(STAGES)):
+            base = stage * self.width
+            n = sum(counts[base:base + self.width])
+            if n:
+                parts.append(f'{STAGES[stage]} {n} {self.__percentile(stage, n, 0.5)} '
+                             f'{self.__percentile(stage, n, 0.95)} {self.maxima[stage]}')
+        errors = ' '.join(f'{ERRORS[i]} {self.errors[i]}' for i in range(len(ERRORS)) if self.errors[i])
+        line = f'Metrics {elapsed_ms} ms: ' + ', '.join(parts) + \
+               f'; errors {errors or "none"}; idle {self.idle_us // (10 * elapsed_ms)}%'
+
+        for i in range(len(counts)):
+            counts[i] = 0
+        for i in range(len(STAGES)):
+            self.maxima[i] = 0
+        for i in range(len(ERRORS)):
+            self.errors[i] = 0
+        self.idle_us = 0
+        self.__since = time.ticks_ms()
+        return line
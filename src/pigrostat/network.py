@@ -1,68 +1,51 @@
-import rp2, network, time, ntptime, ujson, socket
-from machine import Pin
+import time, ujson, sht30, machine
+import uasyncio as asyncio
+from machine import Pin, SoftI2C, ADC
+from uplink import Uplink, Reporter
+
+# telemetry on its own, without the hygrostat: useful for bringing up the
+# network and a collector; main.py runs the same uplink when network.json exists
 
 # set time to known-bad Jan 1st 2023; this simplifies debugging, because Thonny
 # synchronizes the clock for us automatically, and we want known-state
 machine.RTC().datetime((2023, 1, 1, 1, 0, 0, 0, 0))
-        
+
 try:
     print("Loading network configuration...")
     f = open('network.json', 'r')
     config = ujson.loads(f.read())
     f.close()
 
-    rp2.country('UK') # channel frequencies
-    host = "pigrostat" if "hostname" not in config else config["hostname"]
-    print(f'Connecting to {config["ssid"]} as {host}')
-    network.hostname(host)
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    # print(wlan.scan()) # show available SSIDs - useful in case of problems
-    wlan.connect(config["ssid"], config["password"])
-    # Wait for connect or fail
-    retries = 10
-    while retries > 0:
-        if wlan.status() < 0 or wlan.status() >= 3:
-            break
-        retries -= 1
-        print('...')
-        time.sleep(1)
-    
-    if wlan.isconnected():
-        print(f'Connected successfully: {wlan.ifconfig()}')
-        
-        print('Attempting to set network time...')
-        
-        retries = 10
-        while retries > 0:
-            retries -= 1
-            try:
-                ntptime.settime()
-                print(f'Time updated via NTP')
-                break
-            except:
-                pass
+    # the sensor, as configured for main.py
+    f = open('config.json', 'r')
+    sensor = ujson.loads(f.read())["sensor"]
+    f.close()
+    sht = sht30.SHT30(i2c=SoftI2C(sda=Pin(sensor["sda"]), scl=Pin(sensor["scl"])), i2c_address=sensor["addr"])
+    cpu = ADC(4)
+
+    uplink = Uplink(config)
+    reporter = Reporter(uplink, config, machine.unique_id())
+    interval_ms = int(config.get("interval", 2) * 1000)
+    sample = [0, 0]
 
-        print(f'Time (UTC): {time.localtime()}')
-            
-        led = Pin("LED", Pin.OUT)
-        send_ip = config["send_ip"]
-        send_port = config["send_port"]
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        print(f'Sending to {send_ip}:{send_port}')
+    async def sampler():
+        due = time.ticks_ms()
         while True:
-            led.on()
             try:
-                message = "Test message"
-                result = sock.sendto(message.encode(), (send_ip, send_port))
-                print(f'Sent: {result}')
-            except:
-                print ("Failure sending UDP packet")
-                raise
-            finally:
-                led.off()
+                sht.measure_centi(sample)
+                ok = True
+            except sht30.SHT30Error:
+                ok = False
+            # CPU temperature in hundredths, as main.py works it out
+            cputemp = 2700 - (((cpu.read_u16() * 330000) >> 16) - 70600) * 1000 // 1721
+            reporter.record(ok, sht.raw[0], sht.raw[1], 0, cputemp)
+            due = time.ticks_add(due, interval_ms)
+            await asyncio.sleep_ms(max(0, time.ticks_diff(due, time.ticks_ms())))
+
+    async def run():
+        await asyncio.gather(uplink.run(), reporter.run(), sampler())
 
-            time.sleep(2)
+    asyncio.run(run())
 except:
     print('Network failure')
-    raise
\ No newline at end of file
+    raise
@@ -3,7 +3,6 @@
 # license: MIT
 
 import utime
-import gc
 
 from lcd_api import LcdApi
 from machine import I2C
@@ -20,9 +19,17 @@ class I2cLcd(LcdApi):
     
     #Implements a HD44780 character LCD connected via PCF8574 on I2C
 
+    # each LCD byte goes out as 4 port writes (high nibble with E, high nibble,
+    # low nibble with E, low nibble); room for a full 40-column line plus moves
+    BUFFER_BYTES = 4 * 64
+
     def __init__(self, i2c, i2c_addr, num_lines, num_columns):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
+        self._buf = bytearray(self.BUFFER_BYTES)
+        self._mv = memoryview(self._buf)
+        self._len = 0
+        self._batching = 0
         self.i2c.writeto(self.i2c_addr, bytes([0]))
         utime.sleep_ms(20)   # Allow LCD time to powerup
         # Send reset 3 times
@@ -40,7 +47,6 @@ class I2cLcd(LcdApi):
         if num_lines > 1:
             cmd |= self.LCD_FUNCTION_2LINES
         self.hal_write_command(cmd)
-        gc.collect()
 
     def hal_write_init_nibble(self, nibble):
         # Writes an initialization nibble to the LCD.
@@ -48,43 +54,59 @@ class I2cLcd(LcdApi):
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
         self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
         self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
         
     def hal_backlight_on(self):
         # Allows the hal layer to turn the backlight on
+        self._flush()
         self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
-        gc.collect()
         
     def hal_backlight_off(self):
         #Allows the hal layer to turn the backlight off
+        self._flush()
         self.i2c.writeto(self.i2c_addr, bytes([0]))
-        gc.collect()
-        
+
+    def hal_begin_batch(self):
+        # Queue writes until the matching hal_end_batch, then send them as one
+        # I2C transaction
+        self._batching += 1
+
+    def hal_end_batch(self):
+        self._batching -= 1
+        if self._batching <= 0:
+            self._batching = 0
+            self._flush()
+
+    def _flush(self):
+        if self._len:
+            self.i2c.writeto(self.i2c_addr, self._mv[:self._len])
+            self._len = 0
+
+    def _queue(self, rs, value):
+        # Encode one LCD byte as E-strobed nibbles on the PCF8574 port.
+        # Data is latched on the falling edge of E.
+        if self._len + 4 > len(self._buf):
+            self._flush()
+        buf = self._buf
+        pos = self._len
+        flags = rs | (self.backlight << SHIFT_BACKLIGHT)
+        high = flags | (((value >> 4) & 0x0f) << SHIFT_DATA)
+        low = flags | ((value & 0x0f) << SHIFT_DATA)
+        buf[pos] = high | MASK_E
+        buf[pos + 1] = high
+        buf[pos + 2] = low | MASK_E
+        buf[pos + 3] = low
+        self._len = pos + 4
+        if not self._batching:
+            self._flush()
+
     def hal_write_command(self, cmd):
-        # Write a command to the LCD. Data is latched on the falling edge of E.
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        # Write a command to the LCD.
+        self._queue(0, cmd)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
+            self._flush()
             utime.sleep_ms(5)
-        gc.collect()
 
     def hal_write_data(self, data):
-        # Write data to the LCD. Data is latched on the falling edge of E.
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                ((data & 0x0f) << SHIFT_DATA))      
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
\ No newline at end of file
+        # Write data to the LCD.
+        self._queue(MASK_RS, data)
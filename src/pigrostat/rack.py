@@ -0,0 +1,244 @@
+# several SHT30s sampled as one: on more than one bus, and behind TCA9548A
+# multiplexers (each channel of a mux can carry a sensor at the same 0x44), so
+# one Pico can serve a whole rack of chambers
+#
+# a mux remembers which channel it has selected, and every transaction through
+# a MuxedI2C first makes sure its channel is the selected one, so drivers are
+# unchanged; only one channel across all the muxes on a bus is ever enabled,
+# as the sensors behind them share an address
+#
+# the Rack plans each round of readings:
+#   - units are ordered by bus, then mux, then channel, so each mux channel is
+#     selected once per pass rather than once per sensor
+#   - every single-shot conversion is started before any is read, so the
+#     conversions overlap (across buses and mux channels alike) and N sensors
+#     wait out one conversion time, not N
+#   - each pass runs the order the other way from the one before, so a pass
+#     starts on the channel the last one finished on
+#
+# units whose sensor wasn't found stay in the rack (their values read ERR), so
+# one dead sensor doesn't take its neighbours down with it
+
+import time
+import uasyncio as asyncio
+
+# one bit per unit in telemetry and sample log flags
+MAX_UNITS = 64
+
+
+class Mux:
+    """
+    A TCA9548A 1-to-8 I2C switch; peers is the list of every mux on the same
+    bus (this one included), so selecting a channel here can first switch the
+    others off
+    """
+    def __init__(self, addr, peers):
+        self.addr = addr
+        self.peers = peers
+        peers.append(self)
+        self.selected = None # channel selected; -1 for none, None if unknown (boot, or a failed write)
+        self.switches = 0 # control register writes, for the planner's benefit
+        self.__control = bytearray(1)
+
+    def __write(self, i2c, channel):
+        self.__control[0] = 0 if channel < 0 else 1 << channel
+        try:
+            i2c.writeto(self.addr, self.__control)
+        except OSError:
+            self.selected = None
+            raise
+        self.selected = channel
+        self.switches += 1
+
+    def select(self, i2c, channel):
+        # i2c is the caller's bus, so the control write counts as its traffic
+        if self.selected == channel:
+            return
+        for mux in self.peers:
+            if mux is not self and mux.selected != -1:
+                mux.__write(i2c, -1)
+        self.__write(i2c, channel)
+
+
+class MuxedI2C:
+    """
+    The I2C surface of a device behind one mux channel, on top of the bus's
+    own (a BusDevice, for scheduling)
+    """
+    def __init__(self, mux, channel, device):
+        self.mux = mux
+        self.channel = channel
+        self.device = device
+
+    def scan(self):
+        self.mux.select(self.device, self.channel)
+        return self.device.scan()
+
+    def writeto(self, addr, buf, stop=True):
+        self.mux.select(self.device, self.channel)
+        return self.device.writeto(addr, buf, stop)
+
+    def writevto(self, addr, vector, stop=True):
+        self.mux.select(self.device, self.channel)
+        return self.device.writevto(addr, vector, stop)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        self.mux.select(self.device, self.channel)
+        return self.device.readfrom(addr, nbytes, stop)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        self.mux.select(self.device, self.channel)
+        return self.device.readfrom_into(addr, buf, stop)
+
+
+class Unit:
+    """
+    One sensor of the rack: where it is, its output channels and its latest
+    reading; sht is None if it wasn't found
+    """
+    def __init__(self, index, name, sht, bus, channels, mux=None, channel=-1):
+        self.index = index
+        self.name = name
+        self.sht = sht
+        self.bus = bus # the BusDevice its traffic goes through
+        self.channels = channels
+        self.mux = mux
+        self.channel = channel
+        self.sample = [0, 0, False] # T, RH in hundredths, and whether the read succeeded
+        self.raw = [0, 0] if sht is None else sht.raw # the sensor's words behind it
+        self.error = None # why the last read failed
+        self.__pending = False # a single-shot conversion was started
+
+    def key(self):
+        # plan order: by bus, with the units straight on it first, then by mux and channel
+        bridge = id(self.bus.bridge)
+        if self.mux is None:
+            return (bridge, -1, -1)
+        return (bridge, self.mux.addr, self.channel)
+
+    def trigger(self):
+        self.sample[2] = False
+        try:
+            self.sht.trigger()
+            self.__pending = True
+        except Exception as ex:
+            self.error = ex
+            self.__pending = False
+
+    def collect(self):
+        if not self.__pending and self.sht.periodic is None:
+            return # its trigger failed
+        self.__pending = False
+        try:
+            self.sht.collect_centi(self.sample)
+            self.sample[2] = True
+        except Exception as ex:
+            self.error = ex
+
+
+class Rack:
+    def __init__(self, units):
+        if len(units) > MAX_UNITS:
+            raise ValueError(f'at most {MAX_UNITS} sensors')
+        self.units = units # in config order; a unit's index is its place here
+        self.order = sorted([unit for unit in units if unit.sht is not None], key=Unit.key)
+        self.__check()
+        # units that share a bridge, in plan order, for reservations
+        self.groups = []
+        for unit in self.order:
+            if self.groups and self.groups[-1][0].bus.bridge is unit.bus.bridge:
+                self.groups[-1].append(unit)
+            else:
+                self.groups.append([unit])
+        self.single = False # any single-shot units (which need a trigger pass)
+        for unit in self.order:
+            if unit.sht.periodic is None:
+                self.single = True
+        self.muxes = []
+        for unit in self.order:
+            if unit.mux is not None and unit.mux not in self.muxes:
+                self.muxes.append(unit.mux)
+        self.__reverse = False # which way the next pass runs
+
+    def __check(self):
+        # a sensor straight on a bus answers whichever mux channel is selected,
+        # so its address can't be reused behind a mux on the same bus
+        seen = []
+        for unit in self.order:
+            where = (id(unit.bus.bridge), unit.sht.i2c_addr,
+                     -1 if unit.mux is None else unit.mux.addr, unit.channel)
+            for other in seen:
+                if other[:2] == where[:2] and (other[2] == -1 or where[2] == -1 or other[2:4] == where[2:]):
+                    raise ValueError(f'sensors {unit.name} and {self.units[other[4]].name} clash on the bus')
+            seen.append(where + (unit.index,))
+
+    def found(self):
+        return len(self.order)
+
+    def describe(self):
+        # the plan, for the boot log
+        parts = []
+        for unit in self.order:
+            where = '' if unit.mux is None else f' via {hex(unit.mux.addr)}:{unit.channel}'
+            parts.append(f'{unit.name}{where}')
+        return ', '.join(parts)
+
+    def switches(self):
+        n = 0
+        for mux in self.muxes:
+            n += mux.switches
+        return n
+
+    def __pass(self, collect):
+        order = self.order
+        n = len(order)
+        reverse = self.__reverse
+        self.__reverse = not reverse
+        for i in range(n):
+            unit = order[n - 1 - i if reverse else i]
+            if collect:
+                unit.collect()
+            elif unit.sht.periodic is None:
+                unit.trigger()
+
+    def start(self):
+        """
+        Start every single-shot conversion; False if there were none (nothing
+        to wait for before collect())
+        """
+        for unit in self.units:
+            unit.sample[2] = False
+        if not self.single:
+            return False
+        self.__pass(False)
+        return True
+
+    def collect(self):
+        """
+        Read every unit's sample
+        """
+        self.__pass(True)
+
+    def measure(self, read_delay_ms=100):
+        # blocking round, for core 1
+        if self.start():
+            time.sleep_ms(read_delay_ms)
+        self.collect()
+
+    async def measure_async(self, read_delay_ms=100):
+        if self.start():
+            await asyncio.sleep_ms(read_delay_ms)
+        self.collect()
+
+    def reserve(self, wait_ms, read_delay_ms):
+        """
+        Tell the bridges when the next round needs their buses, wait_ms from
+        now: units on one bus go one after another
+        """
+        for group in self.groups:
+            after = 0
+            for unit in group:
+                if unit.sht.periodic is None:
+                    after += unit.bus.reserve(wait_ms, wait_ms + read_delay_ms, after_us=after)
+                else:
+                    after += unit.bus.reserve(wait_ms + (read_delay_ms if self.single else 0), after_us=after)
@@ -0,0 +1,99 @@
+# relays driven through a sequencer: switching a relay queues its pin changes
+# (with a pause between pins of a snubbed pair) and returns at once; the steps
+# are carried out by whoever calls RelaySequencer.poll() - an asyncio task, or
+# core 1's loop - so a switch never stalls sampling
+#
+# pin order is as it always was: on goes from the last pin to the first, off
+# from the first pin to the last; queued sequences never overlap, so switching
+# back before a sequence finishes still completes it first, then reverses
+
+import time
+from machine import Pin
+from logger import log
+
+# pause between pins of one relay
+STEP_MS = 100
+
+
+class Relay:
+    def __init__(self, sequencer, pins):
+        self.__sequencer = sequencer
+        if isinstance(pins, int):
+            pins = [pins]
+        self.pins = [Pin(pin, Pin.OUT) for pin in pins]
+        self.__target = False
+        self.pending = 0 # pin changes queued but not yet made
+        log.info(f'Relays: {self.pins}')
+
+    def value(self, newValue = None):
+        # the state last asked for; settled() says whether the pins are there yet
+        if newValue is None:
+            return self.__target
+        elif newValue is True:
+            self.on()
+        else:
+            self.off()
+
+    def on(self):
+        self.__switch(True)
+
+    def off(self):
+        self.__switch(False)
+
+    def settled(self):
+        return self.pending == 0
+
+    def __switch(self, value):
+        if value is self.__target:
+            return
+        self.__target = value
+        sequencer = self.__sequencer
+        # behind another sequence, the first step gets the pause too
+        delay = STEP_MS if sequencer.busy() else 0
+        pins = reversed(self.pins) if value else self.pins
+        for pin in pins:
+            sequencer.queue(self, pin, value, delay)
+            delay = STEP_MS
+
+
+class RelaySequencer:
+    """
+    Ordered queue of (relay, pin, value, delay) steps; each step runs its delay
+    after the one before it
+    """
+    def __init__(self, notify=None):
+        self.steps = []
+        self.__due = None # when the first step is due, once it is at the front
+        self.__notify = notify # called when steps are queued; wakes the poller
+
+    def relay(self, pins):
+        return Relay(self, pins)
+
+    def busy(self):
+        return len(self.steps) > 0
+
+    def queue(self, relay, pin, value, delay_ms):
+        self.steps.append((relay, pin, value, delay_ms))
+        relay.pending += 1
+        if self.__notify is not None:
+            self.__notify()
+
+    def poll(self):
+        """
+        Make any pin changes that are due; returns the ms until the next one,
+        or -1 when nothing is queued
+        """
+        steps = self.steps
+        while steps:
+            relay, pin, value, delay = steps[0]
+            now = time.ticks_ms()
+            if self.__due is None:
+                self.__due = time.ticks_add(now, delay)
+            wait = time.ticks_diff(self.__due, now)
+            if wait > 0:
+                return wait
+            pin.value(value)
+            steps.pop(0)
+            relay.pending -= 1
+            self.__due = None
+        return -1
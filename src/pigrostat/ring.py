@@ -0,0 +1,54 @@
+# single-producer, single-consumer ring of fixed-width integer records, for
+# handing samples from core 1 to core 0 without a lock
+#
+# the producer only ever writes `head` and the consumer only ever writes
+# `tail`; a record is filled in before `head` moves past it, and its slot is
+# not reused until `tail` has moved past it, so neither side sees a torn record.
+# one slot is kept empty to tell "full" from "empty"
+
+from array import array
+
+
+class SampleRing:
+    def __init__(self, slots, width):
+        self.slots = slots
+        self.width = width
+        self.data = array('i', bytes(4 * slots * width))
+        self.head = 0 # next slot to write; producer only
+        self.tail = 0 # next slot to read; consumer only
+        self.dropped = 0 # records the producer discarded because the ring was full
+
+    # producer
+
+    def claim(self):
+        """
+        Offset into data of the slot to fill, or -1 (counted as dropped) if full
+        """
+        head = self.head
+        if (head + 1) % self.slots == self.tail:
+            self.dropped += 1
+            return -1
+        return head * self.width
+
+    def publish(self):
+        """
+        Make the claimed slot visible to the consumer
+        """
+        self.head = (self.head + 1) % self.slots
+
+    # consumer
+
+    def peek(self):
+        """
+        Offset into data of the oldest unread record, or -1 if empty
+        """
+        tail = self.tail
+        if tail == self.head:
+            return -1
+        return tail * self.width
+
+    def advance(self):
+        """
+        Release the record returned by peek()
+        """
+        self.tail = (self.tail + 1) % self.slots
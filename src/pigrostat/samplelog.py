@@ -0,0 +1,216 @@
+# append-only sample log on flash: fixed-size records of the sensor's raw
+# words and the relay state, in a preallocated file of fixed-size blocks that
+# are written round-robin, so the oldest block is always the next overwritten
+# and every block sees the same number of writes
+#
+# block (BLOCK_SIZE bytes, little-endian):
+#   header  magic 'PGSL', version (u8), record size (u8), reserved (u16),
+#           sequence (u32, one more for every block started),
+#           base time (u32, seconds since the firmware's epoch)
+#   record  seconds since base time (u16), raw T (u16), raw RH (u16),
+#           relay bits (u8), flags (u8: FLAG_OK, the sensor's unit number
+#           above it, and FLAG_VALID)
+#
+# records are appended in time order and marked FLAG_VALID, so a block ends
+# where the zero-filled space begins. a new block is started when the current
+# one is full, the time offset would overflow, or the clock goes backwards (an
+# NTP correction), so within a block time never decreases
+#
+# every block's header is held in RAM as a sparse index: a range read goes
+# straight to the blocks that overlap it, and binary searches each for its
+# first record, rather than scanning the log. src/host/logview.py reads the
+# same file on the host
+
+import struct
+from array import array
+
+LOG_FILE = 'samples.log'
+
+MAGIC = b'PGSL'
+VERSION = 1
+
+BLOCK_SIZE = 4096 # one flash erase sector
+HEADER_FORMAT = '<4sBBHII'
+HEADER_SIZE = 16
+RECORD_FORMAT = '<HHHBB'
+RECORD_SIZE = 8
+RECORDS_PER_BLOCK = (BLOCK_SIZE - HEADER_SIZE) // RECORD_SIZE
+
+FLAG_OK = 0x01 # the sensor read succeeded; raw words are meaningless otherwise
+FLAG_VALID = 0x80 # a written record, as opposed to unused space
+UNIT_SHIFT = 1 # (flags >> UNIT_SHIFT) & UNIT_MASK: which sensor, with several; 0 with one
+UNIT_MASK = 0x3F
+
+MAX_OFFSET = 0xFFFF
+
+
+class SampleLog:
+    """
+    append() each sample; records are buffered in RAM and written `flush` at a
+    time (a reset loses at most that many), read() yields a time range
+    """
+    def __init__(self, blocks, flush=32, path=LOG_FILE):
+        self.path = path
+        self.blocks = blocks
+        # sparse index: per block, its sequence (0 if unused), base time and record count
+        self.sequences = array('I', bytes(4 * blocks))
+        self.bases = array('I', bytes(4 * blocks))
+        self.counts = array('H', bytes(2 * blocks))
+        self.current = -1 # block being appended to
+        self.__sequence = 0 # of the newest block
+        self.__last = 0 # offset of the newest record in the current block
+        self.__pending = bytearray(flush * RECORD_SIZE)
+        self.__pending_count = 0
+        self.__header = bytearray(HEADER_SIZE)
+        self.__record = bytearray(RECORD_SIZE)
+        try:
+            self.__file = open(path, 'r+b')
+            self.__load()
+        except (OSError, ValueError):
+            self.__create() # first boot, unreadable, or resized
+
+    def __create(self):
+        try:
+            self.__file.close()
+        except AttributeError:
+            pass
+        f = open(self.path, 'w+b')
+        empty = bytes(BLOCK_SIZE)
+        for _ in range(self.blocks):
+            f.write(empty)
+        f.flush()
+        self.__file = f
+        self.current = -1
+        self.__sequence = 0
+
+    def __load(self):
+        f = self.__file
+        header = self.__header
+        newest = -1
+        for block in range(self.blocks):
+            f.seek(block * BLOCK_SIZE)
+            if f.readinto(header) != HEADER_SIZE:
+                raise ValueError('log is shorter than configured')
+            magic, version, size, _, sequence, base = struct.unpack(HEADER_FORMAT, header)
+            if magic != MAGIC:
+                continue
+            if version != VERSION or size != RECORD_SIZE:
+                raise ValueError('log format changed')
+            self.sequences[block] = sequence
+            self.bases[block] = base
+            if newest < 0 or sequence > self.sequences[newest]:
+                newest = block
+        # a block may have been closed early (when time moved on), so each
+        # block's end is found rather than assumed
+        for block in range(self.blocks):
+            if self.sequences[block]:
+                self.counts[block] = self.__find_end(block)
+        if newest >= 0:
+            self.current = newest
+            self.__sequence = self.sequences[newest]
+            count = self.counts[newest]
+            self.__last = self.__offset_at(newest, count - 1) if count else 0
+
+    def __read_record(self, block, index):
+        f = self.__file
+        f.seek(block * BLOCK_SIZE + HEADER_SIZE + index * RECORD_SIZE)
+        f.readinto(self.__record)
+        return self.__record
+
+    def __offset_at(self, block, index):
+        record = self.__read_record(block, index)
+        return record[0] | record[1] << 8
+
+    def __find_end(self, block):
+        # records are contiguous from the start of the block: binary search
+        # for the first one not marked valid
+        lo = 0
+        hi = RECORDS_PER_BLOCK
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self.__read_record(block, mid)[7] & FLAG_VALID:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __start_block(self, t):
+        self.flush()
+        block = (self.current + 1) % self.blocks
+        self.__sequence += 1
+        self.sequences[block] = self.__sequence
+        self.bases[block] = t
+        self.counts[block] = 0
+        f = self.__file
+        f.seek(block * BLOCK_SIZE)
+        struct.pack_into(HEADER_FORMAT, self.__header, 0, MAGIC, VERSION, RECORD_SIZE, 0, self.__sequence, t)
+        f.write(self.__header)
+        # the old records have to go, or they would read as part of this block
+        f.write(bytes(BLOCK_SIZE - HEADER_SIZE))
+        f.flush()
+        self.current = block
+        self.__last = 0
+
+    def append(self, t, raw_t, raw_rh, relays, ok, unit=0):
+        """
+        Log a sample taken at t (seconds since the firmware's epoch) by sensor `unit`
+        """
+        block = self.current
+        if block < 0:
+            self.__start_block(t)
+        else:
+            offset = t - self.bases[block]
+            if self.counts[block] + self.__pending_count >= RECORDS_PER_BLOCK \
+                    or offset > MAX_OFFSET or offset < self.__last:
+                self.__start_block(t)
+        offset = t - self.bases[self.current]
+        struct.pack_into(RECORD_FORMAT, self.__pending, self.__pending_count * RECORD_SIZE,
+                         offset, raw_t if ok else 0, raw_rh if ok else 0, relays,
+                         FLAG_VALID | unit << UNIT_SHIFT | (FLAG_OK if ok else 0))
+        self.__last = offset
+        self.__pending_count += 1
+        if self.__pending_count * RECORD_SIZE == len(self.__pending):
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered records to flash; if that raises OSError, they are lost
+        (the buffer is free for the next ones either way)
+        """
+        n = self.__pending_count
+        if n == 0:
+            return
+        self.__pending_count = 0
+        block = self.current
+        f = self.__file
+        f.seek(block * BLOCK_SIZE + HEADER_SIZE + self.counts[block] * RECORD_SIZE)
+        f.write(memoryview(self.__pending)[:n * RECORD_SIZE])
+        f.flush()
+        self.counts[block] += n
+
+    def read(self, t0, t1):
+        """
+        Yields (t, raw T, raw RH, relay bits, ok, unit) for the samples logged
+        from t0 to t1 inclusive, oldest block first
+        """
+        self.flush()
+        order = sorted((self.sequences[b], b) for b in range(self.blocks) if self.counts[b])
+        for _, block in order:
+            base = self.bases[block]
+            count = self.counts[block]
+            if base > t1 or base + self.__offset_at(block, count - 1) < t0:
+                continue # the index says this block is out of range
+            # first record at or after t0
+            lo = 0
+            hi = count
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if base + self.__offset_at(block, mid) < t0:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            for index in range(lo, count):
+                offset, raw_t, raw_rh, relays, flags = struct.unpack(RECORD_FORMAT, self.__read_record(block, index))
+                if base + offset > t1:
+                    break
+                yield base + offset, raw_t, raw_rh, relays, flags & FLAG_OK != 0, (flags >> UNIT_SHIFT) & UNIT_MASK
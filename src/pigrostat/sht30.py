@@ -7,6 +7,7 @@
 
 from machine import I2C, Pin
 import time
+import uasyncio as asyncio
 
 __version__ = '0.2.3'
 __author__ = 'Roberto Sánchez'
@@ -16,6 +17,55 @@ __license__ = "Apache License 2.0. https://www.apache.org/licenses/LICENSE-2.0"
 DEFAULT_I2C_ADDRESS = 0x44
 
 
+def _crc_table(polynomial):
+    # CRC-8 lookup for the SHT3x polynomial: one index per byte instead of 8 shifts
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = (crc << 1) ^ polynomial
+            else:
+                crc <<= 1
+        table[i] = crc & 0xFF
+    return table
+
+
+_CRC_TABLE = _crc_table(0x131)
+
+
+def _check_words(table, data, start, end):
+    """
+    Check the (MSB, LSB, CRC) words in data[start:end] without slicing
+    Returns None on a CRC mismatch, False if every byte was zero, True otherwise
+    """
+    seen = 0
+    for i in range(start, end, 3):
+        msb = data[i]
+        lsb = data[i + 1]
+        if table[table[0xFF ^ msb] ^ lsb] != data[i + 2]:
+            return None
+        seen |= msb | lsb | data[i + 2]
+    return seen != 0
+
+
+def temp_centi(raw):
+    """
+    A raw temperature word in hundredths of a degree C, integer-only
+    """
+    # 17500 / 65536 == 4375 / 16384; scaled down so the product stays a small
+    # int (< 2**30) and never allocates
+    return ((raw * 4375 + 8192) >> 14) - 4500
+
+
+def hum_centi(raw):
+    """
+    A raw humidity word in hundredths of a percent RH, integer-only
+    """
+    # 10000 / 65536 == 625 / 4096
+    return (raw * 625 + 2048) >> 12
+
+
 class SHT30:
     """
     SHT30 sensor driver in pure python based on I2C bus
@@ -44,13 +94,53 @@ class SHT30:
     ENABLE_HEATER_CMD = b'\x30\x6D'
     DISABLE_HEATER_CMD = b'\x30\x66'
 
+    # periodic acquisition: the sensor converts on its own schedule and the
+    # latest result is fetched on demand, so reads don't wait for a conversion
+    FETCH_CMD = b'\xE0\x00'
+    BREAK_CMD = b'\x30\x93'
+
+    REPEATABILITY_HIGH = 0
+    REPEATABILITY_MEDIUM = 1
+    REPEATABILITY_LOW = 2
+
+    # worst-case conversion time (ms) per repeatability
+    CONVERSION_MS = (15, 6, 4)
+
+    # alert limits: the ALERT pin rises when T or RH reaches a "set" limit and
+    # falls once both are back within the "clear" limits (periodic mode only)
+    ALERT_HIGH_SET = 0
+    ALERT_HIGH_CLEAR = 1
+    ALERT_LOW_CLEAR = 2
+    ALERT_LOW_SET = 3
+    ALERT_READ_CMDS = (b'\xE1\x1F', b'\xE1\x14', b'\xE1\x09', b'\xE1\x02')
+    ALERT_WRITE_CMDS = (b'\x61\x1D', b'\x61\x16', b'\x61\x0B', b'\x61\x00')
+
+    # keyed by measurements per second; one command per repeatability (high, medium, low)
+    PERIODIC_CMDS = {
+        0.5: (b'\x20\x32', b'\x20\x24', b'\x20\x2F'),
+        1: (b'\x21\x30', b'\x21\x26', b'\x21\x2D'),
+        2: (b'\x22\x36', b'\x22\x20', b'\x22\x2B'),
+        4: (b'\x23\x34', b'\x23\x22', b'\x23\x29'),
+        10: (b'\x27\x37', b'\x27\x21', b'\x27\x2A'),
+    }
+
     def __init__(self, i2c=None, delta_temp=0, delta_hum=0, i2c_address=DEFAULT_I2C_ADDRESS):
         if i2c is None:
             raise ValueError('An I2C object is required.')
         self.i2c = i2c
         self.i2c_addr = i2c_address
+        # responses are read in place; one view per size so reads don't allocate
+        buf = memoryview(bytearray(6))
+        self._views = [buf[:n] for n in range(7)]
+        self.periodic = None  # measurements per second, when in periodic mode
+        self._latest = bytearray(6)
+        self._latest_ms = None
+        self.raw = [0, 0] # T and RH words behind the last *_centi() reading
+        # how long the last readout took on the bus, and to check, in us
+        self.read_us = 0
+        self.crc_us = 0
         self.set_delta(delta_temp, delta_hum)
-        time.sleep_ms(50)
+        time.sleep_ms(2) # power-up time is 1.5ms at most
 
     def is_present(self):
         """
@@ -65,43 +155,55 @@ class SHT30:
         """
         self.delta_temp = delta_temp
         self.delta_hum = delta_hum
+        # the same, in hundredths, for measure_centi()
+        self._delta_centi = (int(round(delta_temp * 100)), int(round(delta_hum * 100)))
 
     def _check_crc(self, data):
         # calculates 8-Bit checksum with given polynomial
         crc = 0xFF
-
-        for b in data[:-1]:
-            crc ^= b
-            for _ in range(8, 0, -1):
-                if crc & 0x80:
-                    crc = (crc << 1) ^ SHT30.POLYNOMIAL
-                else:
-                    crc <<= 1
-        crc_to_check = data[-1]
-        return crc_to_check == crc
+        for i in range(len(data) - 1):
+            crc = _CRC_TABLE[crc ^ data[i]]
+        return data[-1] == crc
 
     def send_cmd(self, cmd_request, response_size=6, read_delay_ms=100):
         """
         Send a command to the sensor and read (optionally) the response
         The responsed data is validated by CRC
+        The result is a view over a buffer owned by the sensor, valid until the next command
         """
         try:
             self.i2c.writeto(self.i2c_addr, cmd_request)
-            if not response_size:
-                return
+        except OSError as ex:
+            raise SHT30Error(SHT30Error.BUS_ERROR)
+        if not response_size:
+            return
+        if read_delay_ms:
             time.sleep_ms(read_delay_ms)
-            data = self.i2c.readfrom(self.i2c_addr, response_size)
-
-            for i in range(response_size//3):
-                if not self._check_crc(data[i*3:(i+1)*3]):  # pos 2 and 5 are CRC
-                    raise SHT30Error(SHT30Error.CRC_ERROR)
-            if data == bytearray(response_size):
-                raise SHT30Error(SHT30Error.DATA_ERROR)
-            return data
+        return self._receive(response_size)
+
+    def _receive(self, response_size):
+        try:
+            if response_size < len(self._views):
+                data = self._views[response_size]
+            else:
+                data = memoryview(bytearray(response_size))
+            start = time.ticks_us()
+            self.i2c.readfrom_into(self.i2c_addr, data)
+            self.read_us = time.ticks_diff(time.ticks_us(), start)
         except OSError as ex:
             raise SHT30Error(SHT30Error.BUS_ERROR)
-        except Exception as ex:
-            raise ex
+        return self._check(data, response_size)
+
+    def _check(self, data, response_size):
+        # pos 2 and 5 are CRC; checked in place, word by word
+        start = time.ticks_us()
+        result = _check_words(_CRC_TABLE, data, 0, response_size)
+        self.crc_us = time.ticks_diff(time.ticks_us(), start)
+        if result is None:
+            raise SHT30Error(SHT30Error.CRC_ERROR)
+        if not result:
+            raise SHT30Error(SHT30Error.DATA_ERROR)
+        return data
 
     def clear_status(self):
         """
@@ -123,11 +225,126 @@ class SHT30:
         data = self.send_cmd(SHT30.STATUS_CMD, 3, read_delay_ms=20)
 
         if raw:
-            return data
+            return bytes(data)
 
         status_register = data[0] << 8 | data[1]
         return status_register
 
+    @staticmethod
+    def encode_limit(t_celsius, rh, edge=0):
+        """
+        Pack an alert limit: the 9 MSBs of raw T and 7 MSBs of raw RH in one word
+        Limits are coarse (0.35 C, 0.8 %RH steps); the sensor compares just those
+        bits of each reading, so edge=1 rounds to the lowest step that only
+        matches readings at or above the value, and edge=-1 to the highest step
+        that only matches readings at or below it (edge=0 truncates)
+        """
+        raw_t = min(0xFFFF, max(0, int((t_celsius + 45) * 0xFFFF / 175)))
+        raw_rh = min(0xFFFF, max(0, int(rh * 0xFFFF / 100)))
+        if edge > 0:
+            t9 = min(0x1FF, (raw_t + 0x7F) >> 7)
+            rh7 = min(0x7F, (raw_rh + 0x1FF) >> 9)
+        elif edge < 0:
+            t9 = max(0, ((raw_t + 1) >> 7) - 1)
+            rh7 = max(0, ((raw_rh + 1) >> 9) - 1)
+        else:
+            t9 = raw_t >> 7
+            rh7 = raw_rh >> 9
+        return rh7 << 9 | t9
+
+    @staticmethod
+    def decode_limit(word):
+        """
+        Returns (T, RH) for a packed alert limit
+        """
+        t_celsius = ((word & 0x1FF) << 7) * 175 / 0xFFFF - 45
+        rh = ((word >> 9) << 9) * 100 / 0xFFFF
+        return t_celsius, rh
+
+    def write_alert_limit(self, which, word):
+        """
+        Write one packed limit (ALERT_HIGH_SET, ...); send before start_periodic
+        """
+        buf = bytearray(5)
+        buf[0:2] = SHT30.ALERT_WRITE_CMDS[which]
+        buf[2] = word >> 8
+        buf[3] = word & 0xFF
+        buf[4] = _CRC_TABLE[_CRC_TABLE[0xFF ^ buf[2]] ^ buf[3]]
+        self.send_cmd(buf, None)
+
+    def read_alert_limit(self, which):
+        """
+        Read one packed limit back from the sensor
+        """
+        data = self.send_cmd(SHT30.ALERT_READ_CMDS[which], 3, read_delay_ms=1)
+        return data[0] << 8 | data[1]
+
+    def set_alert_limits(self, t_low, t_high, rh_low, rh_high):
+        """
+        Program the limits so the ALERT pin rises once T or RH is at or beyond
+        [low, high], never short of it; each clear limit sits one step inside
+        its set limit, for a step of hysteresis
+        """
+        high_set = SHT30.encode_limit(t_high, rh_high, 1)
+        low_set = SHT30.encode_limit(t_low, rh_low, -1)
+        high_clear = max(0, (high_set >> 9) - 1) << 9 | max(0, (high_set & 0x1FF) - 1)
+        low_clear = min(0x7F, (low_set >> 9) + 1) << 9 | min(0x1FF, (low_set & 0x1FF) + 1)
+        self.write_alert_limit(SHT30.ALERT_HIGH_SET, high_set)
+        self.write_alert_limit(SHT30.ALERT_HIGH_CLEAR, high_clear)
+        self.write_alert_limit(SHT30.ALERT_LOW_CLEAR, low_clear)
+        self.write_alert_limit(SHT30.ALERT_LOW_SET, low_set)
+
+    def start_periodic(self, mps=1, repeatability=REPEATABILITY_HIGH):
+        """
+        Switch to periodic acquisition at `mps` measurements per second (0.5, 1, 2, 4 or 10);
+        measure() then fetches the most recent sample instead of waiting for a conversion
+        """
+        cmd = SHT30.PERIODIC_CMDS[mps][repeatability]
+        # always break first: after a reboot of the host the sensor may still be
+        # measuring, and would ignore the new command
+        self.stop_periodic()
+        self.send_cmd(cmd, None)
+        self.periodic = mps
+        self._latest_ms = None
+        # wait out the first conversion, so the first fetch has data
+        time.sleep_ms(SHT30.CONVERSION_MS[repeatability] + 1)
+
+    def stop_periodic(self):
+        """
+        Return to single-shot mode (the sensor ignores other commands while periodic)
+        """
+        self.send_cmd(SHT30.BREAK_CMD, None)
+        self.periodic = None
+        time.sleep_ms(1)
+
+    def _fetch(self):
+        data = self._views[6]
+        start = time.ticks_us()
+        try:
+            self.i2c.writeto(self.i2c_addr, SHT30.FETCH_CMD)
+            self.i2c.readfrom_into(self.i2c_addr, data)
+        except OSError:
+            self.read_us = time.ticks_diff(time.ticks_us(), start)
+            self.crc_us = 0
+            # the sensor NACKs the read when nothing new has been measured since
+            # the last fetch; the previous sample is still the latest, unless it
+            # has gone stale for longer than the sensor could plausibly take
+            # (handled here, not via SHT30Error, as it's the usual case)
+            if self._latest_ms is None or \
+                    time.ticks_diff(time.ticks_ms(), self._latest_ms) > 2000 // self.periodic:
+                raise SHT30Error(SHT30Error.BUS_ERROR)
+            return self._latest
+        self.read_us = time.ticks_diff(time.ticks_us(), start)
+        self._check(data, 6)
+        self._latest[:] = data
+        self._latest_ms = time.ticks_ms()
+        return self._latest
+
+    def _read(self):
+        if self.periodic is None:
+            return self.send_cmd(SHT30.MEASURE_CMD, 6)
+        return self._fetch()
+
     def measure(self, raw=False):
         """
         If raw==True returns a bytearrya(6) with sensor direct measurement otherwise
@@ -135,10 +352,62 @@ class SHT30:
 
         The units are Celsius and percent
         """
-        data = self.send_cmd(SHT30.MEASURE_CMD, 6)
+        return self._decode(self._read(), raw)
+
+    async def measure_async(self, raw=False, read_delay_ms=100):
+        """
+        As measure(), but a single-shot conversion is awaited rather than slept
+        through, so other tasks run meanwhile; periodic mode has nothing to wait for
+        """
+        if self.periodic is not None:
+            return self._decode(self._fetch(), raw)
+        self.send_cmd(SHT30.MEASURE_CMD, None)
+        await asyncio.sleep_ms(read_delay_ms)
+        return self._decode(self._receive(6), raw)
+
+    async def measure_centi_async(self, out, read_delay_ms=100):
+        """
+        As measure_async(), but writes T and RH in hundredths (2431 for 24.31)
+        into out[0] and out[1] rather than returning floats; integer-only, so
+        nothing is allocated on success
+        """
+        self.trigger()
+        if self.periodic is None:
+            await asyncio.sleep_ms(read_delay_ms)
+        self.collect_centi(out)
+
+    def trigger(self):
+        """
+        Start a single-shot conversion, for collect_centi() to read once it is
+        done; the caller is free to use the bus (even to trigger other sensors)
+        meanwhile. Nothing to do in periodic mode
+        """
+        if self.periodic is None:
+            self.send_cmd(SHT30.MEASURE_CMD, None)
+
+    def collect_centi(self, out):
+        """
+        Read the conversion started by trigger() (or the latest periodic
+        sample) into out[0] and out[1], in hundredths
+        """
+        self._decode_centi(self._receive(6) if self.periodic is None else self._fetch(), out)
+
+    def measure_centi(self, out):
+        """
+        Blocking form of measure_centi_async()
+        """
+        self._decode_centi(self._read(), out)
+
+    def _decode_centi(self, data, out):
+        raw = self.raw
+        raw[0] = data[0] << 8 | data[1]
+        raw[1] = data[3] << 8 | data[4]
+        out[0] = temp_centi(raw[0]) + self._delta_centi[0]
+        out[1] = hum_centi(raw[1]) + self._delta_centi[1]
 
+    def _decode(self, data, raw):
         if raw:
-            return data
+            return bytes(data)
 
         t_celsius = (((data[0] << 8 |  data[1]) * 175) / 0xFFFF) - 45 + self.delta_temp
         rh = (((data[3] << 8 | data[4]) * 100.0) / 0xFFFF) + self.delta_hum
@@ -154,9 +423,9 @@ class SHT30:
         Delta values are not applied in this method
         The units are Celsius and percent.
         """
-        data = self.send_cmd(SHT30.MEASURE_CMD, 6)
+        data = self._read()
         if raw:
-            return data
+            return bytes(data)
         aux = (data[0] << 8 | data[1]) * 175
         t_int = (aux // 0xffff) - 45
         t_dec = (aux % 0xffff * 100) // 0xffff
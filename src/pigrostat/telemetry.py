@@ -0,0 +1,136 @@
+# binary telemetry: each UDP datagram is a small header followed by as many
+# fixed-layout sample records as fit in one unfragmented packet, so a batch of
+# readings costs one radio wake-up instead of one per sample
+#
+# datagram (big-endian):
+#   header  magic 'PG', version, record count, device id (u32), clock (u32:
+#           Unix seconds when the batch was closed, 0 if the device's clock
+#           hasn't been set), ticks_ms at that moment (u32)
+#   record  sequence (u32), ticks_ms (u32), raw T (u16), raw RH (u16),
+#           relay bits (u8), flags (u8: FLAG_OK, and the sensor's unit number
+#           above it), CPU temperature in hundredths (i16)
+#
+# raw T/RH are the sensor's own words (see sht30.temp_centi()/hum_centi()),
+# without any configured offset, and only meaningful with FLAG_OK set; ticks_ms
+# wraps at 2**30 like the device's clock. the header's clock and ticks_ms pair
+# dates every record in the datagram, even one that waited in the backlog
+# across a reboot
+#
+# versions 2 and 3 can still be decoded: their records have T (i16) and RH in
+# hundredths instead (CENTI_VERSIONS), and version 2 has an 8-byte header,
+# without clock and ticks, so the receiver dates it by its arrival
+
+import struct
+
+MAGIC = b'PG'
+VERSION = 4
+CENTI_VERSIONS = (2, 3)
+
+HEADER_FORMAT = '>2sBBIII'
+HEADER_SIZE = 16
+V2_HEADER_FORMAT = '>2sBBI'
+V2_HEADER_SIZE = 8
+RECORD_FORMAT = '>IIHHBBh'
+CENTI_RECORD_FORMAT = '>IIhHBBh'
+RECORD_SIZE = 16
+
+FLAG_OK = 0x01 # the sensor read succeeded
+UNIT_SHIFT = 1 # flags >> UNIT_SHIFT: which sensor, with several (see rack.py); 0 with one
+
+# UDP payload that fits a 1500-byte frame without IP fragmentation
+MTU = 1472
+
+# the reporter's pacing, unless network.json says otherwise ("batch", "burst",
+# "drain", "gap"): seconds per datagram, backlog datagrams per burst, ms between
+# them, and seconds between bursts
+BATCH_S = 30
+BURST = 4
+DRAIN_MS = 50
+GAP_S = 1
+
+TICKS_PERIOD = 1 << 30
+
+
+class TelemetryBatch:
+    """
+    Records packed into one reused datagram buffer; add() until full(), send
+    payload(), then clear()
+    """
+    def __init__(self, device_id, mtu=MTU):
+        self.device_id = device_id
+        self.capacity = min(255, (mtu - HEADER_SIZE) // RECORD_SIZE)
+        self.buf = bytearray(HEADER_SIZE + self.capacity * RECORD_SIZE)
+        self.mv = memoryview(self.buf)
+        self.count = 0
+
+    def full(self):
+        return self.count >= self.capacity
+
+    def add(self, sequence, ticks_ms, ok, raw_t, raw_rh, relays, cpu_centi, unit=0):
+        """
+        Append a record (the sensor's raw T and RH words; ok is False after a
+        failed read) from sensor `unit`. Returns False if the batch is already full
+        """
+        if self.count >= self.capacity:
+            return False
+        if not ok:
+            raw_t = raw_rh = 0
+        struct.pack_into(RECORD_FORMAT, self.buf, HEADER_SIZE + self.count * RECORD_SIZE,
+                         sequence, ticks_ms, raw_t, raw_rh, relays, unit << UNIT_SHIFT | (FLAG_OK if ok else 0), cpu_centi)
+        self.count += 1
+        return True
+
+    def payload(self, clock=0, ticks_ms=0):
+        """
+        The datagram for the records so far (a view of the batch's buffer),
+        closed at clock (Unix seconds, or 0 if unknown) and ticks_ms
+        """
+        struct.pack_into(HEADER_FORMAT, self.buf, 0, MAGIC, VERSION, self.count, self.device_id,
+                         clock, ticks_ms)
+        return self.mv[:HEADER_SIZE + self.count * RECORD_SIZE]
+
+    def clear(self):
+        self.count = 0
+
+
+def header(datagram):
+    """
+    Returns (device_id, count, clock, ticks_ms, header size, version) for a
+    datagram; clock and ticks_ms are 0 for version 2. Raises ValueError if it
+    isn't a telemetry datagram
+    """
+    if len(datagram) < V2_HEADER_SIZE or datagram[0:2] != MAGIC:
+        raise ValueError('not a telemetry datagram')
+    version = datagram[2]
+    if (version == VERSION or version == 3) and len(datagram) >= HEADER_SIZE:
+        _, _, count, device_id, clock, ticks_ms = struct.unpack_from(HEADER_FORMAT, datagram, 0)
+        size = HEADER_SIZE
+    elif version == 2:
+        _, _, count, device_id = struct.unpack_from(V2_HEADER_FORMAT, datagram, 0)
+        clock = ticks_ms = 0
+        size = V2_HEADER_SIZE
+    else:
+        raise ValueError('unsupported telemetry version')
+    if len(datagram) < size + count * RECORD_SIZE:
+        raise ValueError('truncated datagram')
+    return device_id, count, clock, ticks_ms, size, version
+
+
+def decode(datagram):
+    """
+    Returns (device_id, records) for a datagram, each record a tuple in
+    RECORD_FORMAT order (CENTI_RECORD_FORMAT for versions 2 and 3); raises
+    ValueError if it isn't a telemetry datagram
+    """
+    device_id, count, _, _, size, version = header(datagram)
+    layout = CENTI_RECORD_FORMAT if version in CENTI_VERSIONS else RECORD_FORMAT
+    records = [struct.unpack_from(layout, datagram, size + i * RECORD_SIZE)
+               for i in range(count)]
+    return device_id, records
+
+
+def device_id(unique_id):
+    """
+    A u32 device id from machine.unique_id() (its last four bytes)
+    """
+    return struct.unpack('>I', bytes(unique_id[-4:]))[0]
@@ -0,0 +1,260 @@
+# the network side, as background tasks beside the control loop: Uplink brings
+# WiFi up (and back up), retrying with exponential backoff, and keeps the RTC
+# set by SNTP; Reporter batches each sample into telemetry datagrams, sent
+# while the link is up and kept in the flash backlog while it isn't
+#
+# nothing here waits on the network: connecting is polled, the SNTP reply is
+# polled on a non-blocking socket, and samples are recorded into a batch in
+# RAM, so the control loop runs from power-on whatever WiFi is doing. (the one
+# exception is DNS, which the firmware only does blocking; each name is looked
+# up once per link rather than per datagram)
+#
+# not named network.py: on the device that would shadow the firmware's own
+# network module
+
+import time, struct, socket, network, rp2, machine
+import uasyncio as asyncio
+from telemetry import TelemetryBatch, device_id, MTU, BATCH_S, BURST, DRAIN_MS, GAP_S
+from backlog import Backlog, SEQUENCE_BLOCK, SLOTS
+from logger import log
+
+# link states
+DOWN = 0 # waiting out the backoff before the next attempt
+JOINING = 1 # connect() issued; waiting for an address
+UP = 2
+
+BACKOFF_MIN_MS = 1000
+BACKOFF_MAX_MS = 300_000 # 5 minutes
+JOIN_TIMEOUT_MS = 20_000
+CHECK_MS = 500 # how often the link status is polled
+
+NTP_HOST = 'pool.ntp.org'
+NTP_PORT = 123
+NTP_TIMEOUT_MS = 1000
+NTP_RETRY_MIN_MS = 5000
+NTP_RETRY_MAX_MS = 3_600_000
+NTP_RESYNC_MS = 86_400_000 # daily; the RTC drifts a few seconds a day
+# seconds from the NTP epoch (1900) to the firmware's: 2000 on most ports, 1970 on some
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+# and from the Unix epoch to the firmware's, for telemetry timestamps
+UNIX_DELTA = NTP_DELTA - 2208988800
+
+
+def _later(ms):
+    return time.ticks_add(time.ticks_ms(), ms)
+
+
+class Uplink:
+    def __init__(self, config):
+        self.config = config
+        self.state = DOWN
+        self.up = asyncio.Event() # set while the link is up
+        self.synced = False # the RTC has been set from NTP
+        self.wlan = None
+        self.__backoff = BACKOFF_MIN_MS
+        self.__ntp_retry = NTP_RETRY_MIN_MS
+        self.__ntp_due = None
+        self.__ntp_addr = None
+
+    async def run(self):
+        config = self.config
+        rp2.country(config.get("country", "UK")) # channel frequencies
+        network.hostname(config.get("hostname", "pigrostat"))
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        self.wlan = wlan
+        while True:
+            try:
+                await self.__connect()
+            except Exception as ex:
+                # whatever the network does, it mustn't end the control loop
+                log.warning(f'Network: fault ({ex})')
+                self.up.clear()
+            self.state = DOWN
+            try:
+                wlan.disconnect()
+            except OSError:
+                pass
+            await asyncio.sleep_ms(self.__backoff)
+            self.__backoff = min(self.__backoff * 2, BACKOFF_MAX_MS)
+
+    async def __connect(self):
+        # one attempt: join, then stay until the link drops
+        config = self.config
+        wlan = self.wlan
+        log.info(f'Network: connecting to {config["ssid"]}')
+        self.state = JOINING
+        wlan.connect(config["ssid"], config["password"])
+        deadline = _later(JOIN_TIMEOUT_MS)
+        while 0 <= wlan.status() < 3 and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+            await asyncio.sleep_ms(CHECK_MS)
+        if not wlan.isconnected():
+            log.warning(f'Network: connect failed ({wlan.status()})')
+            return
+
+        log.info(f'Network: connected {wlan.ifconfig()}')
+        self.state = UP
+        self.__backoff = BACKOFF_MIN_MS
+        self.__ntp_due = time.ticks_ms()
+        self.up.set()
+        while wlan.isconnected():
+            if time.ticks_diff(self.__ntp_due, time.ticks_ms()) <= 0:
+                await self.__sync()
+            await asyncio.sleep_ms(CHECK_MS)
+        self.up.clear()
+        self.__ntp_addr = None # look the server up again next time
+        log.warning('Network: link lost')
+
+    async def __sync(self):
+        try:
+            await self.sync_time()
+            self.synced = True
+            self.__ntp_retry = NTP_RETRY_MIN_MS
+            self.__ntp_due = _later(NTP_RESYNC_MS)
+            log.info(f'Network: time (UTC) {time.localtime()}')
+        except (OSError, IndexError) as ex:
+            log.warning(f'Network: NTP failed ({ex})')
+            self.__ntp_due = _later(self.__ntp_retry)
+            self.__ntp_retry = min(self.__ntp_retry * 2, NTP_RETRY_MAX_MS)
+
+    async def sync_time(self):
+        """
+        Set the RTC from an SNTP server; as ntptime.settime(), but the reply is
+        awaited rather than blocked on
+        """
+        if self.__ntp_addr is None:
+            self.__ntp_addr = socket.getaddrinfo(self.config.get("ntp", NTP_HOST), NTP_PORT)[0][-1]
+        query = bytearray(48)
+        query[0] = 0x1B # LI 0, version 3, client
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.sendto(query, self.__ntp_addr)
+            deadline = _later(NTP_TIMEOUT_MS)
+            while True:
+                try:
+                    reply = sock.recv(48)
+                    break
+                except OSError:
+                    if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                        raise
+                    await asyncio.sleep_ms(20)
+        finally:
+            sock.close()
+        tm = time.gmtime(struct.unpack('>I', reply[40:44])[0] - NTP_DELTA)
+        machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+
+class Reporter:
+    """
+    record() each sample; run() sends a datagram when the batch is full or
+    `batch` seconds old, and drains the backlog once the link is back
+    """
+    def __init__(self, uplink, config, unique_id):
+        self.__uplink = uplink
+        self.__host = config["send_ip"]
+        self.__port = config["send_port"]
+        self.__batch_ms = int(config.get("batch", BATCH_S) * 1000)
+        self.__burst = config.get("burst", BURST) # backlog datagrams per burst
+        self.__drain_ms = config.get("drain", DRAIN_MS) # between datagrams of a burst
+        self.__gap_ms = int(config.get("gap", GAP_S) * 1000) # between bursts
+        self.batch = TelemetryBatch(config.get("device_id", device_id(unique_id)), config.get("mtu", MTU))
+        # datagrams that cannot be sent wait on flash, surviving a reset
+        self.backlog = Backlog(config.get("backlog", SLOTS), len(self.batch.buf))
+        self.__drain_buf = memoryview(bytearray(len(self.batch.buf)))
+        self.__dest = None
+        self.__sock = None
+        self.__failing = False
+        self.__started = 0
+        self.__due = asyncio.Event() # the batch is ready to go
+        # above any number used before a reset, so the collector can drop a resent record
+        self.sequence = self.backlog.sequence
+        self.backlog.reserve(self.sequence + SEQUENCE_BLOCK)
+        log.info(f'Telemetry: {self.batch.capacity} samples per datagram to {self.__host}:{self.__port}')
+        if self.backlog.count:
+            log.info(f'Telemetry: {self.backlog.count} datagrams in the backlog')
+
+    def record(self, ok, raw_t, raw_rh, relays, cpu_centi, unit=0):
+        # from the control loop: packs one record (the sensor's raw words), and never waits
+        now = time.ticks_ms()
+        batch = self.batch
+        if batch.count == 0:
+            self.__started = now
+        batch.add(self.sequence, now, ok, raw_t, raw_rh, relays, cpu_centi, unit)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        if batch.full() or time.ticks_diff(now, self.__started) >= self.__batch_ms:
+            self.__due.set()
+
+    def send_text(self, text):
+        # a status line (e.g. the metrics report) to the same collector, while
+        # the link is up; it has no telemetry magic, so decoders pass it over
+        if not self.__uplink.up.is_set():
+            return False
+        return self.__send(text.encode())
+
+    def __send(self, datagram):
+        try:
+            if self.__dest is None:
+                self.__dest = socket.getaddrinfo(self.__host, self.__port)[0][-1]
+                self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__sock.sendto(datagram, self.__dest)
+            self.__failing = False
+            return True
+        except OSError as ex:
+            if not self.__failing:
+                log.warning(f'Telemetry: send failed ({ex})')
+                self.__failing = True
+            if self.__sock is not None:
+                self.__sock.close()
+            self.__dest = None # resolve and reopen on the next attempt
+            self.__sock = None
+            return False
+
+    async def run(self):
+        batch = self.batch
+        backlog = self.backlog
+        up = self.__uplink.up
+        while True:
+            ahead = (backlog.sequence - self.sequence) & 0xFFFFFFFF
+            if ahead < SEQUENCE_BLOCK // 2 or ahead >= 0x80000000:
+                # halfway through the reserved numbers (or past them): reserve the next block
+                try:
+                    backlog.reserve(self.sequence + SEQUENCE_BLOCK)
+                except OSError as ex:
+                    log.warning(f'Telemetry: backlog failed ({ex})')
+
+            if backlog.count:
+                # pace the drain, or check back for the link
+                try:
+                    await asyncio.wait_for_ms(self.__due.wait(), self.__gap_ms)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self.__due.wait()
+
+            if self.__due.is_set():
+                self.__due.clear()
+                # dated now, so the collector can place it even if it waits in the backlog
+                clock = time.time() + UNIX_DELTA if self.__uplink.synced else 0
+                datagram = batch.payload(clock, time.ticks_ms())
+                if not (up.is_set() and self.__send(datagram)):
+                    try:
+                        backlog.store(datagram)
+                    except OSError as ex:
+                        log.warning(f'Telemetry: backlog failed ({ex})') # flash full or worn: lose the batch
+                batch.clear()
+
+            if up.is_set():
+                try:
+                    for _ in range(self.__burst):
+                        n = backlog.peek(self.__drain_buf)
+                        if n == 0 or not self.__send(self.__drain_buf[:n]):
+                            break
+                        backlog.advance()
+                        if backlog.count == 0:
+                            log.info('Telemetry: backlog sent')
+                        await asyncio.sleep_ms(self.__drain_ms)
+                except OSError as ex:
+                    # flash fault: try again after the next gap, rather than let
+                    # it end the run (and with it, relay control)
+                    log.warning(f'Telemetry: backlog failed ({ex})')